@@ -0,0 +1,172 @@
+import gzip
+import io
+import logging
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#Outside of DEBUG collectstatic writes every static file a second time
+#under a name with a hash of its content (app.css -> app.3f2a9c81d0be.css),
+#which {% static %} and the url()s of stylesheets refer to, plus gzipped
+#copies (and brotli ones with the brotli package installed) of the files
+#that compress well. StaticFilesMiddleware serves STATIC_ROOT: hashed names
+#never change content and are cached by browsers for a year, other names
+#for STATIC_MAX_AGE seconds, and the smallest copy the browser accepts is
+#sent.
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json',
+                         '.map', '.xml', '.ico', '.eot', '.ttf', '.otf')
+
+#A compressed copy is only kept when it is at most this share of the file
+MAX_COMPRESSED_RATIO = 0.95
+
+#Content encodings by preference, with the suffix of their copies
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(\.[^/.]+)?$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def gzip_compress(content):
+    output = io.BytesIO()
+    # without a timestamp the same file always compresses the same
+    with gzip.GzipFile(fileobj=output, mode='wb', compresslevel=9,
+                       mtime=0) as compressed:
+        compressed.write(content)
+    return output.getvalue()
+
+
+def get_compressors():
+    compressors = [('.gz', gzip_compress)]
+    if brotli is not None:
+        compressors.insert(0, ('.br', brotli.compress))
+    return compressors
+
+
+def compress_file(path):
+    """
+    Write the compressed copies of the file at path next to it, if it is of
+    a kind that compresses and they are smaller. Returns their suffixes.
+    """
+    if not path.endswith(COMPRESSED_EXTENSIONS):
+        return []
+    with open(path, 'rb') as source:
+        content = source.read()
+    suffixes = []
+    for suffix, compress in get_compressors():
+        compressed = compress(content)
+        if len(compressed) <= len(content) * MAX_COMPRESSED_RATIO:
+            with open(path + suffix, 'wb') as copy:
+                copy.write(compressed)
+            suffixes.append(suffix)
+    return suffixes
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """
+    Stores static files under hashed names as well and writes compressed
+    copies of both.
+    """
+    def url_converter(self, name, template=None):
+        converter = super(CompressedManifestStorage, self).url_converter(
+            name, template)
+
+        def convert(matchobj):
+            # a stylesheet that refers to a missing file still works as it
+            # did, so leave the reference alone rather than fail
+            try:
+                return converter(matchobj)
+            except ValueError:
+                logger.warning('%s refers to a missing file: %s', name,
+                               matchobj.group(0))
+                return matchobj.group(0)
+        return convert
+
+    def post_process(self, paths, dry_run=False, **options):
+        files = super(CompressedManifestStorage, self).post_process(
+            paths, dry_run, **options)
+        for name, hashed_name, processed in files:
+            if not dry_run and not isinstance(processed, Exception):
+                compress_file(self.path(name))
+                compress_file(self.path(hashed_name))
+            yield name, hashed_name, processed
+
+
+def get_accepted_encodings(request):
+    accepted = set()
+    for encoding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        parts = [part.strip() for part in encoding.split(';')]
+        if 'q=0' not in parts and 'q=0.0' not in parts:
+            accepted.add(parts[0].lower())
+    return accepted
+
+
+def get_static_path(request):
+    """ The file under STATIC_ROOT the request asks for, or None. """
+    if not settings.STATIC_URL or not settings.STATIC_ROOT or \
+            not request.path.startswith(settings.STATIC_URL):
+        return None
+    root = os.path.abspath(settings.STATIC_ROOT)
+    path = os.path.normpath(os.path.join(
+        root, request.path[len(settings.STATIC_URL):]))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+class StaticFilesMiddleware(object):
+    """
+    Serves the collected static files with caching headers. Put it first,
+    as static files need none of the other middleware.
+    """
+    def process_request(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        path = get_static_path(request)
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        if HASHED_NAME.search(path):
+            cache_control = 'public, max-age={0}, immutable'.format(
+                IMMUTABLE_MAX_AGE)
+        else:
+            cache_control = 'public, max-age={0}'.format(
+                settings.STATIC_MAX_AGE)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size):
+            response = HttpResponseNotModified()
+            response['Cache-Control'] = cache_control
+            return response
+
+        accepted = get_accepted_encodings(request)
+        served, encoding = path, None
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(path + suffix):
+                served, encoding = path + suffix, name
+                break
+
+        content_type = mimetypes.guess_type(path)[0] or \
+            'application/octet-stream'
+        response = FileResponse(open(served, 'rb'), content_type=content_type)
+        response['Content-Length'] = os.path.getsize(served)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = cache_control
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if path.endswith(COMPRESSED_EXTENSIONS):
+            response['Vary'] = 'Accept-Encoding'
+        return response
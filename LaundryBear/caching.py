@@ -0,0 +1,27 @@
+from django.core.cache.backends.filebased import FileBasedCache
+
+#Django's file based cache counts the files of its directory on every set()
+#to decide whether to cull, so a write costs time in proportion to the
+#number of entries. FileCache only counts them once every CULL_EVERY
+#writes, which lets the cache run up to CULL_EVERY entries past
+#MAX_ENTRIES per process between counts.
+
+CULL_EVERY = 200
+
+
+class FileCache(FileBasedCache):
+    """
+    File based cache which checks its size every CULL_EVERY writes
+    (an OPTIONS key) instead of on every write.
+    """
+    def __init__(self, dir, params):
+        super(FileCache, self).__init__(dir, params)
+        self._cull_every = int(params.get('OPTIONS', {})
+                               .get('CULL_EVERY', CULL_EVERY))
+        self._writes = 0
+
+    def _cull(self):
+        self._writes += 1
+        if self._writes >= self._cull_every:
+            self._writes = 0
+            super(FileCache, self)._cull()
@@ -1,7 +1,12 @@
 from LaundryBear import settings
 
 from django.shortcuts import redirect
+from django.core.paginator import InvalidPage
 from django.core.urlresolvers import reverse
+from django.http import Http404
+
+from database.search import search
+from LaundryBear.pagination import CachedCountPaginator, KeysetPaginator
 
 
 class LoginRequiredMixin(object):
@@ -18,3 +23,63 @@ class LoginRequiredMixin(object):
             redirect_url = reverse(self.login_view_name)
             redirect_url = '{0}?next={1}'.format(redirect_url, request.path)
             return redirect(redirect_url)
+
+
+class SearchMixin(object):
+    """
+    List view mixin which narrows the list down to the rows matching the
+    full-text search query in the q parameter, best matches first.
+    """
+    def get_search_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        queryset = super(SearchMixin, self).get_queryset()
+        query = self.get_search_query()
+        if query:
+            queryset = search(queryset, query)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchMixin, self).get_context_data(**kwargs)
+        context['query'] = self.get_search_query()
+        return context
+
+
+class KeysetPaginationMixin(object):
+    """
+    List view mixin which pages by the last row seen (the after and before
+    parameters) instead of by page number, so deep pages cost the same as
+    the first one. If get_keyset_ordering returns None the usual page
+    numbers are used, with a cached total count.
+    """
+    keyset_ordering = ('-request_date', '-pk')
+    paginator_class = CachedCountPaginator
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        if ordering is None:
+            return super(KeysetPaginationMixin, self).paginate_queryset(
+                queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, ordering)
+        try:
+            page = paginator.page(after=self.request.GET.get('after'),
+                                  before=self.request.GET.get('before'))
+        except InvalidPage as e:
+            raise Http404(unicode(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super(KeysetPaginationMixin, self).get_context_data(
+            **kwargs)
+        #The other GET parameters (filters, search) for the page links
+        params = self.request.GET.copy()
+        for name in ('after', 'before', 'page'):
+            params.pop(name, None)
+        context['page_query'] = params.urlencode()
+        return context
+
+
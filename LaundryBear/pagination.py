@@ -0,0 +1,168 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.utils.functional import cached_property
+
+#Counting a filtered list scans every matching row, so counts are shared
+#through the cache for a short time. They may be off by the rows added or
+#removed since.
+COUNT_CACHE_TIMEOUT = 60
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """ Number of rows in queryset, possibly slightly out of date. """
+    try:
+        sql = unicode(queryset.order_by().query)
+    except EmptyResultSet:
+        return 0
+    key = 'pagination:count:{0}'.format(
+        hashlib.md5(sql.encode('utf-8')).hexdigest())
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """ Page number paginator using cached_count for the total. """
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return cached_count(self.object_list)
+        return len(self.object_list)
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if hasattr(value, 'isoformat') else
+              unicode(value) for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values)).rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    try:
+        cursor = str(cursor)
+        values = json.loads(base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError
+        return [field.to_python(value) for field, value in zip(fields,
+                                                                values)]
+    except Exception:
+        raise InvalidPage('Invalid cursor.')
+
+
+class KeysetPage(object):
+    """
+    A page of a KeysetPaginator. next_cursor and previous_cursor are None
+    when there is no next or previous page.
+    """
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(object):
+    """
+    Pages through a queryset by the ordering values of the rows at the edges
+    of the current page instead of by offset, so every page costs one
+    indexed range query. ordering must end with a unique field, e.g.
+    ('-request_date', '-pk').
+    """
+    def __init__(self, object_list, per_page, ordering):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.fields = [self.get_field(name.lstrip('-'))
+                       for name in ordering]
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+    def get_field(self, path):
+        model = self.object_list.model
+        names = path.split('__')
+        for name in names[:-1]:
+            model = model._meta.get_field(name).related_model
+        if names[-1] == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(names[-1])
+
+    def get_values(self, obj):
+        values = []
+        for name in self.ordering:
+            value = obj
+            for attr in name.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def get_filter(self, values, reverse=False):
+        """
+        Rows after the given ordering values, or before them if reverse.
+        """
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            after = dict(equal, **{'{0}__{1}'.format(name, lookup): value})
+            condition |= Q(**after)
+            equal[name] = value
+        return condition
+
+    def page(self, after=None, before=None):
+        ordering = list(self.ordering)
+        queryset = self.object_list
+        if before:
+            values = decode_cursor(before, self.fields)
+            ordering = [name[1:] if name.startswith('-') else '-' + name
+                        for name in ordering]
+            queryset = queryset.filter(self.get_filter(values, reverse=True))
+        elif after:
+            values = decode_cursor(after, self.fields)
+            queryset = queryset.filter(self.get_filter(values))
+
+        object_list = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if before:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(after)
+
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = encode_cursor(self.get_values(object_list[-1]))
+        if object_list and has_previous:
+            previous_cursor = encode_cursor(self.get_values(object_list[0]))
+        return KeysetPage(object_list, self, next_cursor, previous_cursor)
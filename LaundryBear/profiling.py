@@ -0,0 +1,239 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.utils import timezone
+
+#Staff can profile a single request in any environment by adding
+#?profile=1 to its URL or sending an X-Profile: 1 header. The request runs
+#through the handler as usual, with cProfile on from the view middleware
+#to the rendered response, and three files are written to PROFILE_DIR:
+#  <name>.prof       the profile, for pstats, snakeviz and the like
+#  <name>.collapsed  the call stacks with their time in microseconds, one
+#                    per line, for flamegraph.pl or speedscope
+#  <name>.json       the time spent in the database, in templates (their
+#                    filters included) and in the rest of the Python code
+#The Server-Timing header of the response carries the same breakdown, so
+#it also shows up in the network panel of the browser.
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAMETER = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+#Call stacks taking less than this share of the request are left out of
+#the collapsed stacks
+MIN_STACK_SHARE = 0.001
+TOP_FUNCTIONS = 20
+
+_render_code = Template.render.__func__.__code__
+TEMPLATE_RENDER = (_render_code.co_filename, _render_code.co_firstlineno,
+                   _render_code.co_name)
+
+UNSAFE_CHARACTERS = re.compile(r'[^\w.-]+')
+
+
+def is_profile_requested(request):
+    return PROFILE_PARAMETER in request.GET or \
+        request.META.get(PROFILE_HEADER, '') not in ('', '0')
+
+
+def get_source_directories():
+    directories = [settings.BASE_DIR] + [os.path.abspath(path)
+                                         for path in sys.path]
+    return sorted(set(directories), key=len, reverse=True)
+
+
+def get_frame_name(func, directories):
+    """ A short name for a pstats function key. """
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    # relative to the project or the library directory it is in
+    for directory in directories:
+        if filename.startswith(directory + os.sep):
+            filename = filename[len(directory) + 1:]
+            break
+    return '{0}:{1}({2})'.format(filename, lineno, name)
+
+
+def get_frame_names(stats):
+    directories = get_source_directories()
+    return dict((func, get_frame_name(func, directories))
+                for func in stats.stats)
+
+
+def collapse_stacks(stats, min_time=0):
+    """
+    Yield (stack, seconds) for the call stacks of a pstats.Stats. cProfile
+    only keeps who called whom, so time is split between the callers of a
+    function in proportion to the time each call took.
+    """
+    stats.calc_callees()
+    names = get_frame_names(stats)
+    roots = [func for func, (cc, nc, tt, ct, callers)
+             in stats.stats.items() if not callers]
+
+    def walk(func, path, share):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        path = path + [func]
+        if tt * share >= min_time:
+            yield ';'.join(names[caller] for caller in path), tt * share
+        for callee, (c_cc, c_nc, c_tt, c_ct) in \
+                stats.all_callees.get(func, {}).items():
+            callee_ct = stats.stats[callee][3]
+            # recursion is folded into the outermost call
+            if callee in path or not callee_ct or c_ct * share < min_time:
+                continue
+            for line in walk(callee, path, share * c_ct / callee_ct):
+                yield line
+
+    for root in roots:
+        for line in walk(root, [], 1.0):
+            yield line
+
+
+class RequestProfile(object):
+    """
+    Profiles a request with cProfile from start() to stop(), keeping the
+    queries run meanwhile on every database.
+    """
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.render_queries = []
+        self.render_starts = {}
+
+    def count_queries(self):
+        return dict((alias, len(connections[alias].queries_log))
+                    for alias in connections)
+
+    def start(self):
+        self.starts = {}
+        for alias in connections:
+            connection = connections[alias]
+            self.starts[alias] = (connection.force_debug_cursor,
+                                  len(connection.queries_log))
+            connection.force_debug_cursor = True
+        self.started = time.time()
+        self.profiler.enable()
+
+    def start_rendering(self):
+        """ Note that the view returned a response that is rendered next. """
+        self.render_starts = self.count_queries()
+
+    def stop(self):
+        self.profiler.disable()
+        self.total = time.time() - self.started
+        for alias, (force_debug_cursor, start) in self.starts.items():
+            connection = connections[alias]
+            connection.force_debug_cursor = force_debug_cursor
+            queries = list(connection.queries_log)
+            self.queries.extend(queries[start:])
+            if alias in self.render_starts:
+                self.render_queries.extend(
+                    queries[self.render_starts[alias]:])
+
+    def get_breakdown(self, stats):
+        """ Seconds spent in the database, templates and other Python. """
+        db = sum(float(query['time']) for query in self.queries)
+        template = stats.stats.get(TEMPLATE_RENDER, (0, 0, 0, 0))[3]
+        # queries run by lazy querysets while rendering count as database
+        # time; those of templates rendered inside the view are counted
+        # in both
+        template -= sum(float(query['time']) for query in
+                        self.render_queries)
+        template = max(template, 0)
+        return {
+            'total': self.total,
+            'db': db,
+            'template': template,
+            'python': max(self.total - db - template, 0),
+        }
+
+    def get_top_functions(self, stats):
+        names = get_frame_names(stats)
+        functions = sorted(stats.stats.items(),
+                           key=lambda (func, values): values[2],
+                           reverse=True)[:TOP_FUNCTIONS]
+        return [{'function': names[func], 'calls': nc,
+                 'own_time': tt, 'cumulative_time': ct}
+                for func, (cc, nc, tt, ct, callers) in functions]
+
+    def save(self, directory, view_name):
+        """ Write the profile files, returning their path without suffix. """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        name = UNSAFE_CHARACTERS.sub('-', '{0}-{1}'.format(
+            timezone.now().strftime('%Y%m%d-%H%M%S-%f'), view_name))
+        path = os.path.join(directory, name)
+
+        self.profiler.create_stats()
+        stats = pstats.Stats(self.profiler)
+        self.profiler.dump_stats(path + '.prof')
+        with open(path + '.collapsed', 'w') as collapsed:
+            for stack, seconds in collapse_stacks(
+                    stats, self.total * MIN_STACK_SHARE):
+                collapsed.write('{0} {1}\n'.format(
+                    stack, int(round(seconds * 1000000))))
+
+        self.breakdown = self.get_breakdown(stats)
+        with open(path + '.json', 'w') as summary:
+            json.dump({
+                'view': view_name,
+                'method': self.request.method,
+                'path': self.request.get_full_path(),
+                'user': self.request.user.get_username(),
+                'queries': len(self.queries),
+                'seconds': self.breakdown,
+                'top_functions': self.get_top_functions(stats),
+            }, summary, indent=2, sort_keys=True)
+        return path
+
+
+class ProfilerMiddleware(object):
+    """
+    Profiles the requests of staff users that ask for it. Put it last, so
+    the processing of the requests and responses by the other middleware
+    is left out.
+    """
+    def process_request(self, request):
+        if is_profile_requested(request) and request.user.is_staff:
+            request.profile = RequestProfile(request)
+            request.profile.start()
+        return None
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.start_rendering()
+        return response
+
+    def process_response(self, request, response):
+        # also runs for the error response of a view that raised
+        profile = getattr(request, 'profile', None)
+        if profile is None:
+            return response
+        del request.profile
+        profile.stop()
+        view_name = getattr(request.resolver_match, 'view_name', None) or \
+            request.path
+        try:
+            path = profile.save(settings.PROFILE_DIR, view_name)
+        except EnvironmentError:
+            logger.exception('Could not save the profile of %s', view_name)
+            return response
+        response['X-Profile'] = os.path.basename(path)
+        response['Server-Timing'] = ', '.join(
+            '{0};dur={1:.1f}'.format(name, seconds * 1000) for name, seconds
+            in sorted(profile.breakdown.items()))
+        return response
@@ -0,0 +1,190 @@
+import logging
+import re
+
+from ast import literal_eval
+from collections import Counter
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections
+
+#Every view declares the most SQL queries a request to it may take in its
+#query_budget attribute, either one number for every method or a dict of
+#numbers by method, e.g. {'get': 5} for a view whose POST saves a formset
+#one row at a time. Function views use the query_budget decorator.
+#When QUERY_BUDGET_ENABLED is set (in debug and in the tests)
+#QueryBudgetMiddleware counts the queries of each request, on every
+#database including the replica, and attaches a QueryReport to the
+#response; QueryBudgetTestMixin fails a test when a view
+#goes over its budget or runs the same query shape over and over, which is
+#how an N+1 query pattern shows up.
+
+logger = logging.getLogger(__name__)
+
+#The SQLite backend logs a query as its SQL with placeholders followed by
+#the parameters. Other backends log the SQL with the parameters filled in,
+#so their literals are replaced instead.
+SQLITE_QUERY = re.compile(r'^QUERY = (?P<sql>.*?) - PARAMS = ', re.DOTALL)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\?, )*\?\)')
+
+
+def get_signature(sql):
+    """ The shape of a query, with its parameters left out. """
+    match = SQLITE_QUERY.match(sql)
+    if match:
+        sql = literal_eval(match.group('sql')).replace('%s', '?')
+    else:
+        sql = STRING_LITERAL.sub('?', sql)
+        sql = NUMBER_LITERAL.sub('?', sql)
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def get_view_class(view_func):
+    """ The class of a class based view function, or None. """
+    # DRF views carry their class; Django 1.8 views only their class name
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None and hasattr(view_func, '__module__'):
+        view_class = getattr(import_module(view_func.__module__),
+                             view_func.__name__, None)
+    return view_class if isinstance(view_class, type) else None
+
+
+def query_budget(budget):
+    """ Decorator declaring the query budget of a function view. """
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func, method='get'):
+    """ The query budget of a view for an HTTP method, or None. """
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(get_view_class(view_func), 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(method.lower())
+    return budget
+
+
+class QueryReport(object):
+    """ The queries that a request to a view ran. """
+    def __init__(self, view_name, budget, queries):
+        self.view_name = view_name
+        self.budget = budget
+        self.queries = queries
+        self.signatures = Counter(get_signature(query) for query in queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def get_repeats(self, max_repeats):
+        """ (signature, times run) of the shapes run over max_repeats times. """
+        return [(signature, count) for signature, count
+                in self.signatures.most_common() if count > max_repeats]
+
+    def describe(self):
+        lines = ['{0} ran {1} queries with a budget of {2}:'.format(
+            self.view_name, self.count, self.budget)]
+        lines.extend('{0:3}x {1}'.format(count, signature) for signature,
+                     count in self.signatures.most_common())
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Counts the queries of every request while QUERY_BUDGET_ENABLED is set,
+    reporting them in the X-Query-Count and X-Query-Budget headers and the
+    query_report attribute of the response, and logs a warning for views
+    over their budget or repeating a query. Queries run while a streaming
+    response is read are not counted. Put it first so the queries of the
+    other middleware count too.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return None
+        starts = {}
+        for alias in connections:
+            connection = connections[alias]
+            starts[alias] = (connection.force_debug_cursor,
+                             len(connection.queries_log))
+            connection.force_debug_cursor = True
+        request.query_budget = (request.resolver_match.view_name,
+                                get_query_budget(view_func, request.method),
+                                starts)
+        return None
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'query_budget'):
+            return response
+        view_name, budget, starts = request.query_budget
+        del request.query_budget
+        queries = []
+        for alias, (force_debug_cursor, start) in starts.items():
+            connection = connections[alias]
+            connection.force_debug_cursor = force_debug_cursor
+            queries.extend(query['sql'] for query in
+                           list(connection.queries_log)[start:])
+
+        report = QueryReport(view_name, budget, queries)
+        response.query_report = report
+        response['X-Query-Count'] = report.count
+        if budget is None:
+            return response
+        response['X-Query-Budget'] = budget
+        if report.over_budget or \
+                report.get_repeats(settings.QUERY_BUDGET_MAX_REPEATS):
+            logger.warning(report.describe())
+        return response
+
+
+class QueryBudgetTestMixin(object):
+    """
+    TestCase mixin with helpers to request pages with the query budgets
+    checked, counting the queries of every database.
+    """
+    def assertWithinQueryBudget(self, response, max_repeats=None):
+        """
+        Fail if the view of the request has no budget, went over it or ran
+        a query shape more than max_repeats times, QUERY_BUDGET_MAX_REPEATS
+        by default.
+        """
+        if max_repeats is None:
+            max_repeats = settings.QUERY_BUDGET_MAX_REPEATS
+        report = getattr(response, 'query_report', None)
+        if report is None:
+            self.fail('The response has no query report. Is '
+                      'QueryBudgetMiddleware installed and '
+                      'QUERY_BUDGET_ENABLED set?')
+        if report.budget is None:
+            self.fail('{0} declares no query_budget.'.format(
+                report.view_name))
+        if report.over_budget:
+            self.fail(report.describe())
+        repeats = report.get_repeats(max_repeats)
+        if repeats:
+            self.fail('{0} ran the same query {1} times:\n{2}'.format(
+                report.view_name, repeats[0][1], repeats[0][0]))
+
+    def request_within_budget(self, method, path, data=None, client=None,
+                              **extra):
+        """ Make a request, failing if it breaks its query budget. """
+        client = client or self.client
+        with self.settings(QUERY_BUDGET_ENABLED=True):
+            response = getattr(client, method)(path, data, **extra)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def get_within_budget(self, path, data=None, client=None, **extra):
+        return self.request_within_budget('get', path, data, client, **extra)
+
+    def post_within_budget(self, path, data=None, client=None, **extra):
+        return self.request_within_budget('post', path, data, client,
+                                          **extra)
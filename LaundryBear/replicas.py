@@ -0,0 +1,119 @@
+import os
+import threading
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+from LaundryBear.querybudget import get_view_class
+
+#Views that only read and can live with data a little out of date (lists,
+#reports and the API, but not what is kept in a cache) set
+#use_replica = True. ReplicaMiddleware then sends
+#the reads of their GET requests to the replica database, and
+#ReplicaRouter sends everything else to the primary. A request that
+#writes reads from the primary for the rest of the request, and the
+#browser that sent it gets a cookie that keeps it on the primary for
+#REPLICA_MAX_LAG seconds, so users see their own changes.
+#The replica is optional; without one, or with one that is a test mirror
+#of the primary, everything goes to the primary.
+
+REPLICA = 'replica'
+PIN_COOKIE = 'replica_pin'
+
+#Sessions, users and tokens are read on every request and must never lag
+PRIMARY_APPS = {'sessions', 'auth', 'authtoken'}
+
+_state = threading.local()
+
+
+def get_replica():
+    """ The alias of a replica to read from, or None. """
+    if REPLICA not in connections.databases:
+        return None
+    replica = connections[REPLICA].settings_dict
+    if replica['NAME'] == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']:
+        return None
+    # a SQLite stand-in that has not been copied yet
+    if 'sqlite3' in replica['ENGINE'] and not os.path.exists(replica['NAME']):
+        return None
+    return REPLICA
+
+
+def reset():
+    _state.replica = None
+    _state.wrote = False
+
+
+@receiver(request_finished)
+def reset_on_request_finished(sender, **kwargs):
+    # after a streaming response has been read, not when it is returned
+    reset()
+
+
+def copy_database(connection, path):
+    """
+    Write a consistent copy of a SQLite database to path, replacing the
+    file at once so readers never see half a copy.
+    """
+    temporary = path + '.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM INTO %s', [temporary])
+    os.rename(temporary, path)
+
+
+def refresh_replica():
+    """ Copy the primary database over the SQLite replica stand-in. """
+    copy_database(connections[DEFAULT_DB_ALIAS],
+                  connections[REPLICA].settings_dict['NAME'])
+    connections[REPLICA].close()
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica and not getattr(_state, 'wrote', False) and \
+                model._meta.app_label not in PRIMARY_APPS:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaMiddleware(object):
+    """
+    Lets the GET requests of views with use_replica set read from the
+    replica, unless the browser wrote recently.
+    """
+    def process_request(self, request):
+        reset()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or \
+                PIN_COOKIE in request.COOKIES:
+            return None
+        view_class = get_view_class(view_func)
+        if getattr(view_func, 'use_replica', False) or \
+                getattr(view_class, 'use_replica', False):
+            _state.replica = get_replica()
+        return None
+
+    def process_response(self, request, response):
+        if getattr(_state, 'wrote', False):
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_MAX_LAG,
+                                httponly=True)
+        return response
@@ -58,13 +58,21 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-    )
+        'api.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.OrderedCursorPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': (
+        'api.filters.LookupFilterBackend',
+    ),
 }
 
 CORS_ORIGIN_ALLOW_ALL = True
 
 MIDDLEWARE_CLASSES = (
+    'LaundryBear.assets.StaticFilesMiddleware',
+    'LaundryBear.querybudget.QueryBudgetMiddleware',
+    'LaundryBear.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,15 +82,28 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'LaundryBear.profiling.ProfilerMiddleware',
 )
 
+#Count the queries of every request against the query_budget of its view
+#(see LaundryBear/querybudget.py). The tests turn this on where they check
+#the budgets. A query shape run more than QUERY_BUDGET_MAX_REPEATS times in
+#one request is reported as an N+1 pattern.
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_MAX_REPEATS = 2
+
+#Staff requests with ?profile=1 or an X-Profile: 1 header are profiled
+#into this directory (see LaundryBear/profiling.py).
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
 ROOT_URLCONF = 'LaundryBear.urls'
 
+#Outside of DEBUG templates are compiled once per process by the cached
+#loader, all of them when the process starts (see LaundryBear/templating.py).
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -90,9 +111,18 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
         },
     },
 ]
+if not DEBUG:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader',
+         TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
 
 WSGI_APPLICATION = 'LaundryBear.wsgi.application'
 
@@ -100,13 +130,53 @@ WSGI_APPLICATION = 'LaundryBear.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.8/ref/settings/#databases
 
+#LaundryBear.sqlite3 is the SQLite backend tuned for concurrent writes
+#(see LaundryBear/sqlite3/base.py). Connections are kept open between
+#requests for CONN_MAX_AGE seconds.
+#The replica serves the reads of list views, reports and the API (see
+#LaundryBear/replicas.py). Locally it is a copy of the primary that the
+#refresh_replica command renews, and it is not used until the first copy
+#is made. Its connections are not kept, as every copy replaces the file.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'LaundryBear.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['LaundryBear.replicas.ReplicaRouter']
+
+#Seconds the replica may trail the primary. Browsers that write read from
+#the primary for this long, and refresh_replica copies this often.
+REPLICA_MAX_LAG = 60
+
+#Every process on the host shares the cache, so whatever one of them
+#clears (the fees, catalog responses, API tokens) is gone for all of them.
+#The default per-process memory cache would leave the others serving their
+#stale copies until these expire. The host offers no memcached, and a
+#database cache would make every cache hit a query, so the cache is kept
+#in files; FileCache only counts them to cull every CULL_EVERY writes (see
+#LaundryBear/caching.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'LaundryBear.caching.FileCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_EVERY': 200,
+        },
+    },
+}
+
+#The tests use a cache of their own (see LaundryBear/testrunner.py)
+TEST_RUNNER = 'LaundryBear.testrunner.TestRunner'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
@@ -126,6 +196,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.8/howto/static-files/
 
 STATIC_URL = '/static/'
-STATIC_ROOT = './static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+#Outside of DEBUG collectstatic also writes the files under content hashed
+#names, with gzipped copies, and StaticFilesMiddleware serves them for a
+#year. Other names are cached for STATIC_MAX_AGE seconds
+#(see LaundryBear/assets.py).
+if not DEBUG:
+    STATICFILES_STORAGE = 'LaundryBear.assets.CompressedManifestStorage'
+STATIC_MAX_AGE = 60
 
 SITE_ID = 1
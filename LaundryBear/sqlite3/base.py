@@ -0,0 +1,44 @@
+from django.db.backends.sqlite3 import base as sqlite3
+
+#The SQLite backend with the settings a web server writing from several
+#threads or processes needs:
+#- WAL journaling, so reads do not block the writer nor the writer reads
+#- a busy timeout, so a writer waits for the lock instead of failing
+#- transactions that take the write lock when they begin. Django begins
+#  them deferred, and a transaction that reads before it writes cannot
+#  wait for a writer that got in first, so it fails at once with
+#  "database is locked" whatever the timeout.
+#Pragmas can be changed or added through a 'PRAGMAS' dict in the OPTIONS
+#of the database.
+
+PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    # safe with WAL, only the last commits can be lost on power loss
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    # in KiB when negative
+    ('cache_size', -16000),
+    ('mmap_size', 64 * 1024 * 1024),
+]
+
+
+class DatabaseWrapper(sqlite3.DatabaseWrapper):
+    def get_pragmas(self):
+        pragmas = dict(self.settings_dict['OPTIONS'].get('PRAGMAS', {}))
+        defaults = [(name, pragmas.pop(name, value))
+                    for name, value in PRAGMAS]
+        return defaults + sorted(pragmas.items())
+
+    def get_connection_params(self):
+        kwargs = super(DatabaseWrapper, self).get_connection_params()
+        kwargs.pop('PRAGMAS', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        for name, value in self.get_pragmas():
+            conn.execute('PRAGMA {0} = {1}'.format(name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,61 @@
+import copy
+import os
+
+from django.conf import settings
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.utils import get_app_template_dirs
+
+#Outside of DEBUG templates are loaded through the cached loader, which
+#reads and compiles each template once per process. warm_up_templates
+#compiles every template of the project's apps up front, so the first
+#requests after a deploy do not pay for it (see LaundryBear/wsgi.py).
+
+TEMPLATE_SUFFIXES = ('.html', '.txt')
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+
+
+def get_project_templates():
+    """ Names of the templates of the apps in this project. """
+    names = []
+    for directory in get_app_template_dirs('templates'):
+        if not directory.startswith(settings.BASE_DIR + os.sep):
+            continue
+        for root, dirs, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith(TEMPLATE_SUFFIXES):
+                    path = os.path.join(root, filename)
+                    names.append(os.path.relpath(path, directory)
+                                 .replace(os.sep, '/'))
+    return sorted(names)
+
+
+def get_templates_setting(cached):
+    """ settings.TEMPLATES with or without the cached loader. """
+    templates = copy.deepcopy(settings.TEMPLATES)
+    options = templates[0]['OPTIONS']
+    loaders = options['loaders']
+    if loaders and loaders[0][0] == CACHED_LOADER:
+        loaders = loaders[0][1]
+    options['loaders'] = [(CACHED_LOADER, loaders)] if cached else loaders
+    return templates
+
+
+def uses_cached_loader(engine):
+    return any(isinstance(loader, CachedLoader)
+               for loader in engine.engine.template_loaders)
+
+
+def warm_up_templates(engine=None):
+    """
+    Compile every project template into the cache of the cached loader.
+    Returns the number of templates compiled, none without the cached
+    loader.
+    """
+    engine = engine or engines['django']
+    if not uses_cached_loader(engine):
+        return 0
+    names = get_project_templates()
+    for name in names:
+        engine.get_template(name)
+    return len(names)
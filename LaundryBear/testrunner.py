@@ -0,0 +1,28 @@
+import copy
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests with a cache in a temporary directory, so they neither
+    clear nor read the cache of a site running on the same host, and
+    nothing cached is left over for the next run.
+    """
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp()
+        caches = copy.deepcopy(settings.CACHES)
+        for cache in caches.values():
+            cache['LOCATION'] = self.cache_dir
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
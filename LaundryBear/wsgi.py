@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "LaundryBear.settings")
 
 application = get_wsgi_application()
+
+# compile the templates now rather than in the first requests
+from LaundryBear.templating import warm_up_templates
+warm_up_templates()
@@ -0,0 +1,70 @@
+import hashlib
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+#Every API request authenticates with a token, so the token and its user
+#are kept in process memory and in the Django cache for a short time.
+#Deleting the token or saving its user clears both (see api/signals.py).
+#Other processes only share the Django cache (see CACHES in the settings),
+#so their memory copy is trusted for TOKEN_MEMORY_TIMEOUT seconds only,
+#after which a revoked token stops working in them too. Users deactivated
+#without the signals, as with update(), are caught as well, since whether
+#the user is active is read again whenever the memory copy is renewed.
+
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_MEMORY_TIMEOUT = 10
+
+_tokens = {}
+
+
+def get_cache_key(key):
+    #Keep the token itself out of the cache keys
+    return 'api:token:{0}'.format(hashlib.sha1(key.encode('utf-8'))
+                                  .hexdigest())
+
+
+def get_cached_token(key):
+    """ The cached token with its user loaded, or None. """
+    token, expires = _tokens.get(key, (None, 0))
+    if token is not None and expires > time.time():
+        return token
+    token = cache.get(get_cache_key(key))
+    if token is not None:
+        token.user.is_active = User.objects.filter(
+            pk=token.user_id, is_active=True).exists()
+        _tokens[key] = (token, time.time() + TOKEN_MEMORY_TIMEOUT)
+    return token
+
+
+def cache_token(token):
+    cache.set(get_cache_key(token.key), token, TOKEN_CACHE_TIMEOUT)
+    _tokens[token.key] = (token, time.time() + TOKEN_MEMORY_TIMEOUT)
+
+
+def clear_token(key):
+    """ Forget the cached token with the given key. """
+    _tokens.pop(key, None)
+    cache.delete(get_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers each token and its user, so most
+    requests authenticate without a query. The user is shared between
+    requests, so copy it before changing it.
+    """
+    def authenticate_credentials(self, key):
+        token = get_cached_token(key)
+        if token is None:
+            user, token = super(CachedTokenAuthentication,
+                                self).authenticate_credentials(key)
+            cache_token(token)
+        elif not token.user.is_active:
+            # as TokenAuthentication does
+            raise exceptions.AuthenticationFailed(
+                'User inactive or deleted.')
+        return (token.user, token)
@@ -0,0 +1,26 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class LookupFilterBackend(BaseFilterBackend):
+    """
+    Filters the list by the query parameters named in the view's
+    filter_lookups, a dict of parameter name to either a queryset lookup
+    (e.g. 'request_date__gte') or a function taking the queryset and the
+    value.
+    """
+    def filter_queryset(self, request, queryset, view):
+        lookups = getattr(view, 'filter_lookups', {})
+        for param, lookup in lookups.items():
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                if callable(lookup):
+                    queryset = lookup(queryset, value)
+                else:
+                    queryset = queryset.filter(**{lookup: value})
+            except (ValueError, DjangoValidationError):
+                raise ValidationError({param: ['Invalid value.']})
+        return queryset
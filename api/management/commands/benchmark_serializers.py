@@ -0,0 +1,93 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import OrderSerializer
+from database.models import (LaundryShop, Order, Price, Service, Transaction,
+                             UserProfile)
+
+
+class Rollback(Exception):
+    pass
+
+
+class PlainOrderSerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = Order
+
+
+class Command(BaseCommand):
+    help = ('Times serializing orders for the API with the stock hyperlinked '
+            'serializer, the prefixed URL serializer and the values() fast '
+            'path. The orders are made up and rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=1000,
+                            help='Number of orders to serialize.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Best of this many runs is reported.')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                self.create_orders(options['objects'])
+                self.run(options['objects'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_orders(self, count):
+        user = User.objects.create_user(username='benchmark-serializers')
+        profile = UserProfile.objects.create(client=user,
+                                             contact_number='12345',
+                                             province='Cebu',
+                                             barangay='Lahug')
+        shop = LaundryShop.objects.create(name='Benchmark', province='Cebu',
+                                          barangay='Lahug',
+                                          contact_number='12345',
+                                          hours_open='24 hours',
+                                          days_open='Mon - Sun')
+        service = Service.objects.create(name='Benchmark', description='')
+        price = Price.objects.create(laundry_shop=shop, service=service,
+                                     price=45, duration=3)
+        transaction = Transaction.objects.create(client=profile)
+        Order.objects.bulk_create(
+            Order(price=price, transaction=transaction, pieces=1,
+                  unit_price=45) for i in range(count))
+        self.queryset = Order.objects.filter(transaction=transaction)
+
+    def run(self, count, repeat):
+        request = Request(APIRequestFactory().get('/api/orders/'))
+        context = {'request': request}
+
+        def plain():
+            PlainOrderSerializer(self.queryset.all(), many=True,
+                                 context=context).data
+
+        def prefixed():
+            OrderSerializer(self.queryset.all(), many=True,
+                            context=context).data
+
+        def values():
+            serializer = OrderSerializer(context=context)
+            values_fields = serializer.get_values_fields()
+            sources = set(source for name, source, convert in values_fields)
+            [serializer.to_values_representation(row, values_fields)
+             for row in self.queryset.values(*sources)]
+
+        for name, function in [('hyperlinked', plain),
+                               ('prefixed urls', prefixed),
+                               ('values()', values)]:
+            best = min(self.time(function) for i in range(repeat))
+            self.stdout.write('{0:<14} {1:8.1f} ms per 1,000 orders'.format(
+                name, best * 1000 * 1000 / count))
+
+    def time(self, function):
+        start = time.time()
+        function()
+        return time.time() - start
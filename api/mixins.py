@@ -0,0 +1,95 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+from rest_framework.response import Response
+
+from database.catalog import get_catalog_version
+
+
+class ValuesListMixin(object):
+    """
+    Viewset mixin which reads list responses straight from values() rows,
+    skipping model instances, when the serializer can represent them that
+    way. The output is the same as the serializer's.
+    """
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        values_fields = serializer.get_values_fields()
+        if values_fields is None:
+            return super(ValuesListMixin, self).list(request, *args, **kwargs)
+
+        #The pagination cursor needs the ordering fields of each row
+        ordering = getattr(self, 'ordering', None) or ()
+        if isinstance(ordering, basestring):
+            ordering = (ordering,)
+        sources = set(source for name, source, convert in values_fields)
+        sources.update(name.lstrip('-') for name in ordering)
+        sources.add('pk')
+
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values(*sources)
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        data = [serializer.to_values_representation(row, values_fields)
+                for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class CatalogCacheMixin(object):
+    """
+    Viewset mixin which caches list and detail data per URL until the
+    catalog changes, and answers If-None-Match and If-Modified-Since with
+    304 Not Modified. Views using it read from the primary, as data cached
+    from a lagging replica would be served until the next change.
+    """
+    response_cache_timeout = 60 * 60
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super(CatalogCacheMixin, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super(CatalogCacheMixin, self).retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        version, last_modified = get_catalog_version()
+        #Links in the data are absolute, so the host is part of the key
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(u'{0}:{1}'.format(version, url)
+                             .encode('utf-8')).hexdigest()
+        etag = quote_etag(digest)
+
+        if self.is_not_modified(request, digest, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            key = 'api:response:{0}'.format(digest)
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.data, self.response_cache_timeout)
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def is_not_modified(self, request, digest, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return digest in etags or '*' in etags
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'))
+        return if_modified_since is not None and \
+            last_modified <= if_modified_since
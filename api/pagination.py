@@ -0,0 +1,27 @@
+from django.utils import six
+from rest_framework.pagination import CursorPagination
+
+
+class OrderedCursorPagination(CursorPagination):
+    """
+    Cursor pagination in the order given by the view's ordering attribute,
+    or by primary key if it has none.
+    """
+    page_size = 50
+    ordering = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None)
+        if ordering is None:
+            return super(OrderedCursorPagination, self).get_ordering(
+                request, queryset, view)
+        if isinstance(ordering, basestring):
+            return (ordering,)
+        return tuple(ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        #Rows read with values() are dicts
+        if isinstance(instance, dict):
+            return six.text_type(instance[ordering[0].lstrip('-')])
+        return super(OrderedCursorPagination, self)._get_position_from_instance(
+            instance, ordering)
@@ -1,46 +1,224 @@
+from collections import OrderedDict
+
 from django.contrib.auth.models import User, Group
+from django.core.urlresolvers import Resolver404, resolve
+from django.db.models.fields import FieldDoesNotExist
+from django.utils.six.moves.urllib import parse as urlparse
+from django.utils import six
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from database.models import *
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+#Placeholder primary key used to reverse a view once, leaving the prefix
+#and suffix of every object URL
+URL_PK_PLACEHOLDER = 'pk-placeholder'
+
+
+class PrefixedUrlMixin(object):
+    """
+    Hyperlinked field mixin which reverses the view once and then builds
+    the URL of each object from the cached prefix and suffix.
+    """
+    def get_url(self, obj, view_name, request, format):
+        if self.lookup_field != 'pk':
+            return super(PrefixedUrlMixin, self).get_url(obj, view_name,
+                                                         request, format)
+        if obj.pk in (None, ''):
+            return None
+        return self.get_pk_url(obj.pk, view_name, request, format)
+
+    def get_url_parts(self, view_name, request, format):
+        url_parts = self.__dict__.setdefault('_url_parts', {})
+        if (view_name, format) not in url_parts:
+            url = self.reverse(view_name,
+                kwargs={self.lookup_url_kwarg: URL_PK_PLACEHOLDER},
+                request=request, format=format)
+            url_parts[view_name, format] = url.split(URL_PK_PLACEHOLDER)
+        return url_parts[view_name, format]
+
+    def get_pk_url(self, pk, view_name, request, format):
+        prefix, suffix = self.get_url_parts(view_name, request, format)
+        return prefix + six.text_type(pk) + suffix
+
+    def get_pk_url_function(self):
+        """
+        Function giving the URL of a primary key, as to_representation does.
+        """
+        format = self.context.get('format', None)
+        if format and self.format and self.format != format:
+            format = self.format
+        prefix, suffix = self.get_url_parts(self.view_name,
+                                            self.context['request'], format)
+        return lambda pk: prefix + six.text_type(pk) + suffix
+
+    def get_name(self, obj):
+        return six.text_type(obj.pk)
+
+
+class PrefixedHyperlinkedRelatedField(PrefixedUrlMixin,
+                                      serializers.HyperlinkedRelatedField):
+    pass
+
+
+class PrefixedHyperlinkedIdentityField(PrefixedUrlMixin,
+                                       serializers.HyperlinkedIdentityField):
+    pass
+
+
+class SparseFieldsMixin(object):
+    """
+    Serializer mixin which leaves out the fields not named in the comma
+    separated fields parameter when reading, e.g. ?fields=url,name.
+    """
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        fields = request.query_params.get('fields')
+        if fields:
+            wanted = set(name.strip() for name in fields.split(','))
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class FastHyperlinkedModelSerializer(SparseFieldsMixin,
+                                     serializers.HyperlinkedModelSerializer):
+    """
+    Hyperlinked serializer whose links skip the per object reverse(), and
+    which can also represent rows read with values().
+    """
+    serializer_related_field = PrefixedHyperlinkedRelatedField
+    serializer_url_field = PrefixedHyperlinkedIdentityField
+
+    def get_values_fields(self):
+        """
+        The (name, values() field, conversion) of every readable field, or
+        None if some field needs the model instance.
+        """
+        model = self.Meta.model
+        values_fields = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, PrefixedHyperlinkedIdentityField):
+                values_fields.append((name, 'pk', field.get_pk_url_function()))
+                continue
+            if isinstance(field, PrefixedHyperlinkedRelatedField):
+                convert = field.get_pk_url_function()
+            elif isinstance(field, (serializers.RelatedField,
+                                    serializers.ManyRelatedField)):
+                return None
+            else:
+                convert = field.to_representation
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if model_field.many_to_many or model_field.one_to_many:
+                return None
+            values_fields.append((name, field.source, convert))
+        return values_fields
+
+    def to_values_representation(self, row, values_fields):
+        ret = OrderedDict()
+        for name, source, convert in values_fields:
+            value = row[source]
+            ret[name] = None if value is None else convert(value)
+        return ret
+
+
+class UserSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = User
         fields = ('url', 'username', 'email', 'groups')
 
 
-class GroupSerializer(serializers.HyperlinkedModelSerializer):
+class GroupSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = Group
         fields = ('url', 'name')
 
 
-class LaundryShopSerializer(serializers.HyperlinkedModelSerializer):
+class LaundryShopSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = LaundryShop
+        #The other columns are kept for the site's own use
+        fields = ('url', 'name', 'province', 'city', 'barangay', 'street',
+                  'building', 'contact_number', 'email', 'website',
+                  'hours_open', 'days_open', 'creation_date',
+                  'average_rating')
 
 
-class TransactionSerializer(serializers.HyperlinkedModelSerializer):
+class TransactionSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = Transaction
         fields = ('url', 'paws', 'status', 'request_date', 'delivery_date',
                   'province', 'city', 'barangay', 'street', 'building',
                   'price', 'client',) #'order')
 
-class UserProfileSerializer(serializers.HyperlinkedModelSerializer):
+class UserProfileSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = UserProfile
+        fields = ('url', 'client', 'province', 'city', 'barangay', 'street',
+                  'building', 'contact_number')
 
 
-class OrderSerializer(serializers.HyperlinkedModelSerializer):
+class OrderSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = Order
 
 
-class PriceSerializer(serializers.HyperlinkedModelSerializer):
+class PriceSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = Price
 
 
-class ServiceSerializer(serializers.HyperlinkedModelSerializer):
+class ServiceSerializer(FastHyperlinkedModelSerializer):
     class Meta:
         model = Service
+
+
+class PriceKeyField(serializers.Field):
+    """
+    A Price given by primary key or by its URL. Reading it does not query
+    the database; unknown prices are reported when the order is saved.
+    """
+    default_error_messages = {
+        'invalid': 'Expected the primary key or URL of a price.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, six.string_types) and not data.isdigit():
+            try:
+                match = resolve(urlparse.urlparse(data).path)
+            except Resolver404:
+                self.fail('invalid')
+            if match.url_name != 'price-detail':
+                self.fail('invalid')
+            data = match.kwargs['pk']
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('invalid')
+
+    def to_representation(self, value):
+        return value
+
+
+class BatchOrderLineSerializer(serializers.Serializer):
+    price = PriceKeyField()
+    pieces = serializers.IntegerField(min_value=1)
+
+
+class BatchOrderSerializer(serializers.Serializer):
+    """
+    The orders of a batch order request. The transaction fields are read
+    by client.forms.TransactionForm.
+    """
+    orders = BatchOrderLineSerializer(many=True)
+
+    def validate_orders(self, orders):
+        if not orders:
+            raise serializers.ValidationError('No services were selected.')
+        return orders
@@ -1,11 +1,34 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.conf import settings
 
+from api.authentication import clear_token
+
 # This code is triggered whenever a new user has been created and saved to the database
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+# Cached tokens (see api/authentication.py) are dropped when the token is
+# deleted, also when its user is, or when its user changes, e.g. is
+# deactivated
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def clear_cached_token(sender, instance, **kwargs):
+    clear_token(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def clear_cached_user_tokens(sender, instance, created=False,
+                             update_fields=None, **kwargs):
+    # logging in only saves last_login
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key',
+                                                                flat=True):
+        clear_token(key)
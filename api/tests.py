@@ -1,3 +1,447 @@
-from django.test import TestCase
+import json
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.authentication import _tokens, get_cache_key
+from api.urls import router
+from api.serializers import (OrderSerializer, TransactionSerializer,
+                             UserProfileSerializer, UserSerializer)
+
+from database.catalog import CATALOG_VERSION_KEY
+from database.models import (LaundryShop, Order, Price, Service, Transaction,
+                             UserProfile)
+from database.ratings import adjust_ratings
+from LaundryBear.querybudget import QueryBudgetTestMixin, get_query_budget
+
 
 # Create your tests here.
+class TransactionListTestCase(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='test', password='runner')
+        self.client.force_authenticate(user)
+        self.profile = UserProfile.objects.create(client=user,
+                                                  contact_number='12345',
+                                                  province='cebu',
+                                                  barangay='lahug')
+        service = Service.objects.create(name='wash', description='wash')
+        self.shops = []
+        self.prices = []
+        for name in ('Bubbles', 'Suds'):
+            shop = LaundryShop.objects.create(name=name, province='cebu',
+                                              barangay='lahug',
+                                              contact_number='123',
+                                              hours_open='24 hours',
+                                              days_open='Sun - Sat')
+            self.shops.append(shop)
+            self.prices.append(Price.objects.create(laundry_shop=shop,
+                                                    service=service,
+                                                    price=45, duration=3))
+        self.now = timezone.now()
+
+    def create_transactions(self, count, status=1, shop=0, days_ago=0):
+        for i in range(count):
+            transaction = Transaction.objects.create(client=self.profile,
+                                                     status=status)
+            Transaction.objects.filter(pk=transaction.pk).update(
+                request_date=self.now - timedelta(days=days_ago))
+            for pieces in (3, 5):
+                Order.objects.create(price=self.prices[shop],
+                                     transaction=transaction, pieces=pieces)
+
+    def get_list(self, url=None, **params):
+        response = self.client.get(url or reverse('transaction-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_pages(self):
+        self.create_transactions(60)
+        data = self.get_list()
+        self.assertEqual(len(data['results']), 50)
+        self.assertIsNone(data['previous'])
+        urls = [t['url'] for t in data['results']]
+        data = self.get_list(data['next'])
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['next'])
+        urls.extend(t['url'] for t in data['results'])
+        self.assertEqual(len(set(urls)), 60)
+
+    def test_filters(self):
+        self.create_transactions(2, status=1, shop=0)
+        self.create_transactions(3, status=3, shop=1)
+        self.create_transactions(4, status=3, shop=0, days_ago=10)
+        self.assertEqual(len(self.get_list(status=3)['results']), 7)
+        self.assertEqual(len(self.get_list(shop=self.shops[1].pk)['results']),
+                         3)
+        after = (self.now - timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.get_list(status=3,
+                                           requested_after=after)['results']),
+                         3)
+        self.assertEqual(len(self.get_list(client=self.profile.pk)['results']),
+                         9)
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('transaction-list'),
+                                   {'status': 'done'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+    def test_sparse_fields(self):
+        self.create_transactions(1)
+        data = self.get_list(fields='url,status')
+        self.assertEqual(set(data['results'][0]), {'url', 'status'})
+        data = self.get_list(reverse('laundryshop-list'), fields='name')
+        self.assertEqual([shop for shop in data['results']],
+                         [{'name': 'Bubbles'}, {'name': 'Suds'}])
+
+    def assertSameAsPlainSerializer(self, view_name, serializer_class,
+                                    queryset, **params):
+        """
+        The list matches what a stock HyperlinkedModelSerializer gives.
+        """
+        class PlainSerializer(serializers.HyperlinkedModelSerializer):
+            Meta = serializer_class.Meta
+
+        url = reverse(view_name)
+        request = Request(APIRequestFactory().get(url, params))
+        expected = PlainSerializer(queryset, many=True,
+                                   context={'request': request}).data
+        response = self.client.get(url, params)
+        self.assertEqual(json.loads(response.content)['results'],
+                         json.loads(json.dumps(expected)))
+
+    def test_fast_lists_match_serializers(self):
+        self.create_transactions(3)
+        self.assertSameAsPlainSerializer('transaction-list',
+            TransactionSerializer,
+            Transaction.objects.order_by('-request_date', '-pk'))
+        self.assertSameAsPlainSerializer('order-list', OrderSerializer,
+                                         Order.objects.order_by('pk'))
+        self.assertSameAsPlainSerializer('userprofile-list',
+                                         UserProfileSerializer,
+                                         UserProfile.objects.order_by('pk'))
+        self.assertSameAsPlainSerializer('user-list', UserSerializer,
+            User.objects.order_by('-date_joined', '-pk'))
+
+    def test_fast_list_queries(self):
+        self.create_transactions(20)
+        # the orders page and nothing per order
+        with self.assertNumQueries(1):
+            self.client.get(reverse('order-list'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('userprofile-list'))
+
+
+class CatalogCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_superuser(username='test',
+                                             password='runner',
+                                             email='user@mail.com')
+        self.client.force_authenticate(user)
+        self.shop = LaundryShop.objects.create(name='Bubbles',
+                                               province='cebu',
+                                               barangay='lahug',
+                                               contact_number='123',
+                                               hours_open='24 hours',
+                                               days_open='Sun - Sat')
+        self.service = Service.objects.create(name='wash',
+                                              description='wash')
+        self.price = Price.objects.create(laundry_shop=self.shop,
+                                          service=self.service, price=45,
+                                          duration=3)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_responses_skip_database(self):
+        for view_name in ('laundryshop-list', 'service-list', 'price-list'):
+            first = self.client.get(reverse(view_name))
+            with self.assertNumQueries(0):
+                second = self.client.get(reverse(view_name))
+            self.assertEqual(first.content, second.content)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('laundryshop-detail', args=[self.shop.pk]))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('laundryshop-detail', args=[self.shop.pk]))
+
+    def test_internal_columns_are_left_out(self):
+        response = self.client.get(reverse('laundryshop-detail',
+                                           args=[self.shop.pk]))
+        for name in ('modified', 'paws_total', 'raters', 'location', 'area'):
+            self.assertNotIn(name, response.data)
+        self.assertEqual(response.data['average_rating'], '0.00')
+
+    def test_params_are_part_of_key(self):
+        self.client.get(reverse('laundryshop-list'))
+        response = self.client.get(reverse('laundryshop-list'),
+                                   {'fields': 'name'})
+        self.assertEqual(response.data['results'], [{'name': 'Bubbles'}])
+
+    def test_not_modified(self):
+        response = self.client.get(reverse('service-list'))
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response = self.client.get(reverse('service-list'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(reverse('service-list'),
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse('service-list'),
+                                   HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate(self):
+        etag = self.client.get(reverse('service-list'))['ETag']
+        Service.objects.create(name='dry', description='dry')
+        response = self.client.get(reverse('service-list'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.price.delete()
+        response = self.client.get(reverse('price-list'))
+        self.assertEqual(response.data['results'], [])
+
+    def test_other_processes_see_changes(self):
+        # a cache of its own, like the one of another process
+        other = FileBasedCache(settings.CACHES['default']['LOCATION'], {})
+        self.client.get(reverse('service-list'))
+        version = other.get(CATALOG_VERSION_KEY)
+        self.assertIsNotNone(version)
+        Service.objects.create(name='dry', description='dry')
+        self.assertNotEqual(other.get(CATALOG_VERSION_KEY), version)
+
+    def test_ratings_invalidate(self):
+        self.client.get(reverse('laundryshop-list'))
+        adjust_ratings([self.shop.pk], 4, 1)
+        response = self.client.get(reverse('laundryshop-list'))
+        self.assertEqual(response.data['results'][0]['average_rating'],
+                         '4.00')
+
+    def test_shop_price_formset_invalidates(self):
+        self.client.get(reverse('price-list'))
+        self.client.login(username='test', password='runner')
+        data = {'name': 'Bubbles', 'province': 'cebu', 'barangay': 'lahug',
+                'contact_number': '09171234567', 'hours_open': '24 hours',
+                'days_open': 'Sun - Sat',
+                'price_set-TOTAL_FORMS': '1', 'price_set-INITIAL_FORMS': '1',
+                'price_set-MIN_NUM_FORMS': '0',
+                'price_set-MAX_NUM_FORMS': '1000',
+                'price_set-0-id': self.price.pk,
+                'price_set-0-laundry_shop': self.shop.pk,
+                'price_set-0-service': self.service.pk,
+                'price_set-0-price': '60.00', 'price_set-0-duration': '3'}
+        self.client.post(reverse('management:edit-shop', args=[self.shop.pk]),
+                         data)
+        response = self.client.get(reverse('price-list'))
+        self.assertEqual(response.data['results'][0]['price'], '60.00')
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test',
+                                             password='runner')
+        self.token = Token.objects.get(user=self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {0}'.format(self.token.key))
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_status(self):
+        return self.client.get(reverse('userprofile-list')).status_code
+
+    def test_cached_token_skips_query(self):
+        self.assertEqual(self.get_status(), 200)
+        # only the profiles
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_status(), 200)
+
+    def test_shared_cache_is_used(self):
+        self.get_status()
+        _tokens.clear()
+        # whether the user is active and the profiles
+        with self.assertNumQueries(2):
+            self.get_status()
+
+    def test_user_deactivated_without_signals(self):
+        self.get_status()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # once the memory copy of the token is renewed
+        _tokens.clear()
+        self.assertEqual(self.get_status(), 401)
+        self.assertEqual(self.get_status(), 401)
+
+    def test_deleted_token(self):
+        self.get_status()
+        self.token.delete()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_other_processes_see_deleted_token(self):
+        # a cache of its own, like the one of another process
+        other = FileBasedCache(settings.CACHES['default']['LOCATION'], {})
+        key = get_cache_key(self.token.key)
+        self.get_status()
+        self.assertIsNotNone(other.get(key))
+        self.token.delete()
+        self.assertIsNone(other.get(key))
+
+    def test_deactivated_user(self):
+        self.get_status()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(self.get_status(), 401)
+
+
+class BatchOrderTestCase(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='test', password='runner')
+        self.client.force_authenticate(user)
+        self.profile = UserProfile.objects.create(client=user,
+                                                  contact_number='12345',
+                                                  province='cebu',
+                                                  barangay='lahug')
+        shop = LaundryShop.objects.create(name='Bubbles', province='cebu',
+                                          barangay='lahug',
+                                          contact_number='123',
+                                          hours_open='24 hours',
+                                          days_open='Sun - Sat')
+        self.prices = [Price.objects.create(laundry_shop=shop,
+            service=Service.objects.create(name=name, description=name),
+            price=45, duration=3) for name in ('wash', 'dry', 'fold')]
+        self.data = {'delivery_date': '2016-07-10', 'province': 'cebu',
+                     'city': 'cebu', 'barangay': 'lahug',
+                     'street': 'gorordo', 'building': ''}
+
+    def post_batch(self, orders, **data):
+        data = dict(self.data, orders=orders, **data)
+        return self.client.post(reverse('order-batch'), data, format='json')
+
+    def test_batch_creates_tree(self):
+        price_url = self.client.get(reverse('price-detail',
+                                            args=[self.prices[1].pk])).data['url']
+        response = self.post_batch([{'price': self.prices[0].pk, 'pieces': 7},
+                                    {'price': price_url, 'pieces': 14}])
+        self.assertEqual(response.status_code, 201)
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.client, self.profile)
+        self.assertEqual(response.data['price'], str(transaction.total))
+        self.assertEqual(len(response.data['orders']), 2)
+        self.assertEqual(sorted(order['pieces']
+                                for order in response.data['orders']),
+                         [7, 14])
+        self.assertEqual(response.data['orders'][0]['transaction'],
+                         response.data['url'])
+
+    def test_invalid_lines_save_nothing(self):
+        for orders in ([], [{'price': self.prices[0].pk, 'pieces': 0}],
+                       [{'price': 'http://testserver/api/shops/1/',
+                         'pieces': 1}],
+                       [{'price': self.prices[0].pk, 'pieces': 1},
+                        {'price': 9999, 'pieces': 1}]):
+            response = self.post_batch(orders)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('orders', response.data)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_transaction_saves_nothing(self):
+        response = self.post_batch([{'price': self.prices[0].pk,
+                                     'pieces': 1}], province='')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('province', response.data)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, APITestCase):
+    def setUp(self):
+        user = User.objects.create_superuser(username='test',
+                                             password='runner',
+                                             email='user@mail.com')
+        self.client.credentials(HTTP_AUTHORIZATION='Token {0}'.format(
+            Token.objects.get(user=user).key))
+        self.profile = UserProfile.objects.create(client=user,
+                                                  contact_number='12345',
+                                                  province='cebu',
+                                                  barangay='lahug')
+        services = [Service.objects.create(name=name, description=name)
+                    for name in ('wash', 'dry', 'fold')]
+        self.prices = []
+        for i in range(3):
+            shop = LaundryShop.objects.create(name='shop{0}'.format(i),
+                                              province='cebu',
+                                              barangay='lahug',
+                                              contact_number='123',
+                                              hours_open='24 hours',
+                                              days_open='Sun - Sat')
+            prices = [Price.objects.create(laundry_shop=shop,
+                                           service=service, price=45,
+                                           duration=3)
+                      for service in services]
+            for status in (1, 2, 3):
+                transaction = Transaction.objects.create(
+                    client=self.profile, status=status, paws=status,
+                    province='cebu', barangay='lahug')
+                for price in prices:
+                    Order.objects.create(price=price,
+                                         transaction=transaction, pieces=3)
+            self.prices.extend(prices)
+
+    def tearDown(self):
+        cache.clear()
+
+    def request(self, method, name, args=(), data=None, **extra):
+        # every endpoint is requested with cold caches and token
+        cache.clear()
+        _tokens.clear()
+        return self.request_within_budget(method, reverse(name, args=args),
+                                          data, **extra)
+
+    def test_endpoints(self):
+        for prefix, viewset, base_name in router.registry:
+            self.request('get', '{0}-list'.format(base_name))
+            pk = viewset.queryset.model.objects.values_list(
+                'pk', flat=True).first()
+            if pk is not None:
+                self.request('get', '{0}-detail'.format(base_name), [pk])
+
+    def test_job_stats(self):
+        response = self.request('get', 'job-stats')
+        self.assertEqual(response.data['due'], 0)
+
+    def test_batch(self):
+        response = self.request('post', 'order-batch', data={
+            'delivery_date': '2016-07-10', 'province': 'cebu',
+            'city': 'cebu', 'barangay': 'lahug', 'street': 'gorordo',
+            'building': '',
+            'orders': [{'price': price.pk, 'pieces': 2}
+                       for price in self.prices[:3]]}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_obtain_auth_token(self):
+        self.client.credentials()
+        response = self.post_within_budget('/api-token-auth', {
+            'username': 'test', 'password': 'runner'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_every_viewset_has_a_budget(self):
+        for prefix, viewset, base_name in router.registry:
+            self.assertIsNotNone(getattr(viewset, 'query_budget', None),
+                                 base_name)
@@ -13,5 +13,6 @@ router.register(r'prices', views.PriceViewSet)
 router.register(r'services', views.ServiceViewSet)
 
 urlpatterns = [
+    url(r'^jobs/stats$', views.job_stats, name='job-stats'),
     url(r'^', include(router.urls))
 ]
@@ -1,74 +1,171 @@
 from django.contrib.auth.models import User, Group
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Prefetch
+from database.jobs import get_stats
 from database.models import *
-from rest_framework import viewsets
+from database.orders import save_transaction
+from client.forms import TransactionForm
+from rest_framework import status, viewsets
+from rest_framework.decorators import api_view, list_route, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from api.mixins import CatalogCacheMixin, ValuesListMixin
 from api.serializers import *
+from LaundryBear.querybudget import query_budget
 from rest_framework.authtoken import views as rest_views
 from django.views.decorators.csrf import *
 
-class UserViewSet(viewsets.ModelViewSet):
+#The query budgets cover reading the endpoints, with a cold token cache,
+#and placing a batch of orders; the other writes are not budgeted.
+
+def filter_by_shop(queryset, shop):
+    #A subquery instead of a join so each transaction is listed once
+    orders = Order.objects.filter(price__laundry_shop=shop)
+    return queryset.filter(pk__in=orders.values('transaction'))
+
+
+class UserViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    queryset = User.objects.prefetch_related('groups')
+    query_budget = {'get': 3}
+    use_replica = True
     serializer_class = UserSerializer
+    ordering = ('-date_joined', '-pk')
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows groups to be viewed or edited.
     """
     queryset = Group.objects.all()
+    query_budget = {'get': 2}
+    use_replica = True
     serializer_class = GroupSerializer
 
 
-class LaundryShopViewSet(viewsets.ModelViewSet):
+class LaundryShopViewSet(CatalogCacheMixin, ValuesListMixin,
+                          viewsets.ModelViewSet):
     """
     API endpoint that allows shops to be viewed or edited.
     """
     queryset = LaundryShop.objects.all()
+    query_budget = {'get': 2}
     serializer_class = LaundryShopSerializer
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
     queryset = Transaction.objects.all()
+    query_budget = {'get': 2}
+    use_replica = True
     serializer_class = TransactionSerializer
+    ordering = ('-request_date', '-pk')
+    filter_lookups = {
+        'status': 'status',
+        'client': 'client',
+        'shop': filter_by_shop,
+        'requested_after': 'request_date__gte',
+        'requested_before': 'request_date__lt',
+    }
 
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
     queryset = UserProfile.objects.all()
+    query_budget = {'get': 2}
+    use_replica = True
     serializer_class = UserProfileSerializer
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
     queryset = Order.objects.all()
+    query_budget = {'get': 2, 'post': 22}
+    use_replica = True
     serializer_class = OrderSerializer
-
-
-class PriceViewSet(viewsets.ModelViewSet):
+    filter_lookups = {
+        'transaction': 'transaction',
+        'price': 'price',
+    }
+
+    @list_route(methods=['post'])
+    def batch(self, request):
+        """
+        Places a transaction with all of its orders at once, e.g.
+        {"delivery_date": "2016-07-10", "province": "Cebu", ...,
+         "orders": [{"price": 1, "pieces": 3}, ...]}
+        Nothing is saved unless everything is valid. Responds with the
+        transaction and its orders.
+        """
+        serializer = BatchOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            client = request.user.userprofile
+        except UserProfile.DoesNotExist:
+            raise ValidationError({'client': ['Only clients can order.']})
+
+        selected = [(line['price'], line['pieces'])
+                    for line in serializer.validated_data['orders']]
+        try:
+            transaction = save_transaction(TransactionForm(request.data),
+                                           client, selected, field='orders')
+        except DjangoValidationError as e:
+            raise ValidationError(e.message_dict)
+
+        context = self.get_serializer_context()
+        data = TransactionSerializer(transaction, context=context).data
+        data['orders'] = OrderSerializer(transaction.order_set.all(),
+                                         many=True, context=context).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class PriceViewSet(CatalogCacheMixin, ValuesListMixin,
+                    viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
     queryset = Price.objects.all()
+    query_budget = {'get': 2}
     serializer_class = PriceSerializer
+    filter_lookups = {
+        'shop': 'laundry_shop',
+        'service': 'service',
+    }
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CatalogCacheMixin, ValuesListMixin,
+                      viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
-    queryset = Service.objects.all()
+    #Only the shop pks are needed for the links to the shops
+    queryset = Service.objects.prefetch_related(Prefetch('prices',
+        queryset=LaundryShop.objects.only('pk')))
+    query_budget = {'get': 3}
     serializer_class = ServiceSerializer
 
+@query_budget(2)
 @csrf_exempt
 def obtain_auth_token(request):
     print request.POST
     return rest_views.obtain_auth_token(request)
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def job_stats(request):
+    """
+    The depth of the job queue and how long the jobs of the last hour
+    waited and ran, for monitoring.
+    """
+    return Response(get_stats())
@@ -29,7 +29,12 @@ class OrderForm(ModelForm): #Used in creating or modifying an Order
 class TransactionForm(ModelForm): #Used in creating or modifying a transaction
     class Meta:
         model = Transaction
-        exclude = ['status', 'client', 'request_date', 'paws']
+        exclude = ['status', 'client', 'request_date', 'paws', 'price']
+
+
+class RatingForm(Form): #Used in rating a transaction from 1 to 5 paws
+    id = forms.IntegerField()
+    score = forms.IntegerField(min_value=1, max_value=5)
 
 
 class AddressForm(Form): #Used in modification of delivery address
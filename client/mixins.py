@@ -1,5 +1,31 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+
+from client.forms import TransactionForm
+from database.orders import create_transaction
 from LaundryBear.mixins import LoginRequiredMixin
 
 
 class ClientLoginRequiredMixin(LoginRequiredMixin):
     login_view_name = 'client:login'
+
+
+class CreateTransactionMixin(object):
+    """
+    Handles the AJAX order request sent from the order summary page.
+    Responds with the url to go to next, or with the errors as JSON.
+    """
+    def post(self, request, *args, **kwargs):
+        if not request.is_ajax():
+            return HttpResponse(status=400)
+        transaction_form = TransactionForm(request.POST)
+        try:
+            create_transaction(transaction_form, request.user.userprofile,
+                               request.POST.get('selectedServices'))
+        except ValidationError as e:
+            return HttpResponse(json.dumps(e.message_dict), status=400,
+                                content_type='application/json')
+        return HttpResponse(reverse('client:view-shops'))
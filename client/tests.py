@@ -1,8 +1,21 @@
+import json
+
+from decimal import Decimal
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
-from database.models import UserProfile
+from client import urls
+from client.forms import TransactionForm
+from database.models import (LaundryShop, Order, Price, Service, Transaction,
+                             UserProfile)
+from database.fees import clear_fees, get_fees
+from database.orders import create_transaction
+from database.ratings import adjust_ratings
+from LaundryBear.querybudget import QueryBudgetTestMixin, get_query_budget
 
 
 # Create your tests here.
@@ -54,3 +67,279 @@ class LoginTestCase(TestCase):
                          follow=True)
         response = self.client.get(reverse('client:login'))
         self.assertRedirects(response, reverse('client:menu'))
+
+
+class ShopsNearUserTestCase(TestCase):
+    def setUp(self):
+        u = User.objects.create_user(username='test', password='runner')
+        UserProfile.objects.create(client=u, contact_number='12345',
+                                   province='Cebu', city='Cebu City',
+                                   barangay='Lahug')
+        self.client.login(username='test', password='runner')
+
+    def create_shop(self, name, **address):
+        return LaundryShop.objects.create(name=name, contact_number='12345',
+                                          hours_open='24 hours',
+                                          days_open='mon - sat', **address)
+
+    def test_shops_in_user_barangay(self):
+        self.create_shop('Near', province='cebu', city=' cebu  city',
+                         barangay='LAHUG')
+        self.create_shop('Other city', province='Cebu', city='Mandaue',
+                         barangay='Lahug')
+        self.create_shop('Other barangay', province='Cebu', city='Cebu City',
+                         barangay='Mabolo')
+        response = self.client.get(reverse('client:view-shops'))
+        self.assertEqual([shop.name for shop in response.context['shop_list']],
+                         ['Near'])
+
+
+class CreateTransactionTestCase(TestCase):
+    def setUp(self):
+        u = User.objects.create_user(username='test', password='runner')
+        self.profile = UserProfile.objects.create(client=u,
+                                                  contact_number='12345',
+                                                  province='cebu', city='cebu',
+                                                  barangay='lahug')
+        self.client.login(username='test', password='runner')
+        shop = LaundryShop.objects.create(name='ls1', province='cebu',
+                                          barangay='lahug',
+                                          contact_number='12345',
+                                          hours_open='24 hours',
+                                          days_open='mon - sat')
+        self.prices = [
+            Price.objects.create(laundry_shop=shop, price=45, duration=3,
+                service=Service.objects.create(name='service{0}'.format(i),
+                                               description='service'))
+            for i in range(15)]
+        self.address = {'province': 'cebu', 'city': 'cebu',
+                        'barangay': 'lahug', 'street': 'gorordo',
+                        'building': '', 'delivery_date': '2016-07-10',
+                        'price': '100.00'}
+
+    def post_order(self, selected_services, **data):
+        data = dict(self.address, **data)
+        data['selectedServices'] = json.dumps(selected_services)
+        return self.client.post(reverse('client:create-transaction'), data,
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_create_transaction_with_orders(self):
+        services = [{'pk': price.pk, 'pieces': '3'} for price in self.prices]
+        response = self.post_order(services)
+        self.assertEqual(response.content, reverse('client:view-shops'))
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.client, self.profile)
+        self.assertEqual(transaction.order_set.count(), 15)
+
+    def test_totals_are_stored(self):
+        self.post_order([{'pk': self.prices[0].pk, 'pieces': 7},
+                         {'pk': self.prices[1].pk, 'pieces': 14}],
+                        price='1.00')
+        transaction = Transaction.objects.get()
+        fees = get_fees()
+        subtotal = Decimal('135.00')
+        service_charge = (subtotal * fees.service_charge).quantize(
+            Decimal('0.01'))
+        self.assertEqual(transaction.subtotal, subtotal)
+        self.assertEqual(transaction.service_charge, service_charge)
+        self.assertEqual(transaction.delivery_fee, fees.delivery_fee)
+        self.assertEqual(transaction.total,
+                         subtotal + service_charge + fees.delivery_fee)
+        # the posted price is ignored in favor of the computed total
+        self.assertEqual(transaction.price, transaction.total)
+
+    def test_price_changes_keep_order_history(self):
+        self.post_order([{'pk': self.prices[0].pk, 'pieces': 7}])
+        Price.objects.filter(pk=self.prices[0].pk).update(price=100)
+        order = Order.objects.get()
+        self.assertEqual(order.unit_price, 45)
+        self.assertEqual(order.subtotal, 45)
+
+    def test_order_summary_creates_transaction(self):
+        data = dict(self.address, selectedServices=json.dumps(
+            [{'pk': self.prices[0].pk, 'pieces': 2}]))
+        self.client.post(reverse('client:order-summary',
+                                 args=[self.prices[0].laundry_shop.pk]),
+                         data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(Order.objects.get().pieces, 2)
+
+    def test_bulk_insert_queries(self):
+        services = json.dumps([{'pk': price.pk, 'pieces': 3}
+                               for price in self.prices])
+        form = TransactionForm(self.address)
+        get_fees()
+        # savepoint, prices, barangay, transaction, orders, release savepoint
+        with self.assertNumQueries(6):
+            create_transaction(form, self.profile, services)
+
+    def test_unknown_price_saves_nothing(self):
+        services = [{'pk': self.prices[0].pk, 'pieces': 3},
+                    {'pk': 9999, 'pieces': 3}]
+        response = self.post_order(services)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('selectedServices', json.loads(response.content))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+    def test_invalid_form_saves_nothing(self):
+        response = self.post_order([{'pk': self.prices[0].pk, 'pieces': 3}],
+                                   province='')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('province', json.loads(response.content))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_invalid_selected_services(self):
+        form = TransactionForm(self.address)
+        for services in ['', 'not json', '[]', '[{"pk": 1}]',
+                         '[{"pk": 1, "pieces": 0}]']:
+            with self.assertRaises(ValidationError):
+                create_transaction(form, self.profile, services)
+
+
+class FragmentCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='test', password='runner')
+        UserProfile.objects.create(client=user, contact_number='12345',
+                                   province='cebu', city='cebu',
+                                   barangay='lahug')
+        self.shop = LaundryShop.objects.create(name='laundry',
+                                               province='cebu', city='cebu',
+                                               barangay='lahug',
+                                               contact_number='12345',
+                                               hours_open='24 hours',
+                                               days_open='mon - sat')
+        self.service = Service.objects.create(name='wash',
+                                              description='wash')
+        self.price = Price.objects.create(laundry_shop=self.shop,
+                                          service=self.service, price=45,
+                                          duration=3)
+        self.client.login(username='test', password='runner')
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_menu(self):
+        return self.client.get(reverse('client:order', args=[self.shop.pk]))
+
+    def test_service_menu_renders_from_cache(self):
+        self.get_menu()
+        # the prices are not queried for the cached menu
+        with self.assertNumQueries(3):
+            response = self.get_menu()
+        self.assertContains(response, 'Price: 45.00 pesos per kilo')
+
+    def test_service_menu_follows_changes(self):
+        self.get_menu()
+        self.price.price = 60
+        self.price.save()
+        self.assertContains(self.get_menu(), 'Price: 60.00 pesos per kilo')
+
+        self.service.name = 'dry clean'
+        self.service.save()
+        self.assertContains(self.get_menu(), 'dry clean')
+
+        self.price.delete()
+        self.assertNotContains(self.get_menu(), 'dry clean')
+
+    def test_shop_row_follows_rating(self):
+        url = reverse('client:view-shops')
+        self.assertContains(self.client.get(url), 'width: 0px;')
+        adjust_ratings([self.shop.pk], 5, 1)
+        self.assertContains(self.client.get(url), 'width: 150px;')
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='test', password='runner',
+                                        first_name='Juan', last_name='Cruz')
+        profile = UserProfile.objects.create(client=user,
+                                             contact_number='12345',
+                                             province='cebu', city='cebu',
+                                             barangay='lahug')
+        services = [Service.objects.create(name='service{0}'.format(i),
+                                           description='service')
+                    for i in range(3)]
+        self.shops = []
+        for i in range(3):
+            shop = LaundryShop.objects.create(name='laundry{0}'.format(i),
+                                              province='cebu', city='cebu',
+                                              barangay='lahug',
+                                              contact_number='12345',
+                                              hours_open='24 hours',
+                                              days_open='mon - sat')
+            transaction = Transaction.objects.create(client=profile,
+                                                     province='cebu',
+                                                     barangay='lahug')
+            for service in services:
+                price = Price.objects.create(laundry_shop=shop,
+                                             service=service, price=45,
+                                             duration=3)
+                Order.objects.create(price=price, transaction=transaction,
+                                     pieces=3)
+            self.shops.append(shop)
+        self.client.login(username='test', password='runner')
+
+    def request(self, method, name, args=(), data=None, **extra):
+        # every page is requested with cold caches
+        cache.clear()
+        clear_fees()
+        return self.request_within_budget(method, reverse(name, args=args),
+                                          data, **extra)
+
+    def test_pages(self):
+        shop = self.shops[0].pk
+        self.request('get', 'client:menu')
+        self.request('get', 'client:view-shops')
+        self.request('get', 'client:view-shops', data={'browse': 1})
+        self.request('get', 'client:view-shops', data={'q': 'laundry'})
+        self.request('get', 'client:usersettings')
+        self.request('get', 'client:order', [shop])
+        self.request('get', 'client:order-summary', [shop])
+        self.request('get', 'client:signup')
+
+    def test_rating_requires_a_valid_score(self):
+        transaction = Transaction.objects.first()
+        for data in ({'id': transaction.pk}, {'id': transaction.pk,
+                     'score': 'five'}, {'id': transaction.pk, 'score': 6}):
+            response = self.client.post(reverse('client:menu'), data)
+            self.assertEqual(response.status_code, 400)
+        transaction.refresh_from_db()
+        self.assertIsNone(transaction.paws)
+        self.shops[0].refresh_from_db()
+        self.assertEqual(self.shops[0].raters, 0)
+
+    def test_actions(self):
+        transaction = Transaction.objects.first()
+        self.request('post', 'client:menu',
+                     data={'id': transaction.pk, 'score': 4})
+        prices = Price.objects.filter(laundry_shop=self.shops[0])
+        self.request('post', 'client:create-transaction', data={
+            'province': 'cebu', 'barangay': 'lahug',
+            'delivery_date': '2016-07-10', 'price': '100.00',
+            'selectedServices': json.dumps([{'pk': price.pk, 'pieces': 3}
+                                            for price in prices])},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.request('post', 'client:usersettings', data={
+            'first_name': 'Juan', 'last_name': 'Cruz', 'username': 'test',
+            'province': 'cebu', 'barangay': 'lahug',
+            'contact_number': '09171234567'})
+        self.request('get', 'client:logout')
+        self.request('get', 'client:login')
+        self.request('post', 'client:login',
+                     data={'username': 'test', 'password': 'runner'})
+
+    def test_signup(self):
+        self.client.logout()
+        self.request('post', 'client:signup', data={
+            'user-first_name': 'Maria', 'user-last_name': 'Clara',
+            'user-username': 'maria', 'user-password1': 'secret',
+            'user-password2': 'secret', 'userprofile-province': 'cebu',
+            'userprofile-barangay': 'lahug',
+            'userprofile-contact_number': '09171234567'})
+        self.assertTrue(User.objects.filter(username='maria').exists())
+
+    def test_every_view_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            self.assertIsNotNone(get_query_budget(pattern.callback),
+                                 pattern.name)
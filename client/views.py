@@ -1,25 +1,25 @@
-import json
-
 from datetime import timedelta
 
 from django.contrib.auth import authenticate, login
 from django.core.urlresolvers import reverse
-from django.http import HttpResponse
-from django.shortcuts import redirect, render_to_response
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404, redirect, render_to_response
 from django.template import RequestContext
 from django.forms.models import model_to_dict
-from django.contrib.sites.models import Site
+from django.db.transaction import atomic
 from django.views.generic import (DetailView, ListView, TemplateView, View)
 from django.views.decorators.csrf import *
 from django.utils.decorators import method_decorator
 
-from client.forms import ProfileForm, UserForm, AddressForm, TransactionForm, ChangeUsernameForm
+from client.forms import ProfileForm, UserForm, AddressForm, ChangeUsernameForm, RatingForm
 
 from django.contrib.auth.forms import PasswordChangeForm
-from client.mixins import ClientLoginRequiredMixin
-from database.models import LaundryShop, Price, Transaction, Order, default_date
+from client.mixins import ClientLoginRequiredMixin, CreateTransactionMixin
+from database.fees import get_fees
+from database.models import LaundryShop, Price, Transaction, default_date
 
 from LaundryBear.forms import LoginForm
+from LaundryBear.mixins import SearchMixin
 from LaundryBear.views import LoginView, LogoutView
 
 #Django uses class based views to connect with templates.
@@ -29,6 +29,7 @@ from LaundryBear.views import LoginView, LogoutView
 
 #Inherits Class Based View "LoginView"
 class ClientLoginView(LoginView):
+    query_budget = 13
     template_name = "client/usersignin.html"
     form_class = LoginForm
     success_view_name = 'client:menu' #redirects to 'menu' after successful login
@@ -36,11 +37,13 @@ class ClientLoginView(LoginView):
 
 #Inherits Class Based View "LogoutView"
 class ClientLogoutView(LogoutView):
+    query_budget = 4
     login_view_name = 'client:login' #redirects to 'login' after successful logout
 
 
 #Inherits Class Based View "ListView"
 class DashView(ClientLoginRequiredMixin, ListView): #Non-users cannot login with the help of ClientLoginRequiredMixin
+    query_budget = {'get': 7, 'post': 13}
     model = Transaction #aka self
     template_name = "client/dash.html"
 
@@ -48,25 +51,30 @@ class DashView(ClientLoginRequiredMixin, ListView): #Non-users cannot login with
         context = super(DashView, self).get_context_data(**kwargs)
         context['userprofile'] = self.request.user.userprofile
         context['transaction_list'] = self.get_transactions()
-        context['fees'] = Site.objects.get_or_create(domain='laundrybear.pythonanywhere.com')[0].fees
-        # context['fees'] = Site.objects.get_current().fees
+        context['fees'] = get_fees()
         return context
 
 
     def get_transactions(self): #shows only the transactions made by the user
         queryset = super(DashView, self).get_queryset()
-        queryset = queryset.filter(client=self.request.user.userprofile)
+        queryset = queryset.filter(client=self.request.user.userprofile) \
+            .for_listing()
         return queryset
 
     def post(self, request, *args, **kwargs): #sets ratings
-        the_post = request.POST
-        transaction = Transaction.objects.get(pk=the_post['id'])
-        transaction.paws = the_post['score']
-        transaction.save()
+        form = RatingForm(request.POST)
+        if not form.is_valid(): #the score must be 1 to 5 paws
+            return HttpResponseBadRequest(form.errors.as_text())
+        with atomic(): #the shop rating totals are updated along with paws
+            transaction = get_object_or_404(Transaction,
+                                            pk=form.cleaned_data['id'])
+            transaction.paws = form.cleaned_data['score']
+            transaction.save()
         return redirect('client:menu') #redirects to 'menu' after rating a transaction from a laundry shop
 
 #Inherits CBV "TemplateView"
 class SignupView(TemplateView):
+    query_budget = {'get': 0, 'post': 20}
     template_name = "client/signup.html"
 
     def get_success_url(self): #redirects to 'menu' after user sign up
@@ -105,6 +113,7 @@ class SignupView(TemplateView):
 
 #Inherits CBV "TemplateView"
 class UserSettingsView(ClientLoginRequiredMixin, TemplateView):
+    query_budget = {'get': 3, 'post': 15}
     template_name = 'client/usersettings.html'
 
     def get_context_data(self, **kwargs):
@@ -153,68 +162,45 @@ class UserSettingsView(ClientLoginRequiredMixin, TemplateView):
         return self.render_to_response(context)
 
 #Inherits CBV "ListView"
-class ShopsListView(ClientLoginRequiredMixin, ListView):
+class ShopsListView(ClientLoginRequiredMixin, SearchMixin, ListView):
+    query_budget = 5
+    use_replica = True
     model = LaundryShop
     paginate_by = 10
     template_name="client/viewshops.html"
     context_object_name = 'shop_list'
 
-    def get_context_data(self, **kwargs):
-        context = super(ShopsListView, self).get_context_data(**kwargs)
-        shops = context['shop_list']
-
-        query_type = ''
-
-        #Used for search with the use of filtering
-        none_query = self.request.GET.get('browse', False)
-        if none_query:
-            shops = self.get_all_shops()
-            shops.order_by('-barangay', 'rating')
-            query_type = 'browse'
-
-        name_query = self.request.GET.get('name', False)
-        if name_query:
-            shops = self.get_shops_by_name(name_query)
-            query_type = 'name'
-
-        city_query = self.request.GET.get('city', False)
-        if city_query:
-            shops = self.get_shops_by_city(city_query)
-            query_type = 'city'
-
-        province_query = self.request.GET.get('province', False)
-        if province_query:
-            shops = self.get_shops_by_province(province_query)
-            query_type = 'province'
-
+    def get_queryset(self):
+        #Searching goes through SearchMixin, otherwise show every shop
+        #when browsing or the shops near the user
+        queryset = super(ShopsListView, self).get_queryset()
+        if self.get_query_type() == 'barangay':
+            queryset = self.get_shops_by_barangay(
+                self.request.user.userprofile.area_id)
+        return queryset
 
-        barangay_query = self.request.GET.get('barangay', False)
-        if barangay_query or not query_type:
-            shops = self.get_shops_by_barangay(barangay_query or self.request.user.userprofile.barangay)
-            query_type = 'barangay'
+    def get_query_type(self):
+        if self.get_search_query():
+            return 'search'
+        if self.request.GET.get('browse', False):
+            return 'browse'
+        return 'barangay'
 
-        context.update({'shop_list': shops})
-        context['query_type'] = query_type
+    def get_context_data(self, **kwargs):
+        context = super(ShopsListView, self).get_context_data(**kwargs)
+        context['query_type'] = self.get_query_type()
         return context
 
-    #Get data needed by each search
-    def get_shops_by_name(self, name_query):
-        return LaundryShop.objects.filter(name__icontains=name_query)
-
-    def get_shops_by_city(self, city_query):
-        return LaundryShop.objects.filter(city__icontains=city_query)
-
-    def get_shops_by_province(self, province_query):
-        return LaundryShop.objects.filter(province__icontains=province_query)
-
-    def get_shops_by_barangay(self, barangay_query):
-        return LaundryShop.objects.filter(barangay__icontains=barangay_query)
-
-    def get_all_shops(self):
-        return LaundryShop.objects.all()
+    def get_shops_by_barangay(self, area_id):
+        #Shops in the same normalized barangay, looked up through the index
+        #on LaundryShop.area
+        if area_id is None:
+            return LaundryShop.objects.none()
+        return LaundryShop.objects.filter(area_id=area_id)
 
 #Inherits CBV "DetailView"
 class OrderView(ClientLoginRequiredMixin, DetailView):
+    query_budget = 4
     context_object_name = 'shop'
     model = LaundryShop
     template_name="client/shopselect.html"
@@ -222,50 +208,31 @@ class OrderView(ClientLoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super(OrderView, self).get_context_data(**kwargs)
         the_shop = context['shop']
-        context['service_list'] = Price.objects.filter(laundry_shop__name=the_shop)
+        #Only queried when the cached service menu has to be rendered again
+        context['service_list'] = Price.objects.filter(laundry_shop=the_shop) \
+            .select_related('service')
         return context
 
 #Inherits CBV "DetailView"
-class OrderSummaryView(ClientLoginRequiredMixin, DetailView):
+class OrderSummaryView(ClientLoginRequiredMixin, CreateTransactionMixin, DetailView):
+    query_budget = {'get': 6, 'post': 11}
     context_object_name = 'shop'
     template_name="client/summaryoforder.html"
     model=LaundryShop
 
     def get_context_data(self, **kwargs):
         context = super(OrderSummaryView, self).get_context_data(**kwargs)
-        # context['fees'] = Site.objects.get_current().fees
-        context['fees'] = Site.objects.get_or_create(domain='laundrybear.pythonanywhere.com')[0].fees
+        context['fees'] = get_fees()
         context['delivery_date'] = default_date().strftime('%Y-%m-%d')
         context['delivery_date_max'] = (default_date() + timedelta(days=7)).strftime('%Y-%m-%d')
         context['address_form'] = AddressForm(
             initial=model_to_dict(self.request.user.userprofile))
         return context
 
-    def post(self, request, *args, **kwargs):
-        print request.POST['csrftoken']
-        if request.is_ajax():
-            services = request.POST['selectedServices']
-            services = json.loads(services)
-            transaction_form = TransactionForm(request.POST)
-            if transaction_form.is_valid():
-                transaction = transaction_form.save(commit=False)
-                transaction.client = request.user.userprofile
-                transaction.save()
-            else:
-                print transaction_form.errors
-            for service in services:
-                pricePk = service['pk']
-                price = Price.objects.get(pk=pricePk)
-                Order.objects.create(price=price, pieces=service['pieces'], transaction=transaction)
-            print 'yes'
-            # return HttpResponse(status=200)
-            return HttpResponse(reverse('client:view-shops'))
-        else:
-            return HttpResponse(status=400)
-
 
 #Inherits CBV "View"
-class CreateTransactionView(ClientLoginRequiredMixin, View):
+class CreateTransactionView(ClientLoginRequiredMixin, CreateTransactionMixin, View):
+    query_budget = 11
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
@@ -273,25 +240,3 @@ class CreateTransactionView(ClientLoginRequiredMixin, View):
 
     def get(self, request, *args, **kwargs):
         return HttpResponse(status=400)
-
-    def post(self, request, *args, **kwargs):
-        print '*'*30
-        if request.is_ajax():
-            services = request.POST['selectedServices']
-            services = json.loads(services)
-            transaction_form = TransactionForm(request.POST)
-            if transaction_form.is_valid():
-                transaction = transaction_form.save(commit=False)
-                transaction.client = request.user.userprofile
-                transaction.save()
-            else:
-                print transaction_form.errors
-            for service in services:
-                pricePk = service['pk']
-                price = Price.objects.get(pk=pricePk)
-                Order.objects.create(price=price, pieces=service['pieces'], transaction=transaction)
-            print 'yes'
-            # return HttpResponse(status=200)
-            return HttpResponse(reverse('client:view-shops'))
-        else:
-            return HttpResponse(status=400)
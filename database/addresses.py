@@ -0,0 +1,13 @@
+#Helpers for the free-text address fields. Migration 0010 keeps a copy of
+#them as they were then.
+
+
+def normalize_name(name):
+    """ Key used to match names of places regardless of case and spacing. """
+    return ' '.join(name.split()).lower()
+
+
+def join_address(building, street, barangay, city, province):
+    """ One line address, leaving out the parts that were left blank. """
+    address = [building, street, barangay, city, province]
+    return ', '.join(part for part in address if part)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from database.models import LaundryShop, Price, Service, UserProfile, Transaction, Order, Fees
+from database.models import LaundryShop, Price, Service, UserProfile, Transaction, Order, Fees, Province, City, Barangay, Job
 
 
 class PricesInline(admin.TabularInline):
@@ -17,3 +17,7 @@ admin.site.register(UserProfile)
 admin.site.register(Transaction)
 admin.site.register(Order)
 admin.site.register(Fees)
+admin.site.register(Province)
+admin.site.register(City)
+admin.site.register(Barangay)
+admin.site.register(Job)
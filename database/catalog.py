@@ -0,0 +1,51 @@
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+#Shops, services and prices make up the catalog that the API serves to the
+#mobile app on every launch. Any change to them replaces the catalog
+#version, which cached catalog responses are keyed by (see api/mixins.py).
+#Both live in the cache that every process shares (see CACHES in the
+#settings), so a change made by one process is seen by all of them.
+
+CATALOG_VERSION_KEY = 'database:catalog:version'
+
+_state = threading.local()
+
+
+def get_catalog_version():
+    """ The (version, last modified timestamp) of the catalog. """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = touch_catalog()
+    return version
+
+
+def touch_catalog():
+    """ Mark the catalog as changed, dropping every cached response. """
+    version = (uuid.uuid4().hex, int(time.time()))
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+@contextmanager
+def suspend_catalog_updates():
+    """
+    Skip the catalog version and search index updates of the signal
+    receivers inside the block, for imports that index the rows they save
+    and touch the catalog once afterwards.
+    """
+    suspended = catalog_updates_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = suspended
+
+
+def catalog_updates_suspended():
+    return getattr(_state, 'suspended', False)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.db import OperationalError, connections
+from django.db.transaction import atomic
+
+#A write load like concurrent order submissions and ratings, used to
+#compare SQLite backends by the benchmark_sqlite command. Each write is a
+#transaction that reads a running total and then updates it and adds a
+#row, the pattern of save_transaction and adjust_ratings, run from several
+#threads with a connection each against a fresh database file.
+
+SCHEMA = [
+    'CREATE TABLE total (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)',
+    'CREATE TABLE entry (id INTEGER PRIMARY KEY, thread INTEGER NOT NULL, '
+    'total INTEGER NOT NULL)',
+    'INSERT INTO total (id, value) VALUES (1, 0)',
+]
+
+
+def write(alias, thread):
+    with atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT value FROM total WHERE id = 1')
+            value = cursor.fetchone()[0] + 1
+            cursor.execute('UPDATE total SET value = %s WHERE id = 1',
+                           [value])
+            cursor.execute('INSERT INTO entry (thread, total) '
+                           'VALUES (%s, %s)', [thread, value])
+
+
+def run_writers(engine, path, threads=8, writes=100, options=None):
+    """
+    Run threads that each commit a number of writes to a new SQLite database
+    at path through the given backend. Returns the number of committed and
+    failed writes, the seconds taken and whether the running total matches
+    the rows added.
+    """
+    alias = 'concurrency-{0}'.format(id(path))
+    connections.databases[alias] = {'ENGINE': engine, 'NAME': path,
+                                    'OPTIONS': options or {}}
+    lock = threading.Lock()
+    failures = []
+    start = threading.Event()
+
+    def writer(thread):
+        start.wait()
+        try:
+            for i in range(writes):
+                try:
+                    write(alias, thread)
+                except OperationalError as e:
+                    with lock:
+                        failures.append(unicode(e))
+        finally:
+            connections[alias].close()
+
+    try:
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+        workers = [threading.Thread(target=writer, args=(number,))
+                   for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        started = time.time()
+        start.set()
+        for worker in workers:
+            worker.join()
+        seconds = time.time() - started
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT value FROM total WHERE id = 1')
+            total = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM entry')
+            committed = cursor.fetchone()[0]
+    finally:
+        connections[alias].close()
+        del connections.databases[alias]
+
+    return {
+        'committed': committed,
+        'failed': len(failures),
+        'errors': sorted(set(failures)),
+        'seconds': seconds,
+        'writes_per_second': committed / seconds if seconds else 0,
+        'consistent': total == committed,
+    }
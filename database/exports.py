@@ -0,0 +1,134 @@
+import csv
+import json
+
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from database.models import Order
+
+#Exports of the transaction history, shared by the export view and the
+#export_transactions command. Transactions are read a chunk at a time and
+#written out as they are read, so memory stays flat however many rows
+#there are.
+
+EXPORT_CHUNK_SIZE = 500
+
+CSV_HEADER = ['transaction', 'request_date', 'delivery_date', 'status',
+              'client', 'username', 'location', 'shop', 'service',
+              'unit_price', 'pieces', 'line_total', 'subtotal',
+              'service_charge', 'delivery_fee', 'total', 'amount_payable']
+
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min),
+                               timezone.get_current_timezone())
+
+
+def filter_transactions(queryset, start=None, end=None, status=None,
+                        shop=None):
+    """
+    Narrow down transactions to those requested from the start date up to
+    and including the end date, with the given status and ordered from the
+    shop with the given primary key.
+    """
+    if start:
+        queryset = queryset.filter(request_date__gte=start_of_day(start))
+    if end:
+        queryset = queryset.filter(
+            request_date__lt=start_of_day(end + timedelta(days=1)))
+    if status:
+        queryset = queryset.filter(status=status)
+    if shop:
+        orders = Order.objects.filter(price__laundry_shop=shop)
+        queryset = queryset.filter(pk__in=orders.values('transaction'))
+    return queryset
+
+
+def iter_transactions(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the transactions with their client and orders loaded. Each chunk
+    is read with one range query on the primary key plus one for its
+    orders, instead of an ever growing OFFSET.
+    """
+    orders = Order.objects.select_related('price__laundry_shop',
+                                          'price__service')
+    queryset = queryset.select_related('client__client').prefetch_related(
+        Prefetch('order_set', queryset=orders)).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        for transaction in chunk:
+            yield transaction
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def get_line(order):
+    return {
+        'shop': order.price.laundry_shop.name,
+        'service': order.price.service.name,
+        'unit_price': order.unit_price,
+        'pieces': order.pieces,
+        'line_total': order.subtotal,
+    }
+
+
+def get_record(transaction):
+    client = transaction.client.client
+    return {
+        'transaction': transaction.pk,
+        'request_date': transaction.request_date,
+        'delivery_date': transaction.delivery_date,
+        'status': transaction.get_status_display(),
+        'client': client.get_full_name(),
+        'username': client.username,
+        'location': transaction.location,
+        'subtotal': transaction.subtotal,
+        'service_charge': transaction.service_charge,
+        'delivery_fee': transaction.delivery_fee,
+        'total': transaction.total,
+        'amount_payable': transaction.price,
+        'orders': [get_line(order) for order in transaction.order_set.all()],
+    }
+
+
+class Echo(object):
+    """ File-like object which hands back what is written to it. """
+    def write(self, value):
+        return value
+
+
+def encode_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return unicode(value).encode('utf-8')
+
+
+def export_csv(transactions):
+    """ Yield the CSV lines of the transactions, one per order. """
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for transaction in transactions:
+        record = get_record(transaction)
+        for line in record.pop('orders') or [{}]:
+            line.update(record)
+            yield writer.writerow([encode_value(line.get(column))
+                                   for column in CSV_HEADER])
+
+
+def export_ndjson(transactions):
+    """ Yield one JSON object per transaction, one per line. """
+    for transaction in transactions:
+        yield json.dumps(get_record(transaction), cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+
+from database.models import Fees
+
+#Fees change rarely but are read on most order pages, so the Fees row is
+#kept in process memory and in the Django cache. Saving or deleting a Fees
+#row clears both (see database/signals.py). Other processes only share the
+#Django cache, so their memory copy is trusted for a short time only.
+
+FEES_SITE_DOMAIN = 'laundrybear.pythonanywhere.com'
+FEES_CACHE_TIMEOUT = 60 * 60
+FEES_MEMORY_TIMEOUT = 30
+
+_fees = {}
+
+
+def get_cache_key(domain):
+    return 'database:fees:{0}'.format(domain)
+
+
+def get_fees(domain=FEES_SITE_DOMAIN):
+    """
+    Return the Fees of the site with the given domain, creating the site and
+    its fees if they do not exist yet. The returned instance is shared, so
+    copy it before changing it.
+    """
+    fees, expires = _fees.get(domain, (None, 0))
+    if fees is not None and expires > time.time():
+        return fees
+
+    fees = cache.get(get_cache_key(domain))
+    if fees is None:
+        site = Site.objects.get_or_create(domain=domain)[0]
+        fees = Fees.objects.get_or_create(site=site)[0]
+        cache.set(get_cache_key(domain), fees, FEES_CACHE_TIMEOUT)
+    _fees[domain] = (fees, time.time() + FEES_MEMORY_TIMEOUT)
+    return fees
+
+
+def clear_fees(domain=FEES_SITE_DOMAIN):
+    """ Forget the cached fees of a site. """
+    _fees.pop(domain, None)
+    cache.delete(get_cache_key(domain))
@@ -0,0 +1,50 @@
+import threading
+
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+#List rows and the service menu of a shop are cached as template fragments
+#with {% cache %}, keyed by the object's primary key and its modified time,
+#which is read with the row itself. Saving a row sets the time, and changes
+#to what those fragments show that do not save the row set it here (see
+#database/signals.py and database/ratings.py). A fragment rendered from an
+#older copy of a row, such as one read from a lagging replica, is keyed by
+#that copy's time, so it is never looked up for the newer row and expires.
+
+_state = threading.local()
+
+
+def touch_rows(model, pks):
+    """ Set the modified time of the objects with the given primary keys. """
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.setdefault(model, set()).update(pks)
+        return
+    model.objects.filter(pk__in=pks).update(modified=timezone.now())
+
+
+def forget_rows(model, pks):
+    """ Leave deleted objects out of the rows batch_touches will touch. """
+    pending = getattr(_state, 'pending', None)
+    if pending is not None and model in pending:
+        pending[model].difference_update(pks)
+
+
+@contextmanager
+def batch_touches():
+    """
+    Touch the rows touched inside the block once, at its end, for deletes
+    that cascade to many prices of the same shops.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+    _state.pending = pending = {}
+    try:
+        yield
+    finally:
+        _state.pending = None
+    for model, pks in pending.items():
+        if pks:
+            touch_rows(model, list(pks))
@@ -0,0 +1,249 @@
+import json
+import logging
+import threading
+import traceback
+
+from datetime import timedelta
+from importlib import import_module
+
+from django.db import connection
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from database.models import Job
+
+#Work that need not hold up a response is queued as a Job row and run by
+#the run_jobs command. A function marked with @job is queued with
+#enqueue(function, *args, **kwargs), which only inserts the row, so the
+#job is dropped with the rest of the request if it rolls back. Its
+#arguments are stored as JSON. A job that raises is run again after
+#RETRY_DELAY seconds, doubled on every attempt, until it has been tried
+#max_attempts times. Workers claim a job by changing its status with a
+#conditional update, so any number of them can run against one database.
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+
+#The worker running a job updates its heartbeat this often, and a job
+#whose heartbeat is older than STALE_AFTER is taken to be lost with its
+#worker. A job may run for any length of time while its worker is alive.
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = 5 * 60
+
+#Finished jobs are kept this long for the statistics and then deleted
+KEEP_FINISHED = timedelta(days=7)
+
+#Queued jobs a worker tries to claim before looking again
+CLAIM_CANDIDATES = 10
+
+_jobs = {}
+
+
+def job(func=None, max_attempts=MAX_ATTEMPTS):
+    """ Mark a function as one that can be queued. """
+    if func is None:
+        return lambda func: job(func, max_attempts)
+    func.job_name = '{0}.{1}'.format(func.__module__, func.__name__)
+    func.max_attempts = max_attempts
+    _jobs[func.job_name] = func
+    return func
+
+
+def get_job_function(name):
+    if name not in _jobs:
+        # importing the module registers its jobs
+        import_module(name.rsplit('.', 1)[0])
+    return _jobs[name]
+
+
+def enqueue(func, *args, **kwargs):
+    """ Queue a call of a @job function, returning its Job. """
+    return Job.objects.create(
+        name=func.job_name, max_attempts=func.max_attempts,
+        arguments=json.dumps({'args': args, 'kwargs': kwargs}))
+
+
+def get_retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_job():
+    """ Mark the longest due queued job as running and return it, or None. """
+    now = timezone.now()
+    pks = Job.objects.filter(status=Job.QUEUED, run_at__lte=now) \
+        .order_by('run_at', 'pk').values_list('pk', flat=True)
+    for pk in pks[:CLAIM_CANDIDATES]:
+        # only one worker gets to change a queued job
+        if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, started=now, heartbeat=now,
+                attempts=F('attempts') + 1):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+class Heartbeat(object):
+    """ Marks a running job as alive from a thread until stopped. """
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.beat)
+        self.thread.daemon = True
+
+    def beat(self):
+        try:
+            while not self.stopping.wait(self.interval):
+                Job.objects.filter(pk=self.job.pk, status=Job.RUNNING) \
+                    .update(heartbeat=timezone.now())
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopping.set()
+        self.thread.join()
+
+
+def run_job(job):
+    """ Run a claimed job and record how it went. """
+    try:
+        arguments = json.loads(job.arguments)
+        with Heartbeat(job):
+            get_job_function(job.name)(*arguments['args'],
+                                       **arguments['kwargs'])
+    except Exception:
+        logger.exception('Job %s (%s) failed', job.pk, job.name)
+        now = timezone.now()
+        fields = {'finished': now, 'error': traceback.format_exc()}
+        if job.attempts < job.max_attempts:
+            fields['status'] = Job.QUEUED
+            fields['run_at'] = now + timedelta(
+                seconds=get_retry_delay(job.attempts))
+        else:
+            fields['status'] = Job.FAILED
+    else:
+        fields = {'finished': timezone.now(), 'status': Job.DONE,
+                  'error': ''}
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_pending_jobs():
+    """ Run the due jobs one after the other. Returns how many ran. """
+    count = 0
+    job = claim_job()
+    while job is not None:
+        run_job(job)
+        count += 1
+        job = claim_job()
+    return count
+
+
+def requeue_stale_jobs():
+    """ Queue again, or fail, the jobs whose worker has gone away. """
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat__lt=timezone.now() - timedelta(seconds=STALE_AFTER))
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Job.QUEUED, run_at=timezone.now())
+    failed = stale.update(status=Job.FAILED, finished=timezone.now(),
+                          error='The worker running the job stopped.')
+    return requeued + failed
+
+
+def delete_finished_jobs():
+    Job.objects.filter(
+        status=Job.DONE, finished__lt=timezone.now() - KEEP_FINISHED) \
+        .delete()
+
+
+def summarize(seconds):
+    if not seconds:
+        return {'average': None, 'max': None}
+    return {'average': sum(seconds) / len(seconds), 'max': max(seconds)}
+
+
+def get_stats(window=60 * 60):
+    """
+    The number of jobs by status and the seconds that the jobs finished
+    in the last window seconds waited to start and took to run.
+    """
+    now = timezone.now()
+    statuses = dict(Job.objects.order_by().values_list('status')
+                    .annotate(Count('pk')))
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now) \
+        .aggregate(count=Count('pk'), oldest=Min('run_at'))
+    # the latest attempt of a job started at its run_at
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished__gte=now - timedelta(seconds=window)) \
+        .values_list('run_at', 'started', 'finished')
+    waits, runs = [], []
+    for run_at, started, ended in finished:
+        waits.append(max((started - run_at).total_seconds(), 0))
+        runs.append((ended - started).total_seconds())
+    return {
+        'due': due['count'],
+        'delayed': statuses.get(Job.QUEUED, 0) - due['count'],
+        'running': statuses.get(Job.RUNNING, 0),
+        'done': statuses.get(Job.DONE, 0),
+        'failed': statuses.get(Job.FAILED, 0),
+        'oldest_due_seconds':
+            (now - (due['oldest'] or now)).total_seconds(),
+        'window_seconds': window,
+        'finished': len(runs),
+        'wait_seconds': summarize(waits),
+        'run_seconds': summarize(runs),
+    }
+
+
+class Worker(object):
+    """
+    Runs queued jobs in a number of threads until stopped, or until nothing
+    is due with burst set.
+    """
+    def __init__(self, threads=4, interval=1.0, burst=False):
+        self.threads = threads
+        self.interval = interval
+        self.burst = burst
+        self.stopping = threading.Event()
+
+    def work(self):
+        try:
+            while not self.stopping.is_set():
+                job = claim_job()
+                if job is not None:
+                    run_job(job)
+                elif self.burst:
+                    break
+                else:
+                    self.stopping.wait(self.interval)
+        finally:
+            connection.close()
+
+    def run(self):
+        requeue_stale_jobs()
+        delete_finished_jobs()
+        workers = [threading.Thread(target=self.work)
+                   for number in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            while any(worker.is_alive() for worker in workers):
+                # join without a timeout would not let Ctrl-C through
+                for worker in workers:
+                    worker.join(STALE_AFTER / 10.0)
+                if not self.stopping.is_set():
+                    requeue_stale_jobs()
+        except KeyboardInterrupt:
+            # running jobs are finished first
+            self.stopping.set()
+            for worker in workers:
+                worker.join()
+        finally:
+            connection.close()
@@ -0,0 +1,42 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from database.concurrency import run_writers
+
+BACKENDS = [
+    ('stock', 'django.db.backends.sqlite3'),
+    ('tuned', 'LaundryBear.sqlite3'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Runs the same concurrent write load against a scratch SQLite '
+            'database through the stock Django backend and the tuned one '
+            'and prints the committed and failed writes and the writes per '
+            'second of each as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Writes per thread.')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        results = {}
+        try:
+            for name, engine in BACKENDS:
+                self.stderr.write('Writing through {0}'.format(engine))
+                results[name] = run_writers(
+                    engine, os.path.join(directory, name + '.sqlite3'),
+                    threads=options['threads'], writes=options['writes'])
+        finally:
+            shutil.rmtree(directory)
+        self.stdout.write(json.dumps({
+            'threads': options['threads'],
+            'writes_per_thread': options['writes'],
+            'backends': results,
+        }, indent=2, sort_keys=True))
@@ -0,0 +1,132 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+from django.template import engines
+from django.template.loader_tags import ExtendsNode
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from database.catalog import touch_catalog
+from database.management.commands.benchmark_views import (
+    SKIPPED_URLS, URL_OBJECTS, Rollback, percentile)
+from database.synthetic import generate
+from LaundryBear.templating import get_templates_setting, warm_up_templates
+from management import urls as management_urls
+
+BASE_TEMPLATE = 'management/base.html'
+
+
+def get_parents(name):
+    """ The names of the templates the named template extends. """
+    parents = []
+    template = engines['django'].get_template(name).template
+    while template.nodelist and isinstance(template.nodelist[0], ExtendsNode):
+        name = template.nodelist[0].parent_name.resolve({})
+        parents.append(name)
+        template = engines['django'].get_template(name).template
+    return parents
+
+
+class Command(BaseCommand):
+    help = ('Fills the database with made up rows and times the rendering of '
+            'the management pages built on {0}, with the templates loaded '
+            'from disk on every render and with the cached loader used in '
+            'production, and prints the p50/p95 of each as JSON. The made up '
+            'rows are rolled back afterwards.'.format(BASE_TEMPLATE))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shops', type=int, default=200)
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Timed renders per page and loader.')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                generate(shops=options['shops'], clients=options['clients'],
+                         transactions=options['transactions'],
+                         seed=options['seed'], log=self.stderr.write)
+                self.staff = User.objects.create_superuser(
+                    username='benchmark-staff', password='benchmark',
+                    email='staff@example.com')
+                pages = self.run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            touch_catalog()
+
+        self.stdout.write(json.dumps({
+            'repeat': options['repeat'],
+            'pages': pages,
+        }, indent=2, sort_keys=True))
+
+    def get_urls(self):
+        urls = []
+        for pattern in management_urls.urlpatterns:
+            name = 'management:{0}'.format(pattern.name)
+            if name in SKIPPED_URLS:
+                continue
+            kwargs = {}
+            if name in URL_OBJECTS:
+                kwargs['pk'] = URL_OBJECTS[name].objects.order_by('-pk') \
+                    .values_list('pk', flat=True)[0]
+            urls.append((name, pattern, kwargs))
+        return urls
+
+    def get_response(self, pattern, kwargs):
+        request = RequestFactory().get('/')
+        request.user = self.staff
+        request.session = {}
+        return pattern.callback(request, **kwargs)
+
+    def get_pages(self):
+        """ (name, pattern, kwargs) of the pages built on BASE_TEMPLATE. """
+        pages = []
+        for name, pattern, kwargs in self.get_urls():
+            response = self.get_response(pattern, kwargs)
+            template_name = getattr(response, 'template_name', None)
+            # only template responses leave their rendering to be timed
+            if not template_name or not hasattr(response, 'render'):
+                continue
+            if not isinstance(template_name, basestring):
+                template_name = engines['django'].engine.select_template(
+                    template_name).name
+            if BASE_TEMPLATE in get_parents(template_name):
+                pages.append((name, pattern, kwargs))
+        return pages
+
+    def measure(self, pattern, kwargs, repeat):
+        timings = []
+        for i in range(repeat):
+            response = self.get_response(pattern, kwargs)
+            start = time.time()
+            response.render()
+            timings.append((time.time() - start) * 1000)
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+        }
+
+    def run(self, repeat):
+        cases = self.get_pages()
+        pages = dict((name, {}) for name, pattern, kwargs in cases)
+        for loader, cached in [('uncached', False), ('cached', True)]:
+            with override_settings(TEMPLATES=get_templates_setting(cached)):
+                self.stderr.write('Compiled {0} templates'.format(
+                    warm_up_templates()))
+                for name, pattern, kwargs in cases:
+                    self.stderr.write('Rendering {0} {1}'.format(name,
+                                                                 loader))
+                    pages[name][loader] = self.measure(pattern, kwargs,
+                                                       repeat)
+        for timings in pages.values():
+            timings['p50_speedup'] = round(
+                timings['uncached']['p50_ms'] /
+                max(timings['cached']['p50_ms'], 0.001), 2)
+        return pages
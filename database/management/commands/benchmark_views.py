@@ -0,0 +1,221 @@
+import json
+import math
+import time
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.transaction import atomic
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.http import urlencode
+from rest_framework.authtoken.models import Token
+
+from api.authentication import clear_token
+from api.urls import router
+from client import urls as client_urls
+from database.catalog import touch_catalog
+from database.models import LaundryShop, Service, Transaction, UserProfile
+from database.synthetic import generate
+from management import urls as management_urls
+
+#Pages that change data, log out, only answer POST or stream until closed
+#are not benchmarked
+SKIPPED_URLS = {
+    'client:logout', 'client:create-transaction', 'client:rate',
+    'management:logout-admin', 'management:delete-shop',
+    'management:delete-service', 'management:mark-transaction-done',
+    'management:transaction-feed',
+}
+
+#Model whose newest row fills in the pk of the pages that take one
+URL_OBJECTS = {
+    'client:order': LaundryShop,
+    'client:order-summary': LaundryShop,
+    'management:edit-shop': LaundryShop,
+    'management:edit-service': Service,
+    'management:update-transaction': Transaction,
+}
+
+#Pages that are also benchmarked with a query string
+EXTRA_QUERIES = [
+    ('client:view-shops', {'browse': 1}),
+    ('client:view-shops', {'q': 'laundry'}),
+    ('management:list-shops', {'q': 'laundry'}),
+    ('management:list-client', {'q': 'client'}),
+    ('management:history-transactions', {'q': 'client'}),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, percent):
+    """ Nearest-rank percentile of a list of numbers. """
+    values = sorted(values)
+    return values[max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Fills the database with made up shops, clients and transactions, '
+            'requests every page of the client, management and API urls '
+            'through the test client and prints the p50/p95 latency and SQL '
+            'query count of each as JSON. The made up rows are rolled back '
+            'afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shops', type=int, default=2000)
+        parser.add_argument('--services', type=int, default=50)
+        parser.add_argument('--prices-per-shop', type=int, default=10)
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--transactions', type=int, default=100000)
+        parser.add_argument('--orders-per-transaction', type=int, default=3)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Transactions are spread over this many '
+                                 'past days.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed requests per page, after one '
+                                 'warm-up request.')
+        parser.add_argument('--only',
+                            help='Only pages whose name contains this.')
+        parser.add_argument('--output',
+                            help='File to write the JSON to instead of '
+                                 'stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            with atomic():
+                rows = generate(
+                    shops=options['shops'], services=options['services'],
+                    prices_per_shop=options['prices_per_shop'],
+                    clients=options['clients'],
+                    transactions=options['transactions'],
+                    orders_per_transaction=options['orders_per_transaction'],
+                    days=options['days'], seed=options['seed'],
+                    log=self.stderr.write)
+                self.create_users()
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    views = self.run(options['repeat'], options['only'])
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # cached responses and tokens of the rolled back rows
+            touch_catalog()
+            if hasattr(self, 'token'):
+                clear_token(self.token.key)
+
+        report = json.dumps({
+            'rows': rows,
+            'repeat': options['repeat'],
+            'views': views,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def create_users(self):
+        staff = User.objects.create_superuser(username='benchmark-staff',
+                                              password='benchmark',
+                                              email='staff@example.com')
+        client = User.objects.create_user(username='benchmark-client',
+                                          password='benchmark',
+                                          first_name='Benchmark',
+                                          last_name='Client')
+        # the client shares the address of a made up client, so it has
+        # shops nearby and a history like theirs
+        profile = UserProfile.objects.order_by('-pk').first()
+        UserProfile.objects.filter(pk=profile.pk).update(client=client)
+        self.token = Token.objects.get_or_create(user=staff)[0]
+
+    def get_clients(self):
+        staff = Client()
+        staff.login(username='benchmark-staff', password='benchmark')
+        client = Client()
+        client.login(username='benchmark-client', password='benchmark')
+        api = Client(HTTP_AUTHORIZATION='Token {0}'.format(self.token.key))
+        return {'client': client, 'management': staff, 'api': api}
+
+    def get_url(self, name, args=(), query=None):
+        url = reverse(name, args=args)
+        if query:
+            url = '{0}?{1}'.format(url, urlencode(sorted(query.items())))
+        return url
+
+    def get_cases(self):
+        """ (name, namespace, url) of every page to benchmark. """
+        # exporting every transaction would only time the size of the table
+        week_ago = (timezone.now() - timedelta(days=7)).date()
+        queries = {'management:export-transactions': {'start': week_ago}}
+
+        cases = []
+        for namespace, urls in [('client', client_urls),
+                                ('management', management_urls)]:
+            for pattern in urls.urlpatterns:
+                name = '{0}:{1}'.format(namespace, pattern.name)
+                if name in SKIPPED_URLS:
+                    continue
+                args = []
+                if name in URL_OBJECTS:
+                    args = [URL_OBJECTS[name].objects.order_by('-pk')
+                            .values_list('pk', flat=True)[0]]
+                cases.append((name, namespace,
+                              self.get_url(name, args, queries.get(name))))
+        for name, query in EXTRA_QUERIES:
+            cases.append((name, name.split(':')[0],
+                          self.get_url(name, query=query)))
+
+        cases.append(('api-root', 'api', self.get_url('api-root')))
+        for prefix, viewset, base_name in router.registry:
+            name = '{0}-list'.format(base_name)
+            cases.append((name, 'api', self.get_url(name)))
+            name = '{0}-detail'.format(base_name)
+            pk = viewset.queryset.model.objects.order_by('-pk') \
+                .values_list('pk', flat=True).first()
+            if pk is not None:
+                cases.append((name, 'api', self.get_url(name, [pk])))
+        return cases
+
+    def run(self, repeat, only=None):
+        clients = self.get_clients()
+        views = []
+        for name, namespace, url in self.get_cases():
+            if only and only not in name:
+                continue
+            self.stderr.write('Requesting {0}'.format(url))
+            views.append(dict(self.measure(clients[namespace], url, repeat),
+                              name=name, url=url))
+        return views
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            ''.join(response.streaming_content)
+        return response
+
+    def measure(self, client, url, repeat):
+        # the first request fills the caches and loads the templates
+        self.request(client, url)
+        timings = []
+        queries = []
+        for i in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.time()
+                response = self.request(client, url)
+                timings.append((time.time() - start) * 1000)
+            queries.append(len(context.captured_queries))
+        return {
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': percentile(queries, 50),
+            'max_queries': max(queries),
+        }
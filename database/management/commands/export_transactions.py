@@ -0,0 +1,55 @@
+import argparse
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from database.exports import (EXPORT_FORMATS, filter_transactions,
+                              iter_transactions)
+from database.models import Transaction
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Expected a date as YYYY-MM-DD, got {0!r}.'.format(value))
+
+
+class Command(BaseCommand):
+    help = ('Writes the transactions with their client, shop, orders and '
+            'totals as CSV or NDJSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='csv',
+                            choices=sorted(EXPORT_FORMATS))
+        parser.add_argument('--start', type=parse_date,
+                            help='Only transactions requested on or after '
+                                 'this date (YYYY-MM-DD).')
+        parser.add_argument('--end', type=parse_date,
+                            help='Only transactions requested on or before '
+                                 'this date (YYYY-MM-DD).')
+        parser.add_argument('--status', type=int,
+                            choices=[status for status, name in
+                                     Transaction.TRANSACTION_STATUS_CHOICES],
+                            help='Only transactions with this status.')
+        parser.add_argument('--shop', type=int,
+                            help='Only transactions from the shop with this '
+                                 'primary key.')
+        parser.add_argument('--output',
+                            help='File to write to instead of stdout.')
+
+    def handle(self, *args, **options):
+        export, content_type = EXPORT_FORMATS[options['format']]
+        transactions = filter_transactions(Transaction.objects.all(),
+            start=options['start'], end=options['end'],
+            status=options['status'], shop=options['shop'])
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for line in export(iter_transactions(transactions)):
+                    output.write(line)
+        else:
+            for line in export(iter_transactions(transactions)):
+                self.stdout.write(line, ending='')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from management.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, import_catalog
+
+
+class Command(BaseCommand):
+    help = ('Adds the laundry shops with their services and prices from a '
+            'CSV or JSON file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--format', choices=sorted(IMPORT_FORMATS),
+                            help='Format of the file, by default its '
+                                 'extension.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE,
+                            help='Number of shops written at a time.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or \
+            options['file'].rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError('Pass the --format of a file not ending in '
+                               '.csv or .json.')
+        try:
+            with open(options['file'], 'rU') as lines:
+                result = import_catalog(lines, file_format,
+                                        options['batch_size'])
+        except (IOError, ValueError) as e:
+            raise CommandError('The file could not be read: {0}'.format(e))
+
+        for number, field, message in result.errors:
+            self.stderr.write(u'Row {0}: {1}: {2}'.format(number, field,
+                                                          message))
+        self.stdout.write('Added {0} shop(s), {1} price(s) and {2} '
+                          'service(s) with {3} error(s).'.format(
+                              result.shop_count, result.price_count,
+                              result.service_count, len(result.errors)))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from database.ratings import recalculate_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored rating totals and averages of every laundry shop.'
+
+    def handle(self, *args, **options):
+        changed = recalculate_ratings()
+        self.stdout.write('Updated ratings of {0} laundry shop(s).'.format(changed))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from database.search import SEARCH_INDEXES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search tables of shops, clients and services.'
+
+    def handle(self, *args, **options):
+        for model in SEARCH_INDEXES:
+            count = rebuild_index(model)
+            self.stdout.write('Indexed {0} {1}(s).'.format(
+                count, model._meta.verbose_name))
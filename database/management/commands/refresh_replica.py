@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from LaundryBear.replicas import refresh_replica
+
+
+class Command(BaseCommand):
+    help = ('Copies the primary SQLite database over the replica stand-in, '
+            'once or every --interval seconds until stopped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, nargs='?',
+                            const=settings.REPLICA_MAX_LAG,
+                            help='Keep copying, every REPLICA_MAX_LAG '
+                                 'seconds unless a number is given.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.time()
+            refresh_replica()
+            self.stdout.write('Copied the database to the replica in '
+                              '{0:.2f}s.'.format(time.time() - started))
+            if not options['interval']:
+                return
+            time.sleep(max(options['interval'] - (time.time() - started), 0))
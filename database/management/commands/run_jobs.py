@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from database.jobs import Worker, get_stats
+
+
+class Command(BaseCommand):
+    help = ('Runs the queued jobs in a pool of threads until stopped, '
+            'retrying failed ones later. Start several to run more at once, '
+            'or jobs that need a CPU each in processes of their own.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds an idle thread waits before '
+                                 'looking for jobs again.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Stop once no job is due.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Only print the queue depth and the wait '
+                                 'and run times of the recent jobs as '
+                                 'JSON.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(get_stats(), indent=2,
+                                         sort_keys=True))
+            return
+        Worker(threads=options['threads'], interval=options['interval'],
+               burst=options['burst']).run()
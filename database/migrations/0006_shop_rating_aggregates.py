@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def fill_ratings(apps, schema_editor):
+    LaundryShop = apps.get_model('database', 'LaundryShop')
+    Order = apps.get_model('database', 'Order')
+    totals = {}
+    rated = Order.objects.filter(transaction__paws__gt=0).values_list(
+        'price__laundry_shop', 'transaction', 'transaction__paws').distinct()
+    for shop_pk, transaction_pk, paws in rated:
+        paws_total, raters = totals.get(shop_pk, (0, 0))
+        totals[shop_pk] = (paws_total + paws, raters + 1)
+    for shop_pk, (paws_total, raters) in totals.items():
+        average = (Decimal(paws_total) / raters).quantize(Decimal('0.01'))
+        LaundryShop.objects.filter(pk=shop_pk).update(
+            paws_total=paws_total, raters=raters, average_rating=average)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0005_auto_20160707_1311'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laundryshop',
+            name='average_rating',
+            field=models.DecimalField(default=0, editable=False, max_digits=3, decimal_places=2),
+        ),
+        migrations.AddField(
+            model_name='laundryshop',
+            name='paws_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='laundryshop',
+            name='raters',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+#A copy of database.pricing as it was when the totals were first stored,
+#so later changes to pricing do not change what this migration does
+
+PIECES_PER_KILO = 7
+TWOPLACES = Decimal(10) ** -2
+
+
+def round_amount(amount):
+    return Decimal(amount).quantize(TWOPLACES)
+
+
+def compute_totals(lines, fees):
+    """ (subtotal, service charge, delivery fee, total) of the lines. """
+    subtotal = sum((round_amount(Decimal(unit_price) * pieces /
+                                 PIECES_PER_KILO)
+                    for unit_price, pieces in lines), Decimal(0))
+    service_charge = round_amount(subtotal * fees.service_charge)
+    delivery_fee = round_amount(fees.delivery_fee)
+    return (subtotal, service_charge, delivery_fee,
+            subtotal + service_charge + delivery_fee)
+
+
+def fill_totals(apps, schema_editor):
+    Fees = apps.get_model('database', 'Fees')
+    Order = apps.get_model('database', 'Order')
+    Price = apps.get_model('database', 'Price')
+    Transaction = apps.get_model('database', 'Transaction')
+
+    for price in Price.objects.all():
+        Order.objects.filter(price=price).update(unit_price=price.price)
+
+    fees = Fees.objects.filter(
+        site__domain='laundrybear.pythonanywhere.com').first()
+    if fees is None:
+        return
+    lines = defaultdict(list)
+    orders = Order.objects.values_list('transaction', 'unit_price', 'pieces')
+    for transaction_pk, unit_price, pieces in orders:
+        lines[transaction_pk].append((unit_price, pieces))
+    for transaction_pk, transaction_lines in lines.items():
+        subtotal, service_charge, delivery_fee, total = compute_totals(
+            transaction_lines, fees)
+        Transaction.objects.filter(pk=transaction_pk).update(
+            subtotal=subtotal, service_charge=service_charge,
+            delivery_fee=delivery_fee, total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0007_order_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='unit_price',
+            field=models.DecimalField(default=0, editable=False, max_digits=10, decimal_places=2),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='delivery_fee',
+            field=models.DecimalField(default=0, editable=False, max_digits=8, decimal_places=2),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='service_charge',
+            field=models.DecimalField(default=0, editable=False, max_digits=8, decimal_places=2),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='subtotal',
+            field=models.DecimalField(default=0, editable=False, max_digits=8, decimal_places=2),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='total',
+            field=models.DecimalField(default=0, editable=False, max_digits=8, decimal_places=2),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
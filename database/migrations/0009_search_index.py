@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Full-text search tables used by database/search.py. They need an SQLite
+# build with the FTS5 extension and the trigram tokenizer (3.34 or newer).
+
+TABLES = [
+    ('database_laundryshop_search', 'name, address'),
+    ('database_userprofile_search', 'name, address'),
+    ('database_service_search', 'name, description'),
+]
+
+
+def join_address(instance):
+    address = [instance.building, instance.street, instance.barangay,
+               instance.city, instance.province]
+    return ', '.join(part for part in address if part)
+
+
+def fill_search_tables(apps, schema_editor):
+    LaundryShop = apps.get_model('database', 'LaundryShop')
+    UserProfile = apps.get_model('database', 'UserProfile')
+    Service = apps.get_model('database', 'Service')
+
+    documents = {
+        'database_laundryshop_search': [
+            (shop.pk, shop.name, join_address(shop))
+            for shop in LaundryShop.objects.all()],
+        'database_userprofile_search': [
+            (profile.pk, ' '.join([profile.client.first_name,
+                                   profile.client.last_name]).strip(),
+             join_address(profile))
+            for profile in UserProfile.objects.select_related('client')],
+        'database_service_search': [
+            (service.pk, service.name, service.description)
+            for service in Service.objects.all()],
+    }
+    with schema_editor.connection.cursor() as cursor:
+        for table, columns in TABLES:
+            cursor.executemany(
+                'INSERT INTO {0} (rowid, {1}) VALUES (%s, %s, %s)'.format(
+                    table, columns), documents[table])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0008_stored_order_totals'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            ["CREATE VIRTUAL TABLE {0} USING fts5({1}, tokenize='trigram')"
+             .format(table, columns)],
+            ['DROP TABLE {0}'.format(table)])
+        for table, columns in TABLES
+    ] + [
+        migrations.RunPython(fill_search_tables, migrations.RunPython.noop),
+    ]
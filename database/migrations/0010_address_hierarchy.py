@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+#A copy of database.addresses as it was when the areas were first filled,
+#so later changes to it do not change what this migration does
+
+
+def normalize_name(name):
+    """ Key used to match names of places regardless of case and spacing. """
+    return ' '.join(name.split()).lower()
+
+
+def join_address(building, street, barangay, city, province):
+    """ One line address, leaving out the parts that were left blank. """
+    address = [building, street, barangay, city, province]
+    return ', '.join(part for part in address if part)
+
+
+def fill_addresses(apps, schema_editor):
+    Province = apps.get_model('database', 'Province')
+    City = apps.get_model('database', 'City')
+    Barangay = apps.get_model('database', 'Barangay')
+    areas = {}
+
+    def get_area(province, city, barangay):
+        keys = (normalize_name(province), normalize_name(city),
+                normalize_name(barangay))
+        if not keys[0] or not keys[2]:
+            return None
+        if keys not in areas:
+            province_obj = Province.objects.get_or_create(key=keys[0],
+                defaults={'name': ' '.join(province.split())})[0]
+            city_obj = City.objects.get_or_create(province=province_obj,
+                key=keys[1], defaults={'name': ' '.join(city.split())})[0]
+            areas[keys] = Barangay.objects.get_or_create(city=city_obj,
+                key=keys[2], defaults={'name': ' '.join(barangay.split())})[0]
+        return areas[keys]
+
+    for model_name in ('UserProfile', 'LaundryShop', 'Transaction'):
+        model = apps.get_model('database', model_name)
+        for obj in model.objects.all():
+            area = get_area(obj.province, obj.city, obj.barangay)
+            location = join_address(obj.building, obj.street, obj.barangay,
+                                    obj.city, obj.province)
+            model.objects.filter(pk=obj.pk).update(
+                area=area, location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Barangay',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=50, blank=True)),
+                ('key', models.CharField(max_length=50, blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'cities',
+            },
+        ),
+        migrations.CreateModel(
+            name='Province',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=50)),
+                ('key', models.CharField(unique=True, max_length=50)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='laundryshop',
+            name='location',
+            field=models.CharField(default=b'', max_length=260, editable=False),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='location',
+            field=models.CharField(default=b'', max_length=260, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='location',
+            field=models.CharField(default=b'', max_length=260, editable=False),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='province',
+            field=models.ForeignKey(to='database.Province'),
+        ),
+        migrations.AddField(
+            model_name='barangay',
+            name='city',
+            field=models.ForeignKey(to='database.City'),
+        ),
+        migrations.AddField(
+            model_name='laundryshop',
+            name='area',
+            field=models.ForeignKey(editable=False, to='database.Barangay', null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='area',
+            field=models.ForeignKey(editable=False, to='database.Barangay', null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='area',
+            field=models.ForeignKey(editable=False, to='database.Barangay', null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='city',
+            unique_together=set([('province', 'key')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='barangay',
+            unique_together=set([('city', 'key')]),
+        ),
+        migrations.RunPython(fill_addresses, migrations.RunPython.noop),
+    ]
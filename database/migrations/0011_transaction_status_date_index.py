@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0010_address_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='transaction',
+            index_together=set([('status', 'request_date')]),
+        ),
+    ]
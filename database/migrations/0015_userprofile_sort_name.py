@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_sort_names(apps, schema_editor):
+    UserProfile = apps.get_model('database', 'UserProfile')
+    for profile in UserProfile.objects.select_related('client'):
+        UserProfile.objects.filter(pk=profile.pk).update(
+            sort_name=u'{0} {1}'.format(profile.client.first_name,
+                                        profile.client.last_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0014_fragment_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='sort_name',
+            field=models.CharField(default='', max_length=61, editable=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='userprofile',
+            index_together=set([('sort_name', 'id')]),
+        ),
+        migrations.RunPython(fill_sort_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # jobs running now are judged by when they started, as before
+    Job = apps.get_model('database', 'Job')
+    Job.objects.filter(heartbeat=None).update(heartbeat=F('started'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0015_userprofile_sort_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(null=True, blank=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
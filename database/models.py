@@ -1,11 +1,15 @@
 from decimal import *
 from django.db import models
+from django.db.transaction import atomic
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.contrib.sites.models import Site
 from datetime import timedelta
 from django.core.validators import RegexValidator
 
+from database.addresses import join_address, normalize_name
+from database.pricing import compute_line_total
+
 #from rest_framework.authtoken.models import Token
 #Models are also known as tables
 #Each field is an attribute of the table
@@ -17,7 +21,119 @@ from django.core.validators import RegexValidator
 #    Token.objects.get_or_create(user=user)
 
 contactNumberValidator = RegexValidator(r'^\+?([\d][\s-]?){10,13}$', 'Invalid input!')
-class UserProfile(models.Model):
+
+
+#Places are normalized into Province -> City -> Barangay so that addresses
+#can be compared by key. A barangay of a province without a city belongs
+#to a city with a blank name.
+class Province(models.Model):
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=50, unique=True)
+
+    def __unicode__(self):
+        return self.name
+
+
+class City(models.Model):
+    class Meta:
+        unique_together = ('province', 'key')
+        verbose_name_plural = 'cities'
+
+    province = models.ForeignKey('Province')
+    name = models.CharField(max_length=50, blank=True)
+    key = models.CharField(max_length=50, blank=True)
+
+    def __unicode__(self):
+        return self.name
+
+
+class BarangayManager(models.Manager):
+    def resolve(self, province, city, barangay):
+        """
+        Find the barangay of an address, adding any place that does not
+        exist yet. Returns None if the province or barangay is blank.
+        """
+        province_key = normalize_name(province)
+        city_key = normalize_name(city)
+        barangay_key = normalize_name(barangay)
+        if not province_key or not barangay_key:
+            return None
+
+        area = self.filter(key=barangay_key, city__key=city_key,
+                           city__province__key=province_key).first()
+        if area is None:
+            with atomic():
+                province = Province.objects.get_or_create(key=province_key,
+                    defaults={'name': ' '.join(province.split())})[0]
+                city = City.objects.get_or_create(province=province,
+                    key=city_key, defaults={'name': ' '.join(city.split())})[0]
+                area = self.get_or_create(city=city, key=barangay_key,
+                    defaults={'name': ' '.join(barangay.split())})[0]
+        return area
+
+
+class Barangay(models.Model):
+    class Meta:
+        unique_together = ('city', 'key')
+
+    city = models.ForeignKey('City')
+    name = models.CharField(max_length=50)
+    key = models.CharField(max_length=50)
+
+    objects = BarangayManager()
+
+    def __unicode__(self):
+        return self.name
+
+
+class AddressMixin(object):
+    """
+    Model mixin for the free-text address fields. Saving links the address
+    to its normalized Barangay (area) and stores the one line location,
+    unless the address is the one last read or linked.
+    """
+    ADDRESS_FIELDS = ('province', 'city', 'barangay', 'street', 'building')
+
+    def get_address(self):
+        # read from __dict__ so deferred fields are not loaded here
+        return tuple(self.__dict__.get(field) for field in self.ADDRESS_FIELDS)
+
+    def set_address(self, area=None):
+        """
+        Fill in area and location from the address fields. Pass the area
+        when it is already known to skip looking it up.
+        """
+        if area is None:
+            area = Barangay.objects.resolve(self.province, self.city,
+                                            self.barangay)
+        self.area = area
+        self.location = join_address(self.building, self.street,
+                                     self.barangay, self.city, self.province)
+        self._saved_address = self.get_address()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        #_saved_address is set when a row is read (see database/signals.py)
+        changed = self.get_address() != getattr(self, '_saved_address', None)
+        if changed and (update_fields is None or
+                        set(update_fields) & set(self.ADDRESS_FIELDS)):
+            self.set_address()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | \
+                    {'area', 'location'}
+        super(AddressMixin, self).save(*args, **kwargs)
+
+
+def get_sort_name(user):
+    # the space sorts before letters, so this orders by first name, then
+    # last name
+    return u'{0} {1}'.format(user.first_name, user.last_name)
+
+
+class UserProfile(AddressMixin, models.Model):
+    class Meta:
+        #Pages of the client list are read in this order
+        index_together = [('sort_name', 'id')]
     client = models.OneToOneField(User)
     province = models.CharField(max_length=50, blank=False)
     city = models.CharField(max_length=50, blank=True)
@@ -25,20 +141,26 @@ class UserProfile(models.Model):
     street = models.CharField(max_length=50, blank=True)
     building = models.CharField(max_length=50, blank=True)
     contact_number = models.CharField(max_length=30, blank=False,  validators=[contactNumberValidator])
+    area = models.ForeignKey('Barangay', null=True, editable=False)
+    location = models.CharField(max_length=260, default='', editable=False)
+    #Set on every save; cached client rows are keyed by it (see
+    #database/fragments.py)
+    modified = models.DateTimeField(auto_now=True)
+    #The client's names, kept in sync by database.signals
+    sort_name = models.CharField(max_length=61, default='', editable=False)
+
+    def save(self, *args, **kwargs):
+        self.sort_name = get_sort_name(self.client)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'sort_name'}
+        super(UserProfile, self).save(*args, **kwargs)
 
     def __unicode__(self): #Default return value of the UserProfile
         return self.client.get_full_name()
 
-    @property
-    def location(self): #Concatenate address of a user
-        address = [self.building, self.street, self.barangay, self.city,
-            self.province]
-        while '' in address:
-            address.remove('') #Remove those that are left blank
-        return ', '.join(address)
-
 
-class LaundryShop(models.Model):
+class LaundryShop(AddressMixin, models.Model):
     class Meta:
         get_latest_by = 'creation_date' #Sort
     name = models.CharField(max_length=50, blank=False)
@@ -53,47 +175,16 @@ class LaundryShop(models.Model):
     hours_open = models.CharField(max_length=100, blank=False)
     days_open = models.CharField(max_length=100, blank=False)
     creation_date = models.DateTimeField(auto_now_add=True)
-
-    @property
-    def location(self):
-        address = [self.building, self.street, self.barangay, self.city,
-    		self.province]
-        while '' in address:
-            address.remove('')
-
-        return ', '.join(address)
-
-    @property
-    def average_rating(self):
-        average = 0.0
-        price_pk = [price.pk for price in self.price_set.all()]
-        orders = Order.objects.filter(price__pk__in=price_pk)
-        total = 0
-        order_pk = [order.pk for order in orders]
-        transactions = Transaction.objects.filter(order__pk__in=order_pk).distinct()
-        for transaction in transactions:
-            if transaction.paws:
-                average += transaction.paws
-                total += 1
-        if not total:
-            return 0
-        TWOPLACES = Decimal(10) ** -2
-        return Decimal(average/total).quantize(TWOPLACES)
-
-    @property
-    def raters(self):
-        price_pk = [price.pk for price in self.price_set.all()]
-        orders = Order.objects.filter(price__pk__in=price_pk)
-        total = 0
-        order_pk = [order.pk for order in orders]
-        transactions = Transaction.objects.filter(order__pk__in=order_pk).distinct()
-        for transaction in transactions:
-            if transaction.paws:
-                total += 1
-        if not total:
-            return 0
-        return total
-
+    area = models.ForeignKey('Barangay', null=True, editable=False)
+    location = models.CharField(max_length=260, default='', editable=False)
+    #Rating aggregates, kept in sync by database.ratings
+    paws_total = models.PositiveIntegerField(default=0, editable=False)
+    raters = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.DecimalField(default=0, max_digits=3,
+        decimal_places=2, editable=False)
+    #Set on every save; cached shop rows and service menus are keyed by it
+    #(see database/fragments.py)
+    modified = models.DateTimeField(auto_now=True)
 
     def __unicode__(self):
         return self.name
@@ -117,17 +208,45 @@ class Price(models.Model):
 
 
 class Order (models.Model):
+    class Meta:
+        ordering = ['pk'] #the first order decides a transaction's laundry shop
+
     price = models.ForeignKey('Price')
     transaction = models.ForeignKey('Transaction')
     pieces = models.IntegerField(default=0)
+    #Price per kilo at the time of ordering
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2,
+        editable=False)
+
+    @property
+    def subtotal(self):
+        return compute_line_total(self.unit_price, self.pieces)
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.price.price
+        super(Order, self).save(*args, **kwargs)
+
+class TransactionQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Join in the client and prefetch the orders with their shops, which
+        is everything a transaction row shows.
+        """
+        orders = Order.objects.select_related('price__laundry_shop')
+        return self.select_related('client__client').prefetch_related(
+            models.Prefetch('order_set', queryset=orders))
+
 
 def default_date():
     return timezone.now()+timedelta(days=3)
 
 
-class Transaction(models.Model):
+class Transaction(AddressMixin, models.Model):
     class Meta:
         get_latest_by = 'request_date'
+        #Transaction lists filter by status and page by request date
+        index_together = [('status', 'request_date')]
 
     TRANSACTION_STATUS_CHOICES = (
         (1, 'Pending'),
@@ -143,22 +262,38 @@ class Transaction(models.Model):
     paws = models.IntegerField(blank=True, null=True)
     status = models.IntegerField(choices=TRANSACTION_STATUS_CHOICES, default=1)
     request_date = models.DateTimeField(auto_now_add=True)
+    #Set on every save; the live transaction feed follows it (see
+    #management/feed.py)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
     delivery_date = models.DateField(default=default_date)
     province = models.CharField(max_length=50, blank=False)
     city = models.CharField(max_length=50, blank=True)
     barangay = models.CharField(max_length=50, blank=False)
     street = models.CharField(max_length=50, blank=True)
     building = models.CharField(max_length=50, blank=True)
+    area = models.ForeignKey('Barangay', null=True, editable=False)
+    location = models.CharField(max_length=260, default='', editable=False)
     price = models.DecimalField(blank=False, default=0, max_digits=8,
         decimal_places=2)
+    #Totals computed by database.pricing when the order is placed
+    subtotal = models.DecimalField(default=0, max_digits=8, decimal_places=2,
+        editable=False)
+    service_charge = models.DecimalField(default=0, max_digits=8,
+        decimal_places=2, editable=False)
+    delivery_fee = models.DecimalField(default=0, max_digits=8,
+        decimal_places=2, editable=False)
+    total = models.DecimalField(default=0, max_digits=8, decimal_places=2,
+        editable=False)
+
+    objects = TransactionQuerySet.as_manager()
 
     @property
-    def location(self):
-    	address = [self.building, self.street, self.barangay, self.city,
-    		self.province]
-        while '' in address:
-        	address.remove('')
-        return ', '.join(address)
+    def laundry_shop(self):
+        #slicing uses the prefetched orders when for_listing() was used
+        orders = self.order_set.all()[:1]
+        if orders:
+            return orders[0].price.laundry_shop
+        return None
 
     def __unicode__(self):
         return "{0}".format(unicode(self.request_date))
@@ -170,3 +305,42 @@ class Fees(models.Model):
     service_charge = models.DecimalField(default=0.1, decimal_places=2,
         max_digits=3)
     site = models.OneToOneField(Site)
+
+
+class Job(models.Model):
+    """ Work queued by database.jobs for the run_jobs command. """
+    class Meta:
+        #Workers look for queued jobs that are due
+        index_together = [('status', 'run_at')]
+
+    QUEUED = 1
+    RUNNING = 2
+    DONE = 3
+    FAILED = 4
+    JOB_STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed')
+    )
+
+    name = models.CharField(max_length=200)
+    #JSON of the positional and keyword arguments
+    arguments = models.TextField(default='{}')
+    status = models.IntegerField(choices=JOB_STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    created = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(blank=True, null=True)
+    #Updated by the worker while the job runs
+    heartbeat = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return "{0} ({1})".format(self.name, self.get_status_display())
+
+
+#Receivers that keep the rating aggregates and cached fees in sync
+import signals
@@ -0,0 +1,82 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.transaction import atomic
+
+from database.fees import get_fees
+from database.models import Order, Price
+from database.pricing import price_transaction
+
+#Order ingestion shared by every view that places an order.
+#A transaction and all of its orders are written together or not at all.
+
+
+def parse_selected_services(selected_services):
+    """
+    Read the JSON list of selected services posted by the order pages.
+    Each entry needs the pk of a Price and the number of pieces.
+    Returns a list of (price pk, pieces) pairs.
+    """
+    try:
+        services = json.loads(selected_services or '')
+    except ValueError:
+        raise ValidationError({'selectedServices': 'Invalid list of services.'})
+    if not isinstance(services, list) or not services:
+        raise ValidationError({'selectedServices': 'No services were selected.'})
+
+    selected = []
+    for service in services:
+        try:
+            price_pk = int(service['pk'])
+            pieces = int(service['pieces'])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'selectedServices':
+                'Each service needs a pk and a number of pieces.'})
+        if pieces < 1:
+            raise ValidationError({'selectedServices':
+                'Number of pieces must be at least 1.'})
+        selected.append((price_pk, pieces))
+    return selected
+
+
+def create_transaction(transaction_form, client, selected_services):
+    """
+    Save the transaction from a TransactionForm along with one order per
+    service in the selectedServices JSON posted by the order pages.
+    """
+    selected = parse_selected_services(selected_services)
+    return save_transaction(transaction_form, client, selected)
+
+
+def save_transaction(transaction_form, client, selected,
+                     field='selectedServices'):
+    """
+    Save the transaction from a TransactionForm along with one order per
+    (price pk, pieces) pair in selected. Prices are fetched in one query and
+    the orders are bulk inserted. Raises ValidationError without saving
+    anything if the form or the selected services are invalid, reporting
+    service errors under field.
+    The totals are computed here from the current prices and fees, and the
+    price of each service is copied onto its order.
+    """
+    if not transaction_form.is_valid():
+        raise ValidationError(transaction_form.errors)
+
+    with atomic():
+        prices = Price.objects.in_bulk(set(pk for pk, pieces in selected))
+        missing = [pk for pk, pieces in selected if pk not in prices]
+        if missing:
+            raise ValidationError({field:
+                'Unknown service: {0}'.format(missing[0])})
+
+        orders = [Order(price=prices[pk], unit_price=prices[pk].price,
+                         pieces=pieces)
+                  for pk, pieces in selected]
+        transaction = transaction_form.save(commit=False)
+        transaction.client = client
+        price_transaction(transaction, orders, get_fees())
+        transaction.save()
+        for order in orders:
+            order.transaction = transaction
+        Order.objects.bulk_create(orders)
+    return transaction
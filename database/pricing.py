@@ -0,0 +1,50 @@
+from collections import namedtuple
+from decimal import Decimal
+
+#Prices are per kilo and a kilo is taken to be 7 pieces of clothing.
+#Every amount is rounded to centavos line by line, so the lines shown to
+#the client always add up to the stored subtotal.
+
+PIECES_PER_KILO = 7
+TWOPLACES = Decimal(10) ** -2
+
+Totals = namedtuple('Totals', ['subtotal', 'service_charge', 'delivery_fee',
+                               'total'])
+
+
+def round_amount(amount):
+    return Decimal(amount).quantize(TWOPLACES)
+
+
+def compute_line_total(unit_price, pieces):
+    """ Price of a number of pieces at a price per kilo. """
+    return round_amount(Decimal(unit_price) * pieces / PIECES_PER_KILO)
+
+
+def compute_totals(lines, fees):
+    """
+    Compute the totals of an order from its (unit price, pieces) lines and
+    the Fees to charge.
+    """
+    subtotal = sum((compute_line_total(unit_price, pieces)
+                    for unit_price, pieces in lines), Decimal(0))
+    service_charge = round_amount(subtotal * fees.service_charge)
+    delivery_fee = round_amount(fees.delivery_fee)
+    return Totals(subtotal, service_charge, delivery_fee,
+                  subtotal + service_charge + delivery_fee)
+
+
+def price_transaction(transaction, orders, fees):
+    """
+    Store the totals of the given orders on the transaction. The actual
+    price starts out as the computed total until the shop weighs the
+    laundry. Does not save the transaction.
+    """
+    totals = compute_totals([(order.unit_price, order.pieces)
+                             for order in orders], fees)
+    transaction.subtotal = totals.subtotal
+    transaction.service_charge = totals.service_charge
+    transaction.delivery_fee = totals.delivery_fee
+    transaction.total = totals.total
+    transaction.price = totals.total
+    return totals
@@ -0,0 +1,113 @@
+import threading
+
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from database.catalog import touch_catalog
+from database.jobs import job
+from database.models import LaundryShop, Order, Price
+
+#Ratings are stored on LaundryShop as a running total and a count of rated
+#transactions so that reading a shop's rating is a plain column read.
+#A transaction counts once for every shop it ordered from, and only when it
+#has a non-zero paws value. The aggregates are written with update(), which
+#sends no signals, so the catalog version and the modified time of the
+#shops (see database/fragments.py) are changed here.
+
+TWOPLACES = Decimal(10) ** -2
+
+_state = threading.local()
+
+
+def compute_average(paws_total, raters):
+    if not raters:
+        return Decimal(0)
+    return (Decimal(paws_total) / raters).quantize(TWOPLACES)
+
+
+def get_rated_shops(transaction):
+    """ Primary keys of the shops that a transaction ordered from. """
+    return list(Price.objects.filter(order__transaction=transaction)
+                .values_list('laundry_shop', flat=True).distinct())
+
+
+def adjust_ratings(shop_pks, paws_delta, raters_delta):
+    """
+    Add a change in paws and number of raters to the given shops, then
+    refresh their averages. Totals are incremented in the database so
+    concurrent ratings do not overwrite each other.
+    """
+    if not shop_pks:
+        return
+    with atomic():
+        shops = LaundryShop.objects.filter(pk__in=shop_pks)
+        shops.update(paws_total=F('paws_total') + paws_delta,
+                     raters=F('raters') + raters_delta,
+                     modified=timezone.now())
+        for pk, paws_total, raters in shops.values_list('pk', 'paws_total',
+                                                        'raters'):
+            LaundryShop.objects.filter(pk=pk).update(
+                average_rating=compute_average(paws_total, raters))
+    touch_catalog()
+
+
+@job
+def recalculate_ratings(shop_pks=None):
+    """
+    Rebuild the rating aggregates from the transactions themselves.
+    Rebuilds every shop when no primary keys are given. Returns the number
+    of shops whose aggregates changed.
+    """
+    shops = LaundryShop.objects.all()
+    orders = Order.objects.filter(transaction__paws__gt=0)
+    if shop_pks is not None:
+        shops = shops.filter(pk__in=shop_pks)
+        orders = orders.filter(price__laundry_shop__in=shop_pks)
+
+    totals = {}
+    # cleared ordering, or the order pk is selected too and every order
+    # of a transaction counts as a rater
+    rated = orders.values_list('price__laundry_shop', 'transaction',
+                               'transaction__paws').order_by().distinct()
+    for shop_pk, transaction_pk, paws in rated.iterator():
+        paws_total, raters = totals.get(shop_pk, (0, 0))
+        totals[shop_pk] = (paws_total + paws, raters + 1)
+
+    changed = []
+    with atomic():
+        for pk, paws_total, raters in shops.values_list('pk', 'paws_total',
+                                                        'raters'):
+            new_total, new_raters = totals.get(pk, (0, 0))
+            if (new_total, new_raters) == (paws_total, raters):
+                continue
+            LaundryShop.objects.filter(pk=pk).update(
+                paws_total=new_total, raters=new_raters,
+                average_rating=compute_average(new_total, new_raters),
+                modified=timezone.now())
+            changed.append(pk)
+    if changed:
+        touch_catalog()
+    return len(changed)
+
+
+@contextmanager
+def suspend_rating_updates():
+    """
+    Skip the rating updates of the signal receivers inside the block, for
+    deletes that cascade to many orders and recalculate the ratings of the
+    shops involved once afterwards.
+    """
+    suspended = rating_updates_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = suspended
+
+
+def rating_updates_suspended():
+    return getattr(_state, 'suspended', False)
@@ -0,0 +1,139 @@
+from collections import namedtuple
+
+from django.db import connection
+
+from database.models import LaundryShop, Service, UserProfile
+
+#Full-text search over laundry shops, clients and services.
+#Every searchable model has its own SQLite FTS5 table whose rowid is the
+#primary key of the indexed row. The trigram tokenizer is used so that a
+#search term matches anywhere inside a word, like the icontains filters it
+#replaces, while still being answered from the index.
+#The tables are created by migration 0009 and kept up to date by the
+#receivers in database/signals.py.
+
+SearchIndex = namedtuple('SearchIndex', ['table', 'columns', 'weights',
+                                         'get_document'])
+
+#Terms shorter than this cannot be looked up in a trigram index
+MIN_TERM_LENGTH = 3
+
+
+def get_shop_document(shop):
+    return [shop.name, shop.location]
+
+
+def get_client_document(profile):
+    return [profile.client.get_full_name(), profile.location]
+
+
+def get_service_document(service):
+    return [service.name, service.description]
+
+
+#Matches in the name count ten times as much as matches elsewhere
+SEARCH_INDEXES = {
+    LaundryShop: SearchIndex('database_laundryshop_search',
+                             ['name', 'address'], [10.0, 1.0],
+                             get_shop_document),
+    UserProfile: SearchIndex('database_userprofile_search',
+                             ['name', 'address'], [10.0, 1.0],
+                             get_client_document),
+    Service: SearchIndex('database_service_search',
+                         ['name', 'description'], [10.0, 1.0],
+                         get_service_document),
+}
+
+
+def quote_name(name):
+    return connection.ops.quote_name(name)
+
+
+def index_object(instance):
+    """ Add or replace the search document of a model instance. """
+    index = SEARCH_INDEXES[type(instance)]
+    document = index.get_document(instance)
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(
+            quote_name(index.table)), [instance.pk])
+        cursor.execute('INSERT INTO {0} (rowid, {1}) VALUES (%s, {2})'.format(
+            quote_name(index.table),
+            ', '.join(quote_name(column) for column in index.columns),
+            ', '.join(['%s'] * len(index.columns))),
+            [instance.pk] + document)
+
+
+def index_objects(model, instances):
+    """
+    Add the search documents of new rows of a model all at once, for rows
+    written with bulk_create, which sends no post_save signals.
+    """
+    index = SEARCH_INDEXES[model]
+    rows = [[instance.pk] + index.get_document(instance)
+            for instance in instances]
+    with connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO {0} (rowid, {1}) VALUES (%s, {2})'
+            .format(quote_name(index.table),
+                    ', '.join(quote_name(column) for column in index.columns),
+                    ', '.join(['%s'] * len(index.columns))), rows)
+
+
+def unindex_object(model, pk):
+    """ Remove the search document of a deleted row. """
+    index = SEARCH_INDEXES[model]
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(
+            quote_name(index.table)), [pk])
+
+
+def rebuild_index(model):
+    """ Replace the search table of a model with its current rows. """
+    index = SEARCH_INDEXES[model]
+    queryset = model.objects.all()
+    if model is UserProfile:
+        queryset = queryset.select_related('client')
+    instances = list(queryset.iterator())
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {0}'.format(quote_name(index.table)))
+    index_objects(model, instances)
+    return len(instances)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search(queryset, query):
+    """
+    Narrow a queryset of a searchable model down to the rows that contain
+    every term of the query in any of their indexed fields. The rows are
+    annotated with search_rank, which is lower for better matches, and
+    ordered by it before the queryset's own ordering.
+    """
+    model = queryset.model
+    index = SEARCH_INDEXES[model]
+    table = quote_name(index.table)
+    terms = query.split()
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+
+    where = ['{0}.rowid = {1}.{2}'.format(table,
+        quote_name(model._meta.db_table), quote_name(model._meta.pk.column))]
+    params = []
+    if long_terms:
+        where.append('{0} MATCH %s'.format(table))
+        params.append(' '.join('"{0}"'.format(term.replace('"', '""'))
+                               for term in long_terms))
+        rank = 'bm25({0}, {1})'.format(table, ', '.join(
+            str(weight) for weight in index.weights))
+    else:
+        rank = '0'
+    document = " || ' ' || ".join('{0}.{1}'.format(table, quote_name(column))
+                                  for column in index.columns)
+    for term in short_terms:
+        where.append("({0}) LIKE %s ESCAPE '\\'".format(document))
+        params.append('%{0}%'.format(escape_like(term)))
+
+    ordering = ['search_rank'] + list(queryset.query.order_by)
+    return queryset.extra(select={'search_rank': rank}, tables=[index.table],
+                          where=where, params=params).order_by(*ordering)
@@ -0,0 +1,132 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from database.catalog import catalog_updates_suspended, touch_catalog
+from database.fees import clear_fees
+from database.fragments import forget_rows, touch_rows
+from database.models import (Fees, LaundryShop, Order, Price, Service,
+                             Transaction, UserProfile, get_sort_name)
+from database.ratings import (adjust_ratings, get_rated_shops,
+                              rating_updates_suspended, recalculate_ratings)
+from database.search import index_object, unindex_object
+
+# These receivers keep the rating aggregates on LaundryShop up to date
+# whenever a transaction is rated or its orders change, drop the cached
+# fees, catalog responses and template fragments when they are edited and
+# keep the search tables in sync.
+
+
+@receiver(post_init, sender=LaundryShop)
+@receiver(post_init, sender=UserProfile)
+@receiver(post_init, sender=Transaction)
+def remember_address(sender, instance, **kwargs):
+    # the area of a row that was read is kept until its address changes
+    if instance.pk is not None:
+        instance._saved_address = instance.get_address()
+
+
+@receiver(post_init, sender=Transaction)
+def remember_paws(sender, instance, **kwargs):
+    # read from __dict__ so a deferred paws field is not loaded here
+    instance._saved_paws = instance.__dict__.get('paws')
+
+
+@receiver(post_save, sender=Transaction)
+def update_ratings_on_rate(sender, instance, created=False, **kwargs):
+    old_paws = instance._saved_paws or 0
+    new_paws = instance.paws or 0
+    instance._saved_paws = instance.paws
+    if created or old_paws == new_paws:
+        return
+    adjust_ratings(get_rated_shops(instance), new_paws - old_paws,
+                   bool(new_paws) - bool(old_paws))
+
+
+@receiver(post_save, sender=Order)
+def update_ratings_on_order(sender, instance, created=False, **kwargs):
+    # only orders added to an already rated transaction change a rating
+    if instance.transaction.paws:
+        recalculate_ratings([instance.price.laundry_shop_id])
+
+
+@receiver(post_delete, sender=Order)
+def update_ratings_on_order_delete(sender, instance, **kwargs):
+    if rating_updates_suspended():
+        return
+    shop_pks = Price.objects.filter(pk=instance.price_id) \
+        .values_list('laundry_shop', flat=True)
+    recalculate_ratings(list(shop_pks))
+
+
+@receiver(post_save, sender=Fees)
+@receiver(post_delete, sender=Fees)
+def clear_cached_fees(sender, instance, **kwargs):
+    clear_fees(instance.site.domain)
+
+
+@receiver(post_save, sender=LaundryShop)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=LaundryShop)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Price)
+def update_catalog_version(sender, instance, **kwargs):
+    # also covers the price formsets of the shop views, which save and
+    # delete each Price
+    if not catalog_updates_suspended():
+        touch_catalog()
+
+
+@receiver(post_save, sender=LaundryShop)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=Service)
+def update_search_index(sender, instance, **kwargs):
+    if not catalog_updates_suspended():
+        index_object(instance)
+
+
+@receiver(post_delete, sender=LaundryShop)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=Service)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_object(sender, instance.pk)
+
+
+@receiver(post_save, sender=Price)
+@receiver(post_delete, sender=Price)
+def update_service_menu(sender, instance, **kwargs):
+    touch_rows(LaundryShop, [instance.laundry_shop_id])
+
+
+@receiver(post_save, sender=Service)
+def update_service_menus(sender, instance, created=False, **kwargs):
+    # deleted services take their prices with them, which touches the shops
+    if not created:
+        touch_rows(LaundryShop, Price.objects.filter(service=instance)
+                   .values_list('laundry_shop', flat=True))
+
+
+@receiver(post_delete, sender=LaundryShop)
+@receiver(post_delete, sender=UserProfile)
+def forget_deleted_rows(sender, instance, **kwargs):
+    # a shop deleted with its prices need not be touched afterwards
+    forget_rows(sender, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def update_client_profiles(sender, instance, update_fields=None, **kwargs):
+    # logging in only saves last_login, which is not searchable nor shown
+    # in the client rows
+    if update_fields and \
+            not set(update_fields) & {'first_name', 'last_name', 'email'}:
+        return
+    profiles = list(UserProfile.objects.filter(client=instance))
+    for profile in profiles:
+        profile.client = instance
+        index_object(profile)
+    if profiles:
+        # sets the time the client rows are cached by as well
+        UserProfile.objects.filter(client=instance).update(
+            sort_name=get_sort_name(instance), modified=timezone.now())
@@ -0,0 +1,229 @@
+import random
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import DecimalField, Max
+from django.utils import timezone
+
+from database.addresses import join_address
+from database.fees import get_fees
+from database.models import (Barangay, LaundryShop, Order, Price, Service,
+                             Transaction, UserProfile)
+from database.pricing import compute_totals
+from database.ratings import recalculate_ratings
+from database.search import rebuild_index
+
+#Made up shops, services, clients and transactions at production volumes,
+#used by the benchmark_views command. Rows are inserted with executemany in
+#large batches and numbered by hand, since bulk_create is far too slow for
+#millions of rows and does not hand back primary keys on SQLite. Nothing
+#here sends signals, so the ratings and search tables are rebuilt at the
+#end.
+
+INSERT_BATCH_SIZE = 5000
+
+PROVINCES = ['Cebu', 'Bohol', 'Leyte', 'Negros Oriental', 'Davao del Sur']
+CITIES_PER_PROVINCE = 4
+BARANGAYS_PER_CITY = 20
+
+UNIT_PRICES = [Decimal(price) for price in range(25, 205, 5)]
+#Most transactions are long done; (status, weight)
+STATUS_WEIGHTS = [(1, 2), (2, 3), (3, 90), (4, 5)]
+
+
+class RowWriter(object):
+    """
+    Inserts rows of a model a batch at a time, numbering their primary keys
+    from the largest one in the table.
+    """
+    def __init__(self, model, fields):
+        opts = model._meta
+        self.fields = [opts.pk] + [opts.get_field(name) for name in fields]
+        self.sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+            connection.ops.quote_name(opts.db_table),
+            ', '.join(connection.ops.quote_name(field.column)
+                      for field in self.fields),
+            ', '.join(['%s'] * len(self.fields)))
+        self.next_pk = (model.objects.aggregate(last=Max('pk'))['last']
+                        or 0) + 1
+        self.decimals = {}
+        self.rows = []
+        self.count = 0
+
+    def prepare(self, field, value):
+        # converting decimals is slow and only a few different amounts
+        # occur, so each is converted once
+        if not isinstance(field, DecimalField):
+            return field.get_db_prep_save(value, connection)
+        key = (field, value)
+        if key not in self.decimals:
+            self.decimals[key] = field.get_db_prep_save(value, connection)
+        return self.decimals[key]
+
+    def add(self, *values):
+        """ Queue a row with the values of the fields, returning its pk. """
+        pk = self.next_pk
+        self.next_pk += 1
+        self.rows.append([pk] + [self.prepare(field, value) for field, value
+                                 in zip(self.fields[1:], values)])
+        if len(self.rows) >= INSERT_BATCH_SIZE:
+            self.flush()
+        return pk
+
+    def flush(self):
+        if self.rows:
+            with connection.cursor() as cursor:
+                cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+
+def create_areas():
+    """
+    The places addresses are picked from, as (province, city, barangay,
+    Barangay pk) tuples.
+    """
+    areas = []
+    for province in PROVINCES:
+        for city_number in range(1, CITIES_PER_PROVINCE + 1):
+            city = '{0} City {1}'.format(province, city_number)
+            for number in range(1, BARANGAYS_PER_CITY + 1):
+                barangay = 'Barangay {0}'.format(number)
+                area = Barangay.objects.resolve(province, city, barangay)
+                areas.append((province, city, barangay, area.pk))
+    return areas
+
+
+def get_address(rng, areas):
+    """ Values of the ADDRESS_COLUMNS of a made up address. """
+    province, city, barangay, area_pk = rng.choice(areas)
+    street = '{0} Street'.format(rng.randint(1, 300))
+    building = 'Unit {0}'.format(rng.randint(1, 50))
+    return [province, city, barangay, street, building, area_pk,
+            join_address(building, street, barangay, city, province)]
+
+
+ADDRESS_COLUMNS = ['province', 'city', 'barangay', 'street', 'building',
+                   'area', 'location']
+
+
+def generate(shops=2000, services=50, prices_per_shop=10, clients=1000,
+             transactions=100000, orders_per_transaction=3, days=365,
+             seed=0, log=None):
+    """
+    Add made up rows at the given volumes. Transactions are spread over the
+    past number of days and each orders up to orders_per_transaction
+    services of one shop. Returns the number of rows added per model.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    now = timezone.now()
+    fees = get_fees()
+
+    areas = create_areas()
+
+    log('Adding {0} services.'.format(services))
+    service_rows = RowWriter(Service, ['name', 'description'])
+    first_service = service_rows.next_pk
+    for number in range(services):
+        service_rows.add('Synthetic service {0}'.format(service_rows.next_pk),
+                         'Made up service number {0}.'.format(number))
+    service_rows.flush()
+    service_pks = range(first_service, service_rows.next_pk)
+
+    log('Adding {0} shops.'.format(shops))
+    shop_rows = RowWriter(LaundryShop, [
+        'name', 'contact_number', 'email', 'website', 'hours_open',
+        'days_open', 'creation_date', 'modified', 'paws_total', 'raters',
+        'average_rating'] + ADDRESS_COLUMNS)
+    price_rows = RowWriter(Price, ['laundry_shop', 'service', 'price',
+                                   'duration'])
+    shop_prices = []
+    for number in range(shops):
+        creation_date = now - timedelta(days=rng.randint(days, 2 * days))
+        shop_pk = shop_rows.add(
+            'Synthetic Laundry {0}'.format(number), '09171234567',
+            'shop{0}@example.com'.format(number), '', '8am - 8pm',
+            'Mon - Sat', creation_date, creation_date, 0, 0, Decimal(0),
+            *get_address(rng, areas))
+        prices = []
+        for service_pk in rng.sample(service_pks,
+                                     min(prices_per_shop, services)):
+            unit_price = rng.choice(UNIT_PRICES)
+            prices.append((price_rows.add(shop_pk, service_pk, unit_price,
+                                          rng.randint(1, 7)), unit_price))
+        shop_prices.append(prices)
+    shop_rows.flush()
+    price_rows.flush()
+
+    log('Adding {0} clients.'.format(clients))
+    user_rows = RowWriter(User, ['username', 'password', 'first_name',
+                                 'last_name', 'email', 'is_staff',
+                                 'is_superuser', 'is_active', 'date_joined'])
+    profile_rows = RowWriter(UserProfile, ['client', 'contact_number',
+                                           'modified', 'sort_name'] +
+                             ADDRESS_COLUMNS)
+    client_addresses = []
+    for number in range(clients):
+        user_pk = user_rows.add(
+            'synthetic{0}'.format(user_rows.next_pk), '!',
+            'Client', str(number), '', False, False, True,
+            now - timedelta(days=rng.randint(days, 2 * days)))
+        address = get_address(rng, areas)
+        client_addresses.append((profile_rows.add(
+            user_pk, '09181234567', now, u'Client {0}'.format(number),
+            *address), address))
+    user_rows.flush()
+    profile_rows.flush()
+
+    log('Adding {0} transactions.'.format(transactions))
+    transaction_rows = RowWriter(Transaction, [
+        'client', 'paws', 'status', 'request_date', 'modified',
+        'delivery_date', 'price', 'subtotal', 'service_charge',
+        'delivery_fee', 'total'] + ADDRESS_COLUMNS)
+    order_rows = RowWriter(Order, ['price', 'transaction', 'pieces',
+                                   'unit_price'])
+    statuses = [status for status, weight in STATUS_WEIGHTS
+                for i in range(weight)]
+    start = now - timedelta(days=days)
+    step = timedelta(days=days) // max(transactions, 1)
+    for number in range(transactions):
+        # requested in order of primary key, like real transactions
+        request_date = start + step * number
+        status = rng.choice(statuses)
+        paws = rng.randint(1, 5) if status == 3 and rng.random() < 0.5 \
+            else None
+        prices = rng.choice(shop_prices)
+        lines = [(price_pk, unit_price, rng.randint(1, 20)) for
+                 price_pk, unit_price in rng.sample(
+                     prices, rng.randint(1, min(orders_per_transaction,
+                                                len(prices))))]
+        totals = compute_totals([(unit_price, pieces) for price_pk,
+                                 unit_price, pieces in lines], fees)
+        profile_pk, address = rng.choice(client_addresses)
+        transaction_pk = transaction_rows.add(
+            profile_pk, paws, status, request_date, request_date,
+            request_date.date() + timedelta(days=3), totals.total,
+            totals.subtotal, totals.service_charge, totals.delivery_fee,
+            totals.total, *address)
+        for price_pk, unit_price, pieces in lines:
+            order_rows.add(price_pk, transaction_pk, pieces, unit_price)
+    transaction_rows.flush()
+    order_rows.flush()
+
+    log('Rebuilding ratings and search tables.')
+    recalculate_ratings(range(shop_rows.next_pk - shops, shop_rows.next_pk))
+    for model in (LaundryShop, UserProfile, Service):
+        rebuild_index(model)
+
+    return {
+        'services': service_rows.count,
+        'shops': shop_rows.count,
+        'prices': price_rows.count,
+        'clients': profile_rows.count,
+        'transactions': transaction_rows.count,
+        'orders': order_rows.count,
+    }
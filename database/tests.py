@@ -1,8 +1,29 @@
+import json
+import os
+import shutil
+import tempfile
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.db.utils import ConnectionHandler
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
-from database.models import LaundryShop, Transaction, default_date, UserProfile, Price, Service, Order
+from django.core.management import call_command
+from django.utils.six import StringIO
+from database.concurrency import run_writers
+from database.fees import (FEES_SITE_DOMAIN, clear_fees, get_cache_key,
+                           get_fees)
+from database.jobs import (RETRY_DELAY, STALE_AFTER, claim_job, enqueue, get_stats,
+                           job, requeue_stale_jobs, run_job, run_pending_jobs)
+from database.pricing import compute_line_total, compute_totals
+from database.synthetic import generate
+from database.models import LaundryShop, Transaction, default_date, UserProfile, Price, Service, Order, Fees, Barangay, Job
 
 # Create your tests here.
 class ModelTestCase(TestCase):
@@ -40,6 +61,7 @@ class ModelTestCase(TestCase):
         Order.objects.create(price=price, transaction=transaction1, pieces=10)
         Order.objects.create(price=price, transaction=transaction2, pieces=10)
         expected = (4 + 5) / 2.0
+        shop.refresh_from_db()
         self.assertEquals(shop.average_rating, expected)
 
     def test_average_rating_no_rating(self):
@@ -69,3 +91,328 @@ class ModelTestCase(TestCase):
         actual = default_date().date()
         expected = date_today + timedelta(days=3)
         self.assertEquals(actual, expected)
+
+
+class AddressTestCase(TestCase):
+    def create_shop(self, **address):
+        return LaundryShop.objects.create(name='ls', contact_number='12345',
+                                          hours_open='24 hours',
+                                          days_open='mon - sat', **address)
+
+    def test_same_place_shares_area(self):
+        shop1 = self.create_shop(province='Cebu', city='Cebu City',
+                                 barangay='Lahug')
+        shop2 = self.create_shop(province=' cebu', city='cebu  city',
+                                 barangay='LAHUG')
+        self.assertEqual(shop1.area, shop2.area)
+        self.assertEqual(shop1.area.city.province.name, 'Cebu')
+        self.assertEqual(Barangay.objects.count(), 1)
+
+    def test_area_without_city(self):
+        shop = self.create_shop(province='Cebu', barangay='Lahug')
+        self.assertEqual(shop.area.city.name, '')
+
+    def test_address_update(self):
+        shop = self.create_shop(province='Cebu', barangay='Lahug')
+        shop.barangay = 'Mabolo'
+        shop.save(update_fields=['barangay'])
+        shop = LaundryShop.objects.get(pk=shop.pk)
+        self.assertEqual(shop.area.name, 'Mabolo')
+        self.assertEqual(shop.location, 'Mabolo, Cebu')
+
+    def test_unchanged_address_is_not_looked_up(self):
+        shop = self.create_shop(province='Cebu', barangay='Lahug')
+        shop = LaundryShop.objects.get(pk=shop.pk)
+        shop.name = 'renamed'
+        with CaptureQueriesContext(connection) as queries:
+            shop.save()
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'database_barangay' in query['sql']])
+        shop.barangay = 'Mabolo'
+        shop.save()
+        self.assertEqual(LaundryShop.objects.get(pk=shop.pk).area.name,
+                         'Mabolo')
+
+    def test_blank_address_has_no_area(self):
+        self.assertIsNone(self.create_shop().area)
+
+
+class RatingAggregateTestCase(TestCase):
+    def setUp(self):
+        self.shop = LaundryShop.objects.create(name='ls1', province='province1',
+            barangay='barangay1', contact_number='12345',
+            hours_open='24 hours', days_open='mon - sat')
+        client = User.objects.create_user(username='mychelsea', password='mychelsea')
+        self.user_profile = UserProfile.objects.create(client=client,
+            province='province1', barangay='barangay1', contact_number='123123')
+        service = Service.objects.create(name='lol', description='verylol')
+        self.price = Price.objects.create(laundry_shop=self.shop,
+            service=service, price=45, duration=3)
+
+    def create_transaction(self):
+        transaction = Transaction.objects.create(client=self.user_profile,
+            status=3)
+        Order.objects.create(price=self.price, transaction=transaction,
+            pieces=10)
+        return transaction
+
+    def rate(self, transaction, paws):
+        transaction.paws = paws
+        transaction.save()
+        self.shop.refresh_from_db()
+
+    def test_rating_updates_aggregates(self):
+        self.rate(self.create_transaction(), 4)
+        self.rate(self.create_transaction(), 3)
+        self.assertEquals(self.shop.paws_total, 7)
+        self.assertEquals(self.shop.raters, 2)
+        self.assertEquals(str(self.shop.average_rating), '3.50')
+
+    def test_rerating_replaces_previous_paws(self):
+        transaction = self.create_transaction()
+        self.rate(transaction, 2)
+        self.rate(transaction, 5)
+        self.assertEquals(self.shop.paws_total, 5)
+        self.assertEquals(self.shop.raters, 1)
+
+    def test_deleting_transaction_removes_rating(self):
+        self.rate(self.create_transaction(), 4)
+        transaction = self.create_transaction()
+        self.rate(transaction, 1)
+        transaction.delete()
+        self.shop.refresh_from_db()
+        self.assertEquals(self.shop.raters, 1)
+        self.assertEquals(self.shop.average_rating, 4)
+
+    def test_rebuild_ratings_command(self):
+        self.rate(self.create_transaction(), 4)
+        LaundryShop.objects.update(paws_total=0, raters=0, average_rating=0)
+        out = StringIO()
+        call_command('rebuild_ratings', stdout=out)
+        self.assertIn('1 laundry shop', out.getvalue())
+        self.shop.refresh_from_db()
+        self.assertEquals(self.shop.paws_total, 4)
+        self.assertEquals(self.shop.raters, 1)
+        self.assertEquals(self.shop.average_rating, 4)
+
+    def test_rebuild_counts_transaction_once(self):
+        transaction = self.create_transaction()
+        Order.objects.create(price=self.price, transaction=transaction,
+            pieces=3)
+        self.rate(transaction, 4)
+        LaundryShop.objects.update(paws_total=0, raters=0, average_rating=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.shop.refresh_from_db()
+        self.assertEquals(self.shop.paws_total, 4)
+        self.assertEquals(self.shop.raters, 1)
+
+
+class FeesCacheTestCase(TestCase):
+    def setUp(self):
+        clear_fees()
+
+    def tearDown(self):
+        clear_fees()
+
+    def test_fees_are_cached(self):
+        fees = get_fees()
+        with self.assertNumQueries(0):
+            self.assertEquals(get_fees(), fees)
+
+    def test_other_processes_see_cleared_fees(self):
+        # a cache of its own, like the one of another process
+        other = FileBasedCache(settings.CACHES['default']['LOCATION'], {})
+        fees = get_fees()
+        self.assertEqual(other.get(get_cache_key(FEES_SITE_DOMAIN)), fees)
+        fees.delivery_fee = 75
+        fees.save()
+        self.assertIsNone(other.get(get_cache_key(FEES_SITE_DOMAIN)))
+
+    def test_saving_fees_clears_cache(self):
+        fees = get_fees()
+        fees.delivery_fee = 75
+        fees.save()
+        with self.assertNumQueries(2):
+            self.assertEquals(get_fees().delivery_fee, 75)
+
+
+class PricingTestCase(TestCase):
+    def test_line_total_is_per_kilo(self):
+        self.assertEquals(compute_line_total(45, 7), 45)
+        self.assertEquals(str(compute_line_total(45, 3)), '19.29')
+
+    def test_compute_totals(self):
+        fees = Fees(delivery_fee=50, service_charge=Decimal('0.1'))
+        totals = compute_totals([(45, 3), (70, 7)], fees)
+        self.assertEquals(str(totals.subtotal), '89.29')
+        self.assertEquals(str(totals.service_charge), '8.93')
+        self.assertEquals(str(totals.delivery_fee), '50.00')
+        self.assertEquals(str(totals.total), '148.22')
+
+    def test_order_copies_unit_price(self):
+        shop = LaundryShop.objects.create(name='ls1', province='province1',
+            barangay='barangay1', contact_number='12345',
+            hours_open='24 hours', days_open='mon - sat')
+        client = User.objects.create_user(username='mychelsea', password='mychelsea')
+        user_profile = UserProfile.objects.create(client=client,
+            province='province1', barangay='barangay1', contact_number='123123')
+        service = Service.objects.create(name='lol', description='verylol')
+        price = Price.objects.create(laundry_shop=shop, service=service, price=45, duration=3)
+        transaction = Transaction.objects.create(client=user_profile)
+        order = Order.objects.create(price=price, transaction=transaction, pieces=7)
+        self.assertEquals(order.unit_price, 45)
+
+
+class SyntheticDataTestCase(TestCase):
+    def test_generate(self):
+        rows = generate(shops=4, services=3, prices_per_shop=2, clients=3,
+                        transactions=30, orders_per_transaction=2)
+        self.assertEqual(rows['transactions'], 30)
+        self.assertEqual(LaundryShop.objects.count(), 4)
+        self.assertEqual(Price.objects.count(), 8)
+        self.assertEqual(Order.objects.count(), rows['orders'])
+        transaction = Transaction.objects.last()
+        self.assertEqual(transaction.subtotal, sum(
+            order.subtotal for order in transaction.order_set.all()))
+        self.assertEqual(transaction.location,
+                         transaction.client.location)
+        shop_pks = set(transaction.order_set.values_list(
+            'price__laundry_shop', flat=True))
+        self.assertEqual(len(shop_pks), 1)
+        # the ratings are rebuilt from the made up transactions
+        rated = Transaction.objects.filter(paws__gt=0).count()
+        self.assertEqual(sum(LaundryShop.objects.values_list('raters',
+                                                             flat=True)),
+                         rated)
+
+    def test_benchmark_views(self):
+        out = StringIO()
+        call_command('benchmark_views', shops=3, services=3, clients=2,
+                     transactions=20, repeat=2, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        views = dict((view['name'], view) for view in report['views'])
+        for name in ('client:view-shops', 'management:pending-transactions',
+                     'transaction-list', 'laundryshop-detail'):
+            self.assertEqual(views[name]['status'], 200)
+            self.assertLessEqual(views[name]['p50_ms'],
+                                 views[name]['p95_ms'])
+        self.assertEqual(views['transaction-list']['queries'], 1)
+        # the made up rows are rolled back
+        self.assertFalse(Transaction.objects.exists())
+
+
+class SQLiteBackendTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA {0}'.format(name))
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        connection = ConnectionHandler({'default': {
+            'ENGINE': 'LaundryBear.sqlite3', 'NAME': self.path,
+            'OPTIONS': {'PRAGMAS': {'busy_timeout': 1000,
+                                    'foreign_keys': 'ON'}}}})['default']
+        try:
+            self.assertEqual(self.get_pragma(connection, 'journal_mode'),
+                             'wal')
+            self.assertEqual(self.get_pragma(connection, 'synchronous'), 1)
+            self.assertEqual(self.get_pragma(connection, 'busy_timeout'),
+                             1000)
+            self.assertEqual(self.get_pragma(connection, 'foreign_keys'), 1)
+        finally:
+            connection.close()
+
+    def test_concurrent_writers(self):
+        result = run_writers('LaundryBear.sqlite3', self.path, threads=4,
+                             writes=25)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['committed'], 100)
+        self.assertTrue(result['consistent'])
+        self.assertGreater(result['writes_per_second'], 0)
+
+
+calls = []
+
+
+@job(max_attempts=2)
+def record_call(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+class JobTestCase(TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def test_enqueued_job_runs_once(self):
+        queued = enqueue(record_call, 'a')
+        self.assertEqual(calls, [])
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(run_pending_jobs(), 0)
+        self.assertEqual(calls, ['a'])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertEqual(queued.attempts, 1)
+
+    def test_claimed_job_is_not_claimed_again(self):
+        enqueue(record_call, 'a')
+        self.assertIsNotNone(claim_job())
+        self.assertIsNone(claim_job())
+
+    def test_failed_job_is_retried_later(self):
+        queued = enqueue(record_call, 'a', fail=True)
+        run_job(claim_job())
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
+        self.assertIn('ValueError', queued.error)
+        self.assertGreaterEqual(queued.run_at, queued.finished +
+                                timedelta(seconds=RETRY_DELAY))
+        # not due yet
+        self.assertEqual(run_pending_jobs(), 0)
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        self.assertEqual(run_pending_jobs(), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.FAILED)
+        self.assertEqual(calls, ['a', 'a'])
+
+    def test_stale_job_is_queued_again(self):
+        queued = enqueue(record_call, 'a')
+        claim_job()
+        Job.objects.filter(pk=queued.pk).update(
+            heartbeat=timezone.now() - timedelta(seconds=STALE_AFTER + 1))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(calls, ['a'])
+
+    def test_long_running_job_is_not_queued_again(self):
+        queued = enqueue(record_call, 'a')
+        claim_job()
+        # started long ago, but its worker is still beating
+        Job.objects.filter(pk=queued.pk).update(
+            started=timezone.now() - timedelta(hours=2),
+            heartbeat=timezone.now())
+        self.assertEqual(requeue_stale_jobs(), 0)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.RUNNING)
+
+    def test_stats(self):
+        enqueue(record_call, 'a')
+        enqueue(record_call, 'b')
+        Job.objects.filter(pk=enqueue(record_call, 'c').pk).update(
+            run_at=timezone.now() + timedelta(hours=1))
+        run_job(claim_job())
+        stats = get_stats()
+        self.assertEqual(stats['due'], 1)
+        self.assertEqual(stats['delayed'], 1)
+        self.assertEqual(stats['done'], 1)
+        self.assertEqual(stats['finished'], 1)
+        self.assertIsNotNone(stats['wait_seconds']['max'])
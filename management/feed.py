@@ -0,0 +1,107 @@
+import calendar
+import json
+import time
+
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from database.models import Transaction
+
+#The pending transaction lists of the dashboards follow a stream of
+#Server-Sent Events that carries every transaction saved since the page
+#was rendered, with its row, which the page puts in place (see
+#management/static/management/js/transactionfeed.js). The stream follows
+#Transaction.modified and its pk as a cursor, so an idle poll is one
+#indexed query. The cursor is the id of every event, so a browser that
+#reconnects resumes where it left off.
+#A transaction is only sent SETTLE_SECONDS after it was saved, by which
+#time every save with an earlier modified time has committed, so none is
+#skipped by the cursor. One may be sent twice, which the page ignores.
+
+SETTLE_SECONDS = 1
+
+#How often a stream looks for changes, how many it sends at a time and
+#how long it stays open before the browser is asked to reconnect, as
+#every open stream holds a worker
+POLL_INTERVAL = 2
+BATCH_SIZE = 50
+STREAM_DURATION = 5 * 60
+RECONNECT_MILLISECONDS = 1000
+
+#Proxies drop connections that are quiet for too long
+KEEP_ALIVE_SECONDS = 15
+
+ROW_TEMPLATE = 'management/transactions/partials/pending_transaction_row.html'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(modified, pk):
+    microseconds = calendar.timegm(modified.utctimetuple()) * 1000000 + \
+        modified.microsecond
+    return '{0}-{1}'.format(microseconds, pk)
+
+
+def decode_cursor(value):
+    """ The (modified, pk) of a cursor, or None if it is not one. """
+    try:
+        microseconds, pk = [int(part) for part in value.split('-')]
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + timedelta(microseconds=microseconds), pk
+
+
+def get_start_cursor():
+    """ The cursor for a page rendered now. """
+    return encode_cursor(
+        timezone.now() - timedelta(seconds=SETTLE_SECONDS), 0)
+
+
+def get_changes(cursor):
+    """
+    The settled transactions saved after the cursor, in the order they
+    were saved, and the cursor after them.
+    """
+    modified, pk = cursor
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    changes = list(
+        Transaction.objects
+        .filter(Q(modified__gt=modified) | Q(modified=modified, pk__gt=pk),
+                modified__lte=settled)
+        .order_by('modified', 'pk').for_listing()[:BATCH_SIZE])
+    if changes:
+        cursor = changes[-1].modified, changes[-1].pk
+    return changes, cursor
+
+
+def format_event(transaction):
+    data = json.dumps({
+        'pk': transaction.pk,
+        'status': transaction.status,
+        'html': render_to_string(ROW_TEMPLATE, {'transaction': transaction}),
+    })
+    return 'id: {0}\nevent: transaction\ndata: {1}\n\n'.format(
+        encode_cursor(transaction.modified, transaction.pk), data)
+
+
+def stream_changes(cursor):
+    """ Yield the events of the transactions saved after the cursor. """
+    yield 'retry: {0}\n\n'.format(RECONNECT_MILLISECONDS)
+    started = last_sent = time.time()
+    while True:
+        changes, cursor = get_changes(cursor)
+        for transaction in changes:
+            yield format_event(transaction)
+        if changes:
+            last_sent = time.time()
+        elif time.time() - last_sent >= KEEP_ALIVE_SECONDS:
+            last_sent = time.time()
+            yield ': keep-alive\n\n'
+        if time.time() - started >= STREAM_DURATION:
+            return
+        # a full batch may not be all there is
+        if len(changes) < BATCH_SIZE:
+            time.sleep(POLL_INTERVAL)
@@ -2,6 +2,7 @@ from django import forms
 from database.models import Service, Price, LaundryShop, Transaction, User, UserProfile, Fees
 from LaundryBear.forms import LoginForm
 from django.forms import ModelForm
+from django.forms.models import BaseInlineFormSet, inlineformset_factory
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
@@ -18,6 +19,25 @@ class PriceForm(forms.ModelForm):
         fields = ['laundry_shop', 'service', 'price', 'duration']
 
 
+class BasePriceFormSet(BaseInlineFormSet):
+    """
+    Formset of the prices of a shop. Every form offers the same services,
+    so they are read once for all of the forms instead of once per form.
+    """
+    service_choices = None
+
+    def add_fields(self, form, index):
+        super(BasePriceFormSet, self).add_fields(form, index)
+        if self.service_choices is None:
+            self.service_choices = list(form.fields['service'].choices)
+        form.fields['service'].choices = self.service_choices
+
+
+PriceFormSet = inlineformset_factory(
+    LaundryShop, Price, formset=BasePriceFormSet,
+    fields=('service', 'price', 'duration'), extra=1)
+
+
 class LaundryShopForm(forms.ModelForm):
     class Meta:
         model = LaundryShop
@@ -73,3 +93,51 @@ class FeesForm(forms.ModelForm):
             'delivery_fee': forms.NumberInput(attrs={'min': 1, 'step': '0.25'}),
             'service_charge': forms.NumberInput(attrs={'max': 1, 'min': 0.01})
         }
+
+
+class TransactionExportForm(forms.Form):
+    FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    )
+    STATUS_CHOICES = (('', 'Any status'),) + \
+        Transaction.TRANSACTION_STATUS_CHOICES
+
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    status = forms.TypedChoiceField(choices=STATUS_CHOICES, coerce=int,
+                                    empty_value=None, required=False)
+    shop = forms.IntegerField(min_value=1, required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+
+class ImportPriceForm(forms.ModelForm):
+    """ The price columns of a row of a catalog import. """
+    class Meta:
+        model = Price
+        fields = ['price', 'duration']
+
+
+class CatalogImportForm(forms.Form):
+    FORMAT_CHOICES = (
+        ('', 'By file extension'),
+        ('csv', 'CSV'),
+        ('json', 'JSON'),
+    )
+
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+
+    def clean(self):
+        cleaned_data = super(CatalogImportForm, self).clean()
+        upload = cleaned_data.get('file')
+        if upload and not cleaned_data.get('format'):
+            extension = upload.name.rsplit('.', 1)[-1].lower()
+            if extension not in ('csv', 'json'):
+                raise forms.ValidationError(
+                    'Choose the format of a file not ending in .csv or .json.')
+            cleaned_data['format'] = extension
+        return cleaned_data
@@ -0,0 +1,201 @@
+import csv
+import json
+
+from itertools import groupby
+
+from django.db.transaction import atomic
+
+from database.addresses import normalize_name
+from database.catalog import suspend_catalog_updates, touch_catalog
+from database.models import Barangay, LaundryShop, Price, Service
+from database.search import index_objects
+from management.forms import ImportPriceForm, LaundryShopForm, ServiceForm
+
+#Bulk import of laundry shops with their services and prices, shared by the
+#import view and the import_catalog command.
+#A CSV file has a row for every price of a shop, repeating the shop columns,
+#and the rows of a shop must follow each other. A JSON file is a list of
+#shops with their list of prices. A price names its service, which is
+#created from the description column if it does not exist yet.
+#Every row is validated with the forms of the shop and service pages and the
+#valid shops are written a batch at a time, each batch in a transaction.
+#The shops are saved one by one for their primary keys and their prices
+#with bulk_create. The search documents of a batch are added at once and
+#the catalog is touched once at the end.
+
+IMPORT_BATCH_SIZE = 500
+
+SHOP_COLUMNS = LaundryShopForm._meta.fields
+PRICE_COLUMNS = ['service', 'description', 'price', 'duration']
+
+
+def read_csv(lines):
+    """
+    Yield (row number, shop data, [(row number, price data)]) for every shop
+    of a CSV file. A row with a blank service only adds the shop.
+    """
+    reader = csv.DictReader(lines)
+
+    def get_values(row):
+        return dict((column, (row.get(column) or '').decode('utf-8').strip())
+                    for column in SHOP_COLUMNS + PRICE_COLUMNS)
+
+    def get_shop(row):
+        number, values = row
+        return [values[column] for column in SHOP_COLUMNS]
+
+    rows = ((reader.line_num, get_values(row)) for row in reader)
+    for shop, shop_rows in groupby(rows, get_shop):
+        shop_rows = list(shop_rows)
+        prices = [(number, values) for number, values in shop_rows
+                  if values['service']]
+        yield shop_rows[0][0], dict(zip(SHOP_COLUMNS, shop)), prices
+
+
+def read_json(lines):
+    """
+    Yield (row number, shop data, [(row number, price data)]) for every shop
+    of a JSON file, numbering the shops from 1. Raises ValueError if the
+    file is not a list of objects.
+    """
+    shops = json.loads(''.join(lines))
+    if not isinstance(shops, list) or \
+            not all(isinstance(shop, dict) for shop in shops):
+        raise ValueError('Expected a list of shops.')
+    for number, shop in enumerate(shops, 1):
+        prices = shop.pop('prices', None) or []
+        if not isinstance(prices, list) or \
+                not all(isinstance(price, dict) for price in prices):
+            prices = [{}]
+        yield number, shop, [(number, price) for price in prices]
+
+
+IMPORT_FORMATS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class CatalogImport(object):
+    """
+    Validates and writes the shops read from a catalog file. Afterwards
+    errors holds a (row number, field, message) for every invalid value and
+    the shops of those rows are left out.
+    """
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.services = dict((normalize_name(service.name), service)
+                             for service in Service.objects.all())
+        self.areas = {}
+        self.price_values = {}
+        self.batch = []
+        self.errors = []
+        self.shop_count = self.price_count = self.service_count = 0
+
+    def add_errors(self, number, errors):
+        for field, messages in sorted(errors.items()):
+            for message in messages:
+                self.errors.append((number, field, message))
+
+    def get_service(self, number, data):
+        name = data.get('service') or ''
+        service = self.services.get(normalize_name(name))
+        if service is None:
+            form = ServiceForm({'name': name,
+                                'description': data.get('description')})
+            if not form.is_valid():
+                self.add_errors(number, form.errors)
+                return None
+            service = form.save()
+            self.services[normalize_name(service.name)] = service
+            self.service_count += 1
+        return service
+
+    def clean_price(self, data):
+        """
+        The (errors, cleaned data) of the price columns of a row. Most rows
+        repeat a few prices, so each pair of values is validated once.
+        """
+        key = (unicode(data.get('price')), unicode(data.get('duration')))
+        if key not in self.price_values:
+            form = ImportPriceForm(data)
+            self.price_values[key] = (form.errors, form.cleaned_data)
+        return self.price_values[key]
+
+    def get_area(self, shop):
+        key = tuple(normalize_name(name) for name in
+                    (shop.province, shop.city, shop.barangay))
+        if key not in self.areas:
+            self.areas[key] = Barangay.objects.resolve(
+                shop.province, shop.city, shop.barangay)
+        return self.areas[key]
+
+    def add(self, number, shop_data, price_rows):
+        """ Validate a shop with its prices and queue it to be written. """
+        error_count = len(self.errors)
+        form = LaundryShopForm(shop_data)
+        if not form.is_valid():
+            self.add_errors(number, form.errors)
+
+        prices = []
+        for price_number, data in price_rows:
+            service = self.get_service(price_number, data)
+            errors, cleaned_data = self.clean_price(data)
+            if errors:
+                self.add_errors(price_number, errors)
+            elif service is not None:
+                prices.append(Price(service=service, **cleaned_data))
+
+        if len(self.errors) == error_count:
+            shop = form.save(commit=False)
+            shop.set_address(self.get_area(shop))
+            self.batch.append((shop, prices))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """ Write the queued shops and their prices. """
+        if not self.batch:
+            return
+        prices = []
+        shops = [shop for shop, shop_prices in self.batch]
+        with atomic(), suspend_catalog_updates():
+            for shop, shop_prices in self.batch:
+                # the area was set when the shop was added, so saving only
+                # inserts it
+                shop.save()
+                for price in shop_prices:
+                    price.laundry_shop = shop
+                    prices.append(price)
+            Price.objects.bulk_create(prices)
+            index_objects(LaundryShop, shops)
+        self.shop_count += len(self.batch)
+        self.price_count += len(prices)
+        self.batch = []
+
+    def run(self, shops):
+        """
+        Import the (row number, shop data, price rows) read from a file.
+        """
+        try:
+            for number, shop_data, price_rows in shops:
+                self.add(number, shop_data, price_rows)
+            self.flush()
+        finally:
+            # the shops were saved without touching it, and bulk_create
+            # sends no post_save signals for the prices
+            if self.shop_count:
+                touch_catalog()
+        return self
+
+
+def import_catalog(lines, file_format, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import the shops of a CSV or JSON file, given as an iterable of lines.
+    Raises ValueError if the file cannot be read at all.
+    """
+    try:
+        return CatalogImport(batch_size).run(
+            IMPORT_FORMATS[file_format](lines))
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValueError(unicode(e))
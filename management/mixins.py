@@ -1,4 +1,5 @@
 from LaundryBear.mixins import LoginRequiredMixin
+from management.feed import get_start_cursor
 
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
@@ -18,4 +19,18 @@ class AdminLoginRequiredMixin(LoginRequiredMixin):
 				return redirect('client:menu')
 		else:
 			return super(AdminLoginRequiredMixin, self).dispatch(request,
-																 *args, **kwargs)
\ No newline at end of file
+																 *args, **kwargs)
+
+
+class TransactionFeedMixin(object):
+	"""
+	Gives the page the cursor to follow the transaction feed from. Views
+	using it read from the primary, as the feed follows the primary and the
+	changes a replica has yet to catch up with would be in neither.
+	"""
+	def get_context_data(self, **kwargs):
+		# taken before the list is read, so no change in between is missed
+		cursor = get_start_cursor()
+		context = super(TransactionFeedMixin, self).get_context_data(**kwargs)
+		context['feed_cursor'] = cursor
+		return context
@@ -0,0 +1,36 @@
+// Keeps a table of pending transactions up to date from the transaction
+// feed (see management/feed.py). The table names the feed in data-feed and
+// how many rows it shows at most in data-feed-limit. Rows of transactions
+// that are no longer pending are removed, changed ones replaced and new
+// ones added after the others while there is room. Elements marked
+// data-feed-rows are shown only while there are rows, and elements marked
+// data-feed-empty only while there are none.
+$(function () {
+  var table = $("table[data-feed]");
+  if (!table.length || !window.EventSource) {
+    return;
+  }
+  var body = table.children("tbody");
+  var limit = parseInt(table.data("feed-limit"), 10);
+  var source = new EventSource(table.data("feed"));
+
+  source.addEventListener("transaction", function (event) {
+    var change = JSON.parse(event.data);
+    var rows = body.children("tr[data-transaction]");
+    var row = rows.filter("[data-transaction='" + change.pk + "']");
+    if (change.status !== 1) {
+      row.remove();
+    } else if (row.length) {
+      row.replaceWith(change.html);
+    } else if (rows.length < limit) {
+      if (rows.length) {
+        rows.last().after(change.html);
+      } else {
+        body.prepend(change.html);
+      }
+    }
+    var empty = !body.children("tr[data-transaction]").length;
+    $("[data-feed-rows]").toggle(!empty);
+    $("[data-feed-empty]").toggle(empty);
+  });
+});
@@ -1,10 +1,44 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
 import time
 
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
-from django.test import TestCase
+from django.db import connections
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.six import StringIO
+from rest_framework.authtoken.models import Token
 
-from database.models import LaundryShop
+from database.catalog import get_catalog_version
+from database.exports import iter_transactions
+from database.fees import clear_fees, get_fees
+from database.jobs import run_pending_jobs
+from database.models import (Barangay, LaundryShop, Order, Price, Service,
+                             Transaction, UserProfile)
+from database.search import search
+from management import feed, urls, views
+from management.imports import import_catalog
+from LaundryBear.assets import CompressedManifestStorage
+from LaundryBear.caching import FileCache
+from LaundryBear.profiling import collapse_stacks
+from LaundryBear.replicas import PIN_COOKIE, refresh_replica
+from LaundryBear.querybudget import QueryBudgetTestMixin, get_query_budget
+from LaundryBear.templating import (get_project_templates,
+                                    get_templates_setting, warm_up_templates)
 
 # Create your tests here.
 class ContextDataTestCase(TestCase):
@@ -26,7 +60,7 @@ class ContextDataTestCase(TestCase):
                                    contact_number='123', hours_open='24 hours',
                                    days_open='Sun - Sat')
         response = self.client.get(reverse('management:list-shops'),
-                                   {'name': 'laundryshop'})
+                                   {'q': 'laundryshop'})
         expected_shop_list = [u'laundryshop1', u'laundryshop2']
         actual_shop_list = [
             shop.name for shop in response.context['shop_list']]
@@ -44,10 +78,11 @@ class ContextDataTestCase(TestCase):
                                    contact_number='123', hours_open='24 hours',
                                    days_open='Sun - Sat')
         response = self.client.get(reverse('management:list-shops'),
-                                   {'city': 'cebu'})
+                                   {'q': 'cebu'})
         expected_shop_list = [u'laundryshop1', u'laundryshop3']
-        actual_shop_list = [
-            shop.name for shop in response.context['shop_list']]
+        # results are ranked, the shorter address matches best
+        actual_shop_list = sorted(
+            shop.name for shop in response.context['shop_list'])
         self.assertEqual(expected_shop_list, actual_shop_list)
 
     def test_get_shops_by_province(self):
@@ -62,7 +97,7 @@ class ContextDataTestCase(TestCase):
                                    contact_number='123', hours_open='24 hours',
                                    days_open='Sun - Sat')
         response = self.client.get(reverse('management:list-shops'),
-                                   {'province': 'cebu'})
+                                   {'q': 'cebu'})
         expected_shop_list = [u'laundryshop1', u'laundryshop2']
         actual_shop_list = [
             shop.name for shop in response.context['shop_list']]
@@ -81,13 +116,983 @@ class ContextDataTestCase(TestCase):
                                    contact_number='123', hours_open='24 hours',
                                    days_open='Sun - Sat')
         response = self.client.get(reverse('management:list-shops'),
-                                   {'barangay': 'lsbarangay'})
+                                   {'q': 'lsbarangay'})
         expected_shop_list = [u'laundryshop1', u'laundryshop2']
         actual_shop_list = [
             shop.name for shop in response.context['shop_list']]
         self.assertEqual(expected_shop_list, actual_shop_list)
 
 
+class SearchTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+
+    def create_shop(self, name, **address):
+        address.setdefault('province', 'lsprovince')
+        address.setdefault('barangay', 'lsbarangay')
+        return LaundryShop.objects.create(name=name, contact_number='123',
+                                          hours_open='24 hours',
+                                          days_open='Sun - Sat', **address)
+
+    def search(self, view_name, query, context_name):
+        response = self.client.get(reverse(view_name), {'q': query})
+        return [unicode(item) for item in response.context[context_name]]
+
+    def test_name_matches_rank_first(self):
+        self.create_shop('Shop near Lahug', street='Gorordo')
+        self.create_shop('Lahug Laundry', barangay='Lahug')
+        self.create_shop('Far Away', barangay='Talamban')
+        self.assertEqual(self.search('management:list-shops', 'lahug',
+                                     'shop_list'),
+                         [u'Lahug Laundry', u'Shop near Lahug'])
+
+    def test_every_term_must_match(self):
+        self.create_shop('Bubbles', city='Cebu City', barangay='Lahug')
+        self.create_shop('Suds', city='Cebu City', barangay='Mabolo')
+        self.assertEqual(self.search('management:list-shops', 'cebu mabolo',
+                                     'shop_list'), [u'Suds'])
+
+    def test_short_terms(self):
+        self.create_shop('A1 Laundry')
+        self.create_shop('B2 Laundry')
+        self.assertEqual(self.search('management:list-shops', 'a1',
+                                     'shop_list'), [u'A1 Laundry'])
+
+    def test_index_follows_changes(self):
+        shop = self.create_shop('Bubbles')
+        shop.name = 'Suds'
+        shop.save()
+        self.assertEqual(self.search('management:list-shops', 'bubbles',
+                                     'shop_list'), [])
+        self.assertEqual(self.search('management:list-shops', 'suds',
+                                     'shop_list'), [u'Suds'])
+        shop.delete()
+        self.assertEqual(self.search('management:list-shops', 'suds',
+                                     'shop_list'), [])
+
+    def test_search_services(self):
+        Service.objects.create(name='Dry Clean', description='No water')
+        Service.objects.create(name='Water Wash', description='With soap')
+        Service.objects.create(name='Iron', description='Pressing')
+        self.assertEqual(self.search('management:list-service', 'water',
+                                     'service_list'),
+                         [u'Water Wash', u'Dry Clean'])
+
+    def test_search_clients_by_name_and_address(self):
+        user = User.objects.create_user(username='juan', password='runner',
+                                        first_name='Juan',
+                                        last_name='Dela Cruz')
+        UserProfile.objects.create(client=user, contact_number='12345',
+                                   province='Cebu', barangay='Talamban')
+        self.assertEqual(self.search('management:list-client', 'talamban',
+                                     'client_list'), [u'Juan Dela Cruz'])
+        user.first_name = 'Pedro'
+        user.save()
+        self.assertEqual(self.search('management:list-client', 'pedro',
+                                     'client_list'), [u'Pedro Dela Cruz'])
+
+
+class TransactionListQueryTestCase(TestCase):
+    """
+    Transaction lists should cost the same number of queries no matter how
+    many rows are on the page.
+    """
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+        shop = LaundryShop.objects.create(name='laundryshop1',
+                                          province='lsprovince',
+                                          barangay='lsbarangay',
+                                          contact_number='123',
+                                          hours_open='24 hours',
+                                          days_open='Sun - Sat')
+        service = Service.objects.create(name='wash', description='wash')
+        self.price = Price.objects.create(laundry_shop=shop, service=service,
+                                          price=45, duration=3)
+
+    def create_transactions(self, count, status):
+        for i in range(count):
+            user = User.objects.create_user(username='client{0}-{1}'.format(
+                status, Transaction.objects.count()), password='runner')
+            profile = UserProfile.objects.create(client=user,
+                                                 contact_number='12345',
+                                                 province='cebu',
+                                                 barangay='lahug')
+            transaction = Transaction.objects.create(client=profile,
+                                                     status=status)
+            Order.objects.create(price=self.price, transaction=transaction,
+                                 pieces=3)
+            Order.objects.create(price=self.price, transaction=transaction,
+                                 pieces=5)
+
+    def assertPageQueries(self, view_name, status, expected):
+        self.create_transactions(1, status)
+        with self.assertNumQueries(expected):
+            self.client.get(reverse(view_name))
+        self.create_transactions(9, status)
+        with self.assertNumQueries(expected):
+            response = self.client.get(reverse(view_name))
+        self.assertContains(response, 'laundryshop1')
+
+    def test_menu_queries(self):
+        # session, user, transactions, orders
+        self.assertPageQueries('management:menu', 1, 4)
+
+    def test_pending_transactions_queries(self):
+        # session, user, transactions, orders
+        self.assertPageQueries('management:pending-transactions', 1, 4)
+
+    def test_ongoing_transactions_queries(self):
+        self.assertPageQueries('management:ongoing-transactions', 2, 4)
+
+    def test_history_transactions_queries(self):
+        self.assertPageQueries('management:history-transactions', 3, 4)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+        self.shops = [LaundryShop.objects.create(name=name,
+                                                 province='lsprovince',
+                                                 barangay='lsbarangay',
+                                                 contact_number='123',
+                                                 hours_open='24 hours',
+                                                 days_open='Sun - Sat')
+                      for name in ('Bubbles', 'Suds')]
+        service = Service.objects.create(name='wash', description='wash')
+        self.prices = [Price.objects.create(laundry_shop=shop,
+                                            service=service, price=45,
+                                            duration=3)
+                       for shop in self.shops]
+        user = User.objects.create_user(username='client', password='runner')
+        self.profile = UserProfile.objects.create(client=user,
+                                                  contact_number='12345',
+                                                  province='cebu',
+                                                  barangay='lahug')
+        # 25 done transactions, three at a time share a request date
+        now = timezone.now()
+        for i in range(25):
+            transaction = Transaction.objects.create(client=self.profile,
+                                                     status=3)
+            Transaction.objects.filter(pk=transaction.pk).update(
+                request_date=now - timedelta(hours=i // 3))
+            Order.objects.create(price=self.prices[i % 2],
+                                 transaction=transaction, pieces=3)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('management:history-transactions'),
+                                   params)
+        page = response.context['page_obj']
+        return [t.pk for t in response.context['history_transaction_list']], page
+
+    def test_pages_follow_history_order(self):
+        expected = list(Transaction.objects.order_by('-request_date', '-pk')
+                        .values_list('pk', flat=True))
+        seen = []
+        pks, page = self.get_page()
+        seen.extend(pks)
+        while page.has_next():
+            pks, page = self.get_page(after=page.next_cursor)
+            seen.extend(pks)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pks), 5)
+
+        # and back again
+        pks, page = self.get_page(before=page.previous_cursor)
+        self.assertEqual(pks, expected[10:20])
+        pks, page = self.get_page(before=page.previous_cursor)
+        self.assertEqual(pks, expected[:10])
+        self.assertFalse(page.has_previous())
+
+    def test_deep_pages_skip_count(self):
+        pks, page = self.get_page()
+        pks, page = self.get_page(after=page.next_cursor)
+        # session, user, transactions, orders
+        with self.assertNumQueries(4):
+            self.get_page(after=page.next_cursor)
+
+    def test_count_is_cached(self):
+        pks, page = self.get_page()
+        self.assertEqual(page.paginator.count, 25)
+        Transaction.objects.create(client=self.profile, status=3)
+        pks, page = self.get_page()
+        with self.assertNumQueries(0):
+            self.assertEqual(page.paginator.count, 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('management:history-transactions'),
+                                   {'after': 'not a cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_filter_by_shop(self):
+        pks, page = self.get_page(**{'laundry shop': 'suds'})
+        self.assertEqual(len(pks), 10)
+        self.assertTrue(all(Transaction.objects.get(pk=pk).laundry_shop ==
+                            self.shops[1] for pk in pks))
+        pks, page = self.get_page(after=page.next_cursor,
+                                  **{'laundry shop': 'suds'})
+        self.assertEqual(len(pks), 2)
+        self.assertFalse(page.has_next())
+
+    def test_client_list_pages(self):
+        for i in range(12):
+            user = User.objects.create_user(username='user{0}'.format(i),
+                                            first_name='Juan',
+                                            last_name='Cruz')
+            UserProfile.objects.create(client=user, contact_number='12345',
+                                       province='cebu', barangay='lahug')
+        url = reverse('management:list-client')
+        response = self.client.get(url)
+        first = list(response.context['client_list'])
+        page = response.context['page_obj']
+        response = self.client.get(url, {'after': page.next_cursor})
+        second = list(response.context['client_list'])
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 4)
+        self.assertEqual(len(set(first) | set(second)), 14)
+
+    def test_client_list_follows_renames(self):
+        user = User.objects.create_user(username='ana', first_name='Ana',
+                                        last_name='Reyes')
+        profile = UserProfile.objects.create(client=user,
+                                             contact_number='12345',
+                                             province='cebu',
+                                             barangay='lahug')
+        self.profile.client.first_name = 'Berto'
+        self.profile.client.save()
+
+        def get_order():
+            response = self.client.get(reverse('management:list-client'))
+            return [obj for obj in response.context['client_list']
+                    if obj in (profile, self.profile)]
+        self.assertEqual(get_order(), [profile, self.profile])
+        user.first_name = 'Carla'
+        user.save()
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).sort_name,
+                         'Carla Reyes')
+        self.assertEqual(get_order(), [self.profile, profile])
+
+
+class ExportTransactionsTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+        service = Service.objects.create(name='wash', description='wash')
+        self.prices = []
+        for name in ('Bubbles', 'Suds'):
+            shop = LaundryShop.objects.create(name=name,
+                                              province='lsprovince',
+                                              barangay='lsbarangay',
+                                              contact_number='123',
+                                              hours_open='24 hours',
+                                              days_open='Sun - Sat')
+            self.prices.append(Price.objects.create(laundry_shop=shop,
+                                                    service=service,
+                                                    price=45, duration=3))
+        user = User.objects.create_user(username='juan', first_name='Juan',
+                                        last_name='Cruz')
+        self.profile = UserProfile.objects.create(client=user,
+                                                  contact_number='12345',
+                                                  province='cebu',
+                                                  barangay='lahug')
+        self.create_transaction(3, 0, date(2016, 7, 1), [3, 5])
+        self.create_transaction(4, 1, date(2016, 7, 15), [2])
+        self.create_transaction(3, 1, date(2016, 8, 1), [7])
+
+    def create_transaction(self, status, shop, day, pieces_list):
+        transaction = Transaction.objects.create(client=self.profile,
+                                                 status=status,
+                                                 province='cebu',
+                                                 barangay='lahug')
+        request_date = timezone.make_aware(
+            timezone.datetime.combine(day, timezone.datetime.min.time()) +
+            timedelta(hours=12), timezone.get_current_timezone())
+        Transaction.objects.filter(pk=transaction.pk).update(
+            request_date=request_date, total=45 * sum(pieces_list) / 7)
+        for pieces in pieces_list:
+            Order.objects.create(price=self.prices[shop],
+                                 transaction=transaction, pieces=pieces)
+
+    def export(self, **params):
+        response = self.client.get(reverse('management:export-transactions'),
+                                   params)
+        self.assertEqual(response.status_code, 200)
+        return ''.join(response.streaming_content)
+
+    def test_csv_has_one_row_per_order(self):
+        rows = list(csv.DictReader(StringIO(self.export())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['client'], 'Juan Cruz')
+        self.assertEqual(rows[0]['shop'], 'Bubbles')
+        self.assertEqual(rows[0]['status'], 'Done')
+        self.assertEqual([row['pieces'] for row in rows], ['3', '5', '2', '7'])
+
+    def test_filters(self):
+        rows = list(csv.DictReader(StringIO(self.export(
+            start='2016-07-01', end='2016-07-15'))))
+        self.assertEqual([row['pieces'] for row in rows], ['3', '5', '2'])
+        rows = list(csv.DictReader(StringIO(self.export(status=3))))
+        self.assertEqual([row['pieces'] for row in rows], ['3', '5', '7'])
+        rows = list(csv.DictReader(StringIO(self.export(
+            shop=self.prices[1].laundry_shop.pk))))
+        self.assertEqual([row['pieces'] for row in rows], ['2', '7'])
+
+    def test_ndjson(self):
+        lines = self.export(format='ndjson').splitlines()
+        self.assertEqual(len(lines), 3)
+        record = json.loads(lines[0])
+        self.assertEqual(record['client'], 'Juan Cruz')
+        self.assertEqual([order['pieces'] for order in record['orders']],
+                         [3, 5])
+
+    def test_invalid_filters(self):
+        response = self.client.get(reverse('management:export-transactions'),
+                                   {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunks(self):
+        transactions = Transaction.objects.all()
+        # one query for each chunk of transactions and one for its orders
+        with self.assertNumQueries(4):
+            self.assertEqual(len(list(iter_transactions(transactions,
+                                                        chunk_size=2))), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_transactions', format='ndjson', status=4,
+                     stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+
+class ImportCatalogTestCase(TestCase):
+    CSV = (
+        'name,province,city,barangay,contact_number,hours_open,days_open,'
+        'service,description,price,duration\n'
+        'Bubbles,Cebu,Cebu City,Lahug,09171234567,24 hours,Sun - Sat,'
+        'Wash,Wash and fold,45,3\n'
+        'Bubbles,Cebu,Cebu City,Lahug,09171234567,24 hours,Sun - Sat,'
+        'Dry clean,Dry cleaning,120,5\n'
+        'Suds,Cebu,Cebu City,Lahug,123,24 hours,Sun - Sat,wash,,40,2\n'
+        'Foam,Cebu,,Mabolo,09181234567,8am - 5pm,Mon - Fri,,,,\n'
+    )
+
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+        Service.objects.create(name='Wash', description='Wash and fold')
+
+    def test_csv(self):
+        version = get_catalog_version()
+        result = import_catalog(StringIO(self.CSV), 'csv', batch_size=1)
+        self.assertEqual((result.shop_count, result.price_count,
+                          result.service_count), (2, 2, 1))
+        # the shop with an invalid contact number is left out
+        self.assertEqual([(number, field) for number, field, message
+                          in result.errors], [(4, 'contact_number')])
+        shop = LaundryShop.objects.get(name='Bubbles')
+        self.assertEqual(shop.location, 'Lahug, Cebu City, Cebu')
+        self.assertEqual(shop.area.city.province.name, 'Cebu')
+        self.assertEqual(sorted(shop.price_set.values_list(
+            'service__name', 'price')), [('Dry clean', 120), ('Wash', 45)])
+        self.assertFalse(LaundryShop.objects.get(name='Foam').price_set.exists())
+        self.assertEqual(list(search(LaundryShop.objects.all(), 'bubbles')),
+                         [shop])
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_json(self):
+        shops = [{'name': 'Bubbles', 'province': 'Cebu', 'barangay': 'Lahug',
+                  'contact_number': '09171234567', 'hours_open': '24 hours',
+                  'days_open': 'Sun - Sat',
+                  'prices': [{'service': 'wash', 'price': 45, 'duration': 3},
+                             {'service': 'Iron', 'price': 'free',
+                              'duration': 1}]}]
+        result = import_catalog(StringIO(json.dumps(shops)), 'json')
+        self.assertEqual(result.shop_count, 0)
+        self.assertEqual([(number, field) for number, field, message
+                          in result.errors], [(1, 'description'), (1, 'price')])
+        with self.assertRaises(ValueError):
+            import_catalog(StringIO('{"name": "Bubbles"}'), 'json')
+
+    def test_queries(self):
+        header, row = self.CSV.splitlines(True)[:2]
+        lines = [header] + [row.replace('Bubbles', 'Bubbles {0}'.format(i))
+                            for i in range(20)]
+        Barangay.objects.resolve('Cebu', 'Cebu City', 'Lahug')
+        # the services and the area, then for each batch a savepoint, the
+        # shops one by one, the prices and the search documents
+        with self.assertNumQueries(2 + 2 * (4 + 10)):
+            result = import_catalog(lines, 'csv', batch_size=10)
+        self.assertEqual(result.shop_count, 20)
+        self.assertEqual(Price.objects.count(), 20)
+
+    def test_upload(self):
+        response = self.client.post(reverse('management:import-shops'), {
+            'file': SimpleUploadedFile('shops.csv', self.CSV)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].shop_count, 2)
+        response = self.client.post(reverse('management:import-shops'), {
+            'file': SimpleUploadedFile('shops.txt', self.CSV)})
+        self.assertFalse(response.context['form'].is_valid())
+
+    def test_command(self):
+        path = os.path.join(tempfile.mkdtemp(), 'shops.csv')
+        with open(path, 'w') as output:
+            output.write(self.CSV)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=err)
+        self.assertIn('Added 2 shop(s)', out.getvalue())
+        self.assertIn('Row 4: contact_number', err.getvalue())
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.services = [Service.objects.create(name='service{0}'.format(i),
+                                                description='service')
+                         for i in range(3)]
+        self.shops = []
+        self.transactions = []
+        for i in range(3):
+            user = User.objects.create_user(username='client{0}'.format(i),
+                                            first_name='Juan',
+                                            last_name=str(i))
+            profile = UserProfile.objects.create(client=user,
+                                                 contact_number='12345',
+                                                 province='cebu',
+                                                 barangay='lahug')
+            shop = LaundryShop.objects.create(name='laundry{0}'.format(i),
+                                              province='cebu',
+                                              barangay='lahug',
+                                              contact_number='12345',
+                                              hours_open='24 hours',
+                                              days_open='mon - sat')
+            for status in (1, 2, 3):
+                transaction = Transaction.objects.create(
+                    client=profile, status=status, province='cebu',
+                    barangay='lahug')
+                for service in self.services:
+                    price = Price.objects.get_or_create(
+                        laundry_shop=shop, service=service,
+                        defaults={'price': 45, 'duration': 3})[0]
+                    Order.objects.create(price=price,
+                                         transaction=transaction, pieces=3)
+                self.transactions.append(transaction)
+            self.shops.append(shop)
+        self.client.login(username='test', password='runner')
+
+    def request(self, method, name, args=(), data=None, **extra):
+        # every page is requested with cold caches
+        cache.clear()
+        clear_fees()
+        return self.request_within_budget(method, reverse(name, args=args),
+                                          data, **extra)
+
+    def test_pages(self):
+        shop = self.shops[0].pk
+        self.request('get', 'management:menu')
+        self.request('get', 'management:add-shop')
+        self.request('get', 'management:edit-shop', [shop])
+        self.request('get', 'management:import-shops')
+        self.request('get', 'management:list-shops')
+        self.request('get', 'management:list-shops', data={'q': 'laundry'})
+        self.request('get', 'management:list-client')
+        self.request('get', 'management:list-client', data={'q': 'juan'})
+        self.request('get', 'management:settings')
+        self.request('get', 'management:list-service')
+        self.request('get', 'management:create-service')
+        self.request('get', 'management:edit-service',
+                     [self.services[0].pk])
+        self.request('get', 'management:add-service')
+        self.request('get', 'management:pending-transactions')
+        self.request('get', 'management:ongoing-transactions')
+        self.request('get', 'management:history-transactions')
+        self.request('get', 'management:history-transactions',
+                     data={'q': 'juan', 'shop': 'laundry'})
+        self.request('get', 'management:export-transactions')
+        response = self.request('get', 'management:update-transaction',
+                                [self.transactions[0].pk])
+        self.assertContains(response, '+ 10%<br>Service Charge')
+
+    def test_actions(self):
+        self.request('post', 'management:update-transaction',
+                     [self.transactions[0].pk],
+                     data={'delivery_date': '2016-07-10', 'approve': 1})
+        self.request('post', 'management:mark-transaction-done',
+                     [self.transactions[1].pk], data={'status': 3})
+        self.request('post', 'management:settings', data={
+            'username': 'test', 'delivery_fee': '60.00',
+            'service_charge': '0.20'})
+        self.request('post', 'management:add-service',
+                     data={'name': 'iron', 'description': 'iron'})
+        self.request('post', 'management:create-service',
+                     data={'name': 'fold', 'description': 'fold'})
+        self.request('post', 'management:edit-service',
+                     [self.services[0].pk],
+                     data={'name': 'wash', 'description': 'wash'})
+        self.request('post', 'management:delete-service',
+                     [self.services[0].pk])
+        self.request('post', 'management:delete-shop', [self.shops[0].pk])
+        self.request('get', 'management:logout-admin')
+        self.request('get', 'management:login-admin')
+        self.request('post', 'management:login-admin',
+                     data={'username': 'test', 'password': 'runner'})
+
+    def test_deleting_service_updates_ratings(self):
+        shop = self.shops[1]
+        transaction = Transaction.objects.create(
+            client=self.transactions[0].client, status=3, province='cebu',
+            barangay='lahug')
+        Order.objects.create(price=shop.price_set.get(
+            service=self.services[0]), transaction=transaction, pieces=3)
+        transaction.paws = 4
+        transaction.save()
+        self.request('post', 'management:delete-service',
+                     [self.services[0].pk])
+        # the shops are rated again by a job
+        self.assertEqual(run_pending_jobs(), 1)
+        shop.refresh_from_db()
+        self.assertEqual(shop.raters, 0)
+        self.assertEqual(shop.paws_total, 0)
+
+    def test_every_view_has_a_budget(self):
+        for pattern in urls.urlpatterns:
+            self.assertIsNotNone(get_query_budget(pattern.callback),
+                                 pattern.name)
+
+
+class ProfilerTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        User.objects.create_user(username='client', password='runner')
+        LaundryShop.objects.create(name='laundry', province='cebu',
+                                   barangay='lahug', contact_number='12345',
+                                   hours_open='24 hours',
+                                   days_open='mon - sat')
+        self.directory = tempfile.mkdtemp()
+        self.client.login(username='test', password='runner')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get(self, data=None, **extra):
+        with self.settings(PROFILE_DIR=self.directory):
+            return self.client.get(reverse('management:list-shops'), data,
+                                   **extra)
+
+    def test_profile_parameter(self):
+        response = self.get({'profile': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'laundry')
+        name = response['X-Profile']
+        self.assertIn('management-list-shops', name)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [name + '.collapsed', name + '.json',
+                          name + '.prof'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+
+        with open(os.path.join(self.directory, name + '.json')) as summary:
+            summary = json.load(summary)
+        self.assertEqual(summary['view'], 'management:list-shops')
+        self.assertGreater(summary['queries'], 0)
+        self.assertGreater(summary['seconds']['template'], 0)
+        self.assertLessEqual(summary['seconds']['db'] +
+                             summary['seconds']['template'],
+                             summary['seconds']['total'])
+
+        with open(os.path.join(self.directory, name + '.collapsed')) as lines:
+            lines = lines.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, microseconds = line.rsplit(' ', 1)
+            self.assertTrue(microseconds.isdigit())
+        self.assertTrue(any('LaundryBear/mixins.py' in line
+                            for line in lines))
+
+    def test_view_errors_are_raised_after_saving(self):
+        def fail(view):
+            raise ValueError('broken view')
+        get_queryset = views.LaundryListView.get_queryset
+        views.LaundryListView.get_queryset = fail
+        try:
+            with self.assertRaises(ValueError):
+                self.get({'profile': 1})
+        finally:
+            views.LaundryListView.get_queryset = get_queryset
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+    def test_profile_header(self):
+        response = self.get(HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile', response)
+
+    def test_not_requested(self):
+        response = self.get()
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_staff_only(self):
+        self.client.login(username='client', password='runner')
+        response = self.get({'profile': 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_collapsed_stacks_split_time_between_callers(self):
+        class Stats(object):
+            # main calls work twice and helper once; helper calls work
+            # once, taking a third of the time of work
+            stats = {
+                ('a.py', 1, 'main'): (1, 1, 1.0, 7.0, {}),
+                ('a.py', 2, 'helper'): (1, 1, 1.0, 2.0,
+                                        {('a.py', 1, 'main'):
+                                         (1, 1, 1.0, 2.0)}),
+                ('a.py', 3, 'work'): (3, 3, 3.0, 3.0,
+                                      {('a.py', 1, 'main'): (2, 2, 2.0, 2.0),
+                                       ('a.py', 2, 'helper'):
+                                       (1, 1, 1.0, 1.0)}),
+            }
+            all_callees = {
+                ('a.py', 1, 'main'): {('a.py', 2, 'helper'): (1, 1, 1.0, 2.0),
+                                      ('a.py', 3, 'work'): (2, 2, 2.0, 2.0)},
+                ('a.py', 2, 'helper'): {('a.py', 3, 'work'):
+                                        (1, 1, 1.0, 1.0)},
+            }
+
+            def calc_callees(self):
+                pass
+
+        stacks = dict(collapse_stacks(Stats()))
+        self.assertEqual(stacks, {
+            'a.py:1(main)': 1.0,
+            'a.py:1(main);a.py:2(helper)': 1.0,
+            'a.py:1(main);a.py:2(helper);a.py:3(work)': 1.0,
+            'a.py:1(main);a.py:3(work)': 2.0,
+        })
+
+
+class ReplicaTestCase(TransactionTestCase):
+    def setUp(self):
+        # the replica is a mirror of the test database until given its own
+        # file
+        self.replica = connections['replica'].settings_dict
+        self.mirror_name = self.replica['NAME']
+        self.directory = tempfile.mkdtemp()
+        self.replica['NAME'] = os.path.join(self.directory, 'replica.sqlite3')
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.create_shop('copied')
+        refresh_replica()
+        self.create_shop('not copied')
+        self.client.login(username='test', password='runner')
+
+    def tearDown(self):
+        connections['replica'].close()
+        self.replica['NAME'] = self.mirror_name
+        shutil.rmtree(self.directory)
+
+    def create_shop(self, name):
+        LaundryShop.objects.create(name=name, province='cebu',
+                                   barangay='lahug', contact_number='12345',
+                                   hours_open='24 hours',
+                                   days_open='mon - sat')
+
+    def get_shops(self):
+        response = self.client.get(reverse('management:list-shops'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(shop.name for shop in response.context['shop_list'])
+
+    def test_list_reads_replica(self):
+        self.assertEqual(self.get_shops(), ['copied'])
+
+    def test_replica_queries_count_against_budget(self):
+        with self.settings(QUERY_BUDGET_ENABLED=True):
+            response = self.client.get(reverse('management:list-shops'))
+        self.assertTrue([query for query in response.query_report.queries
+                         if 'FROM "database_laundryshop"' in query])
+
+    def test_other_views_read_primary(self):
+        shop = LaundryShop.objects.get(name='not copied')
+        response = self.client.get(reverse('management:edit-shop',
+                                           args=[shop.pk]))
+        self.assertContains(response, 'not copied')
+
+    def test_read_your_writes(self):
+        response = self.client.post(reverse('management:add-service'),
+                                    {'name': 'iron', 'description': 'iron'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.get_shops(), ['copied', 'not copied'])
+
+        del self.client.cookies[PIN_COOKIE]
+        self.assertEqual(self.get_shops(), ['copied'])
+
+    def test_pending_transactions_read_primary(self):
+        # the page and its feed would both miss one the replica lacks
+        client = User.objects.create_user(username='client')
+        profile = UserProfile.objects.create(
+            client=client, contact_number='12345', province='cebu',
+            barangay='lahug')
+        transaction = Transaction.objects.create(client=profile, status=1)
+        response = self.client.get(reverse('management:pending-transactions'))
+        self.assertEqual(list(response.context['pending_transaction_list']),
+                         [transaction])
+
+    def test_stale_rows_are_cached_apart(self):
+        # a row read from the replica is keyed by the time of that copy
+        cache.clear()
+        LaundryShop.objects.filter(name='not copied').delete()
+        shop = LaundryShop.objects.get(name='copied')
+        shop.name = 'renamed'
+        shop.save()
+        response = self.client.get(reverse('management:list-shops'))
+        self.assertContains(response, 'copied')
+        refresh_replica()
+        response = self.client.get(reverse('management:list-shops'))
+        self.assertContains(response, 'renamed')
+        self.assertNotContains(response, 'copied')
+
+    def test_catalog_api_reads_primary(self):
+        # what it reads is cached until the catalog changes again
+        cache.clear()
+        token = Token.objects.get(user__username='test')
+        response = self.client.get(
+            reverse('laundryshop-list'),
+            HTTP_AUTHORIZATION='Token {0}'.format(token.key))
+        self.assertEqual(sorted(shop['name']
+                                for shop in response.data['results']),
+                         ['copied', 'not copied'])
+
+    def test_refresh(self):
+        refresh_replica()
+        self.assertEqual(self.get_shops(), ['copied', 'not copied'])
+
+
+class FragmentCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.user = User.objects.create_user(username='client',
+                                             first_name='Juan',
+                                             last_name='Cruz')
+        UserProfile.objects.create(client=self.user, contact_number='12345',
+                                   province='cebu', barangay='lahug')
+        self.client.login(username='test', password='runner')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_client_row_follows_user(self):
+        url = reverse('management:list-client')
+        self.assertContains(self.client.get(url), 'Juan Cruz')
+        self.user.first_name = 'Pedro'
+        self.user.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Pedro Cruz')
+        self.assertNotContains(response, 'Juan Cruz')
+
+    def test_client_row_markup_is_balanced(self):
+        row = render_to_string('management/client/clients_row.html',
+                               {'profile': self.user.userprofile})
+        for tag in ('div', 'td', 'tr'):
+            self.assertEqual(row.count('<{0}'.format(tag)),
+                             row.count('</{0}>'.format(tag)))
+
+
+class FileCacheTestCase(TestCase):
+    def test_tests_have_a_cache_of_their_own(self):
+        self.assertNotEqual(settings.CACHES['default']['LOCATION'],
+                            os.path.join(settings.BASE_DIR, 'cache'))
+
+    def test_size_is_checked_every_few_writes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = FileCache(directory, {'OPTIONS': {
+            'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 1, 'CULL_EVERY': 5}})
+        for i in range(4):
+            files.set(str(i), i)
+        self.assertEqual(len(files._list_cache_files()), 4)
+        # the fifth write counts the entries and culls them all
+        files.set('4', 4)
+        self.assertEqual(len(files._list_cache_files()), 1)
+
+
+class TemplateCacheTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+
+    def test_warm_up_compiles_every_template(self):
+        names = get_project_templates()
+        self.assertIn('management/base.html', names)
+        self.assertIn('client/base.html', names)
+        with override_settings(TEMPLATES=get_templates_setting(True)):
+            self.assertEqual(warm_up_templates(), len(names))
+            loader = engines['django'].engine.template_loaders[0]
+            self.assertIn('management/base.html', loader.template_cache)
+            response = self.client.get(reverse('management:list-shops'))
+            self.assertEqual(response.status_code, 200)
+
+    def test_no_warm_up_without_cached_loader(self):
+        with override_settings(TEMPLATES=get_templates_setting(False)):
+            self.assertEqual(warm_up_templates(), 0)
+
+
+class StaticFilesTestCase(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.settings = override_settings(STATIC_ROOT=self.root)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.root)
+
+    def collect(self, files):
+        source = FileSystemStorage(location=self.source)
+        storage = CompressedManifestStorage(location=self.root)
+        for name, content in files.items():
+            source.save(name, StringIO(content))
+            storage.save(name, StringIO(content))
+        paths = dict((name, (source, name)) for name in files)
+        list(storage.post_process(paths))
+        return storage
+
+    def test_collected_files_are_hashed_and_compressed(self):
+        css = 'body { background: url("bg.png"); }\n' * 50
+        storage = self.collect({'app.css': css, 'bg.png': 'PNG'})
+        hashed = storage.stored_name('app.css')
+        self.assertRegexpMatches(hashed, r'^app\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(self.root, hashed + '.gz')) as copy:
+            content = copy.read()
+        self.assertIn(storage.stored_name('bg.png'), content)
+        # images are compressed already
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'bg.png.gz')))
+
+    def test_missing_references_are_left_alone(self):
+        storage = self.collect({'app.css': '@import "compass/css3";\n'})
+        with open(storage.path(storage.stored_name('app.css'))) as css:
+            self.assertEqual(css.read(), '@import "compass/css3";\n')
+
+    def test_serves_compressed_copy_for_a_year(self):
+        storage = self.collect({'app.js': 'var x = 1;\n' * 100})
+        url = '/static/' + storage.stored_name('app.js')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        with gzip.GzipFile(fileobj=StringIO(
+                ''.join(response.streaming_content))) as content:
+            self.assertEqual(content.read(), 'var x = 1;\n' * 100)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(''.join(response.streaming_content),
+                         'var x = 1;\n' * 100)
+
+    def test_unhashed_names_are_cached_briefly(self):
+        self.collect({'app.js': 'var x = 1;\n'})
+        response = self.client.get('/static/app.js')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.client.get('/static/../app.js').status_code,
+                         404)
+
+
+class TransactionFeedTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+        client = User.objects.create_user(username='client',
+                                          first_name='Juan',
+                                          last_name='Cruz')
+        self.profile = UserProfile.objects.create(
+            client=client, contact_number='12345', province='cebu',
+            barangay='lahug')
+        self.settle_seconds = feed.SETTLE_SECONDS
+        self.stream_duration = feed.STREAM_DURATION
+        feed.SETTLE_SECONDS = 0
+        # one look for changes per request
+        feed.STREAM_DURATION = 0
+
+    def tearDown(self):
+        feed.SETTLE_SECONDS = self.settle_seconds
+        feed.STREAM_DURATION = self.stream_duration
+
+    def read_feed(self, cursor, **extra):
+        response = self.client.get(reverse('management:transaction-feed'),
+                                   {'cursor': cursor}, **extra)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = ''.join(response.streaming_content).split('\n\n')
+        return [dict(line.split(': ', 1) for line in event.split('\n'))
+                for event in events if event.startswith('id:')]
+
+    def test_cursor_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(feed.decode_cursor(feed.encode_cursor(now, 7)),
+                         (now, 7))
+        self.assertIsNone(feed.decode_cursor('not a cursor'))
+
+    def test_sends_saved_transactions_once(self):
+        cursor = feed.get_start_cursor()
+        transaction = Transaction.objects.create(
+            client=self.profile, province='cebu', barangay='lahug')
+        events = self.read_feed(cursor)
+        self.assertEqual(len(events), 1)
+        data = json.loads(events[0]['data'])
+        self.assertEqual(data['pk'], transaction.pk)
+        self.assertEqual(data['status'], 1)
+        self.assertIn('data-transaction="{0}"'.format(transaction.pk),
+                      data['html'])
+        self.assertIn('Juan Cruz', data['html'])
+
+        # a reconnecting browser resumes after the last event
+        self.assertEqual(self.read_feed(
+            cursor, HTTP_LAST_EVENT_ID=events[0]['id']), [])
+        transaction.status = 2
+        transaction.save()
+        events = self.read_feed(cursor, HTTP_LAST_EVENT_ID=events[0]['id'])
+        self.assertEqual(json.loads(events[0]['data'])['status'], 2)
+
+    def test_pages_follow_the_feed(self):
+        for name in ('management:menu', 'management:pending-transactions'):
+            response = self.client.get(reverse(name))
+            self.assertContains(response, '?cursor={0}'.format(
+                response.context['feed_cursor']))
+
+
+class AdminSettingsTestCase(TestCase):
+    def setUp(self):
+        clear_fees()
+        User.objects.create_superuser(username='test', password='runner',
+                                      email='user@mail.com')
+        self.client.login(username='test', password='runner')
+
+    def tearDown(self):
+        clear_fees()
+
+    def test_saving_fees_updates_cached_fees(self):
+        get_fees()
+        self.client.post(reverse('management:settings'),
+                         {'delivery_fee': '60.00', 'service_charge': '0.20'})
+        self.assertEqual(get_fees().delivery_fee, 60)
+        self.assertEqual(str(get_fees().service_charge), '0.20')
+
+
 class LoginTestCase(TestCase):
     def setUp(self):
         User.objects.create_superuser(username='test', password='runner',
@@ -16,6 +16,8 @@ urlpatterns = [
     url(r'^shops/add$', views.LaundryCreateView.as_view(), name='add-shop'),
     url(r'^shops/edit/(?P<pk>\d+)$', views.LaundryUpdateView.as_view(),
         name='edit-shop'),
+    url(r'^shops/import$', views.ImportCatalogView.as_view(),
+        name='import-shops'),
     url(r'^shops/list$', views.LaundryListView.as_view(), name='list-shops'),
     url(r'^shops/delete/(?P<pk>\d+)$', views.LaundryDeleteView.as_view(),
         name='delete-shop'),
@@ -35,6 +37,8 @@ urlpatterns = [
     url(r'^transactions/pending$', views.PendingRequestedTransactionsView.as_view(), name='pending-transactions'),
     url(r'^transactions/ongoing$', views.OngoingTransactionsView.as_view(), name='ongoing-transactions'),
     url(r'^transactions/history$', views.HistoryTransactionsView.as_view(), name='history-transactions'),
+    url(r'^transactions/feed$', views.TransactionFeedView.as_view(), name='transaction-feed'),
+    url(r'^transactions/export$', views.ExportTransactionsView.as_view(), name='export-transactions'),
     url(r'^transactions/update/(?P<pk>\d+)$', views.UpdateTransactionDeliveryDateView.as_view(), name='update-transaction'),
     url(r'^transactions/ongoing/(?P<pk>\d+)/done$', views.MarkTransactionDoneView.as_view(), name='mark-transaction-done'),
 
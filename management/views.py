@@ -1,22 +1,29 @@
 import json
 
+from database.exports import (EXPORT_FORMATS, filter_transactions,
+                              iter_transactions)
+from database.fees import get_fees
+from database.fragments import batch_touches
+from database.jobs import enqueue
 from database.models import LaundryShop, Price, Service, UserProfile, Transaction, Order, Fees
+from database.ratings import recalculate_ratings, suspend_rating_updates
 
 from datetime import timedelta
 
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
 from django.db.models import Q
-from django.forms.models import inlineformset_factory
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.views.generic import (CreateView, DeleteView, DetailView, FormView, ListView,
-                                  RedirectView, TemplateView, UpdateView)
+                                  RedirectView, TemplateView, UpdateView, View)
 
 from management import forms
-from management.mixins import AdminLoginRequiredMixin
+from management.feed import decode_cursor, get_start_cursor, stream_changes
+from management.imports import import_catalog
+from management.mixins import AdminLoginRequiredMixin, TransactionFeedMixin
 
+from LaundryBear.mixins import KeysetPaginationMixin, SearchMixin
 from LaundryBear.views import LoginView, LogoutView
 from django.contrib.auth.forms import PasswordChangeForm
 
@@ -25,14 +32,17 @@ from django.contrib.auth.forms import PasswordChangeForm
 #You can still add more methods if needed.
 #Check ccbv.co.uk for more information
 
-class LaundryMenuView(AdminLoginRequiredMixin, ListView):
+class LaundryMenuView(AdminLoginRequiredMixin, TransactionFeedMixin,
+                      ListView):
+    query_budget = 4
     model = Transaction
     context_object_name = 'pending_transaction_list'
     template_name = 'management/shop/laundrybearmenu.html'
 
     def get_queryset(self):
         queryset = super(LaundryMenuView, self).get_queryset()
-        queryset = queryset.filter(status=1).order_by('request_date')[:3]
+        queryset = queryset.filter(status=1).order_by('request_date') \
+            .for_listing()[:3]
 
         return queryset
 
@@ -42,6 +52,8 @@ class LaundryUpdateView(AdminLoginRequiredMixin, UpdateView):
     View for updating a laundry shop. Handles saving related services and
     prices.
     """
+    # saving the price formset takes a few queries per price
+    query_budget = {'get': 7}
     template_name = 'management/shop/editlaundryshop.html'
     model = LaundryShop
     form_class = forms.LaundryShopForm
@@ -53,9 +65,7 @@ class LaundryUpdateView(AdminLoginRequiredMixin, UpdateView):
         """ Save related prices and selected services if form is valid """
         response = super(LaundryUpdateView, self).form_valid(form)
 
-        PriceInlineFormSet = inlineformset_factory(
-            LaundryShop, Price, fields=('service', 'price', 'duration'), extra=1)
-        price_formset = PriceInlineFormSet(
+        price_formset = forms.PriceFormSet(
             data=self.request.POST, instance=self.object)
         if price_formset.is_valid():
             price_formset.save()
@@ -67,9 +77,7 @@ class LaundryUpdateView(AdminLoginRequiredMixin, UpdateView):
         """ Place prices formset into context """
         context = super(LaundryUpdateView, self).get_context_data(**kwargs)
         context['service_list'] = Service.objects.all().order_by('pk')
-        price_formset = inlineformset_factory(
-            LaundryShop, Price, fields=('service', 'price', 'duration'), extra=1)
-        context['price_formset'] = price_formset(instance=self.object)
+        context['price_formset'] = forms.PriceFormSet(instance=self.object)
         return context
 
 class LaundryCreateView(AdminLoginRequiredMixin, CreateView):
@@ -77,6 +85,8 @@ class LaundryCreateView(AdminLoginRequiredMixin, CreateView):
     View to create a laundry shop. Takes user input and creates and saves a
     laundry shop into the database.
     """
+    # saving the price formset takes a few queries per price
+    query_budget = {'get': 5}
     template_name = 'management/shop/addlaundryshop.html'
     model = LaundryShop
     form_class = forms.LaundryShopForm
@@ -92,9 +102,7 @@ class LaundryCreateView(AdminLoginRequiredMixin, CreateView):
         Save the laundry shop when form is valid, along with related objects.
         """
         response = super(LaundryCreateView, self).form_valid(form)
-        PriceInlineFormSet = inlineformset_factory(
-            LaundryShop, Price, fields=('service', 'price', 'duration'), extra=1)
-        price_formset = PriceInlineFormSet(
+        price_formset = forms.PriceFormSet(
             data=self.request.POST, instance=self.object)
         if price_formset.is_valid():
             price_formset.save()
@@ -105,74 +113,62 @@ class LaundryCreateView(AdminLoginRequiredMixin, CreateView):
     def get_context_data(self,**kwargs):
         context = super(LaundryCreateView, self).get_context_data(**kwargs)
         context['service_list'] = Service.objects.all().order_by('pk')
-        price_formset = inlineformset_factory(
-            LaundryShop, Price, fields=('service', 'price', 'duration'), extra=1)
-        context['price_formset'] = price_formset()
+        context['price_formset'] = forms.PriceFormSet()
         return context
 
 
+class ImportCatalogView(AdminLoginRequiredMixin, FormView):
+    """
+    A view to add many laundry shops with their services and prices at once
+    from an uploaded CSV or JSON file. Lists the rows that were left out.
+    """
+    # an import writes in batches, so its queries grow with the file
+    query_budget = {'get': 2}
+    template_name = 'management/shop/importcatalog.html'
+    form_class = forms.CatalogImportForm
+
+    def form_valid(self, form):
+        try:
+            result = import_catalog(form.cleaned_data['file'],
+                                    form.cleaned_data['format'])
+        except ValueError as e:
+            form.add_error('file', 'The file could not be read: {0}'.format(e))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form,
+                                                             result=result))
+
+
 class LaundryDeleteView(AdminLoginRequiredMixin, DeleteView):
     """ A view to delete a laundry shop. """
+    query_budget = 10
     model = LaundryShop
 
+    def delete(self, request, *args, **kwargs):
+        # the orders go with the shop, so no other shop's rating changes
+        with suspend_rating_updates(), batch_touches():
+            return super(LaundryDeleteView, self).delete(request, *args,
+                                                         **kwargs)
+
     def get_success_url(self):
         return reverse('management:list-shops')
 
-class LaundryListView(AdminLoginRequiredMixin, ListView):
+class LaundryListView(AdminLoginRequiredMixin, SearchMixin, ListView):
     """
     A view that lists at most 10 laundry shops in a page.
-    Also allows filtering.
+    Also allows searching by name and address with the q parameter.
     """
+    query_budget = 4
+    use_replica = True
     model = LaundryShop
     paginate_by = 10
     ordering = 'name'
     template_name = 'management/shop/viewlaundryshops.html'
     context_object_name = 'shop_list'
 
-    def get_context_data(self, **kwargs):
-        """
-        Filter laundry shop to display by a query.
-        Allow querying by laundry shop name, city, province, or barangay.
-        """
-        context = super(LaundryListView, self).get_context_data(**kwargs)
-        shops = context['shop_list']
-        name_query = self.request.GET.get('name', False)
-
-        query_type = 'name'
-        if name_query:
-            shops = self.get_shops_by_name(name_query)
-            query_type = 'name'
-        city_query = self.request.GET.get('city', False)
-        if city_query:
-            shops = self.get_shops_by_city(city_query)
-            query_type = 'city'
-        province_query = self.request.GET.get('province', False)
-        if province_query:
-            shops = self.get_shops_by_province(province_query)
-            query_type = 'province'
-        barangay_query = self.request.GET.get('barangay', False)
-        if barangay_query:
-            shops = self.get_shops_by_barangay(barangay_query)
-            query_type = 'barangay'
-        context.update({'shop_list': shops})
-        context['query_type'] = query_type
-        return context
-
-    def get_shops_by_name(self, name_query):
-        return LaundryShop.objects.filter(name__icontains=name_query)
-
-    def get_shops_by_city(self, city_query):
-        return LaundryShop.objects.filter(city__icontains=city_query)
-
-    def get_shops_by_province(self, province_query):
-        return LaundryShop.objects.filter(province__icontains=province_query)
-
-    def get_shops_by_barangay(self, barangay_query):
-        return LaundryShop.objects.filter(barangay__icontains=barangay_query)
-
 
 class AdminLoginView(LoginView):
     """ A view that only allows admins to login. """
+    query_budget = 13
     template_name = "management/account/login.html"
     form_class = forms.AdminLoginForm
     success_view_name = 'management:menu'
@@ -180,102 +176,71 @@ class AdminLoginView(LoginView):
 
 class AdminLogoutView(LogoutView):
     """ A view that logs out the user and redirects to the admin login. """
+    query_budget = 4
     login_view_name = 'management:login-admin'
 
 
-class ClientListView(AdminLoginRequiredMixin, ListView):
-    """ A view that shows a list of clients. Also filterable. """
+class ClientListView(AdminLoginRequiredMixin, KeysetPaginationMixin,
+                     SearchMixin, ListView):
+    """
+    A view that shows a list of clients.
+    Also allows searching by name and address with the q parameter.
+    """
+    query_budget = 4
+    use_replica = True
     model = UserProfile
     paginate_by = 10
     template_name = 'management/client/viewclients.html'
     context_object_name = 'client_list'
-    ordering = ['client__first_name', 'client__last_name']
+    ordering = ['sort_name']
+    keyset_ordering = ('sort_name', 'pk')
 
-    def get_context_data(self, **kwargs):
-        """
-        Filters the list of clients to return.
-        Filters by client name, city, province, or barangay.
-        """
-        context = super(ClientListView, self).get_context_data(**kwargs)
-        client = context['client_list']
-
-        name_query = self.request.GET.get('name', False)
-        query_type = 'name'
-        if name_query:
-            client = self.get_user_by_name(name_query)
-            query_type = 'name'
-        city_query = self.request.GET.get('city', False)
-        if city_query:
-            client = self.get_user_by_city(city_query)
-            query_type = 'city'
-        province_query = self.request.GET.get('province', False)
-        if province_query:
-            client = self.get_user_by_province(province_query)
-            query_type = 'province'
-        barangay_query = self.request.GET.get('barangay', False)
-        if barangay_query:
-            client = self.get_user_by_barangay(barangay_query)
-            query_type = 'barangay'
-        context.update({'client_list': client})
-        context['query_type'] = query_type
-        return context
-
-    def get_user_by_name(self, name_query):
-        return UserProfile.objects.filter(Q(client__first_name__icontains=name_query)|
-                                          Q(client__last_name__icontains=name_query))
-
-    def get_user_by_city(self, city_query):
-        return UserProfile.objects.filter(city__icontains=city_query)
-
-    def get_user_by_province(self, province_query):
-        return UserProfile.objects.filter(province__icontains=province_query)
+    def get_queryset(self):
+        queryset = super(ClientListView, self).get_queryset()
+        return queryset.select_related('client')
 
-    def get_user_by_barangay(self, barangay_query):
-        return UserProfile.objects.filter(barangay__icontains=barangay_query)
+    def get_keyset_ordering(self):
+        #Search results are ordered by rank, so they use page numbers
+        if self.get_search_query():
+            return None
+        return self.keyset_ordering
 
 
-class ServicesListView(AdminLoginRequiredMixin, ListView):
-    """ A view to show the list of services. """
+class ServicesListView(AdminLoginRequiredMixin, SearchMixin, ListView):
+    """
+    A view to show the list of services.
+    Also allows searching by name and description with the q parameter.
+    """
+    query_budget = 4
+    use_replica = True
     model = Service
     paginate_by = 10
     template_name = 'management/shop/viewservices.html'
     context_object_name = 'service_list'
 
-    def get_context_data(self, **kwargs):
-        """ Filters list to show service name or description. """
-        context = super(ServicesListView, self).get_context_data(**kwargs)
-        service = context['service_list']
-
-        name_query = self.request.GET.get('name', False)
-        query_type = 'name'
-        if name_query:
-            service = self.get_service_by_name(name_query)
-            query_type = 'name'
-        description_query = self.request.GET.get('description', False)
-        if description_query:
-            service = self.get_service_by_description(description_query)
-            query_type = 'description'
-
-        context.update({'service_list': service})
-        context['query_type'] = query_type
-        return context
-
-    def get_service_by_name(self, name_query):
-        return Service.objects.filter(name__icontains=name_query)
-
-    def get_service_by_description(self, description_query):
-        return Service.objects.filter(description__icontains=description_query)
-
 class ServicesDeleteView(AdminLoginRequiredMixin, DeleteView):
     """ A view to delete a service. """
+    query_budget = 15
     model = Service
 
+    def delete(self, request, *args, **kwargs):
+        # the orders of the service are deleted with it; rate their shops
+        # again once, after the response, instead of once per order
+        shop_pks = list(Price.objects.filter(service=kwargs['pk'])
+                        .values_list('laundry_shop', flat=True).distinct())
+        with suspend_rating_updates(), batch_touches():
+            response = super(ServicesDeleteView, self).delete(
+                request, *args, **kwargs)
+        enqueue(recalculate_ratings, shop_pks)
+        return response
+
     def get_success_url(self):
         return reverse('management:list-service')
 
 
 class ServiceCreateView(AdminLoginRequiredMixin, CreateView):
     """ A view to create a service through JS AJAX. Returns JSON. """
+    query_budget = {'get': 2, 'post': 6}
     template_name = 'management/shop/partials/createservice.html'
     model = Service
     form_class = forms.ServiceForm
@@ -298,6 +263,7 @@ class ServiceCreateView(AdminLoginRequiredMixin, CreateView):
 
 class ServiceUpdateView(AdminLoginRequiredMixin, UpdateView):
     """ A view to update a service. """
+    query_budget = {'get': 3, 'post': 8}
     template_name = 'management/shop/editservices.html'
     model = Service
     form_class = forms.ServiceForm
@@ -308,6 +274,7 @@ class ServiceUpdateView(AdminLoginRequiredMixin, UpdateView):
 
 class AddNewServiceView(AdminLoginRequiredMixin, CreateView):
     """ A view to add a new service. (non-ajax) """
+    query_budget = {'get': 2, 'post': 6}
     template_name = 'management/shop/addnewservice.html'
     model = Service
     form_class = forms.ServiceForm
@@ -316,35 +283,64 @@ class AddNewServiceView(AdminLoginRequiredMixin, CreateView):
         return reverse('management:list-service')
 
 
-class PendingRequestedTransactionsView(AdminLoginRequiredMixin, ListView):
-    """ A view to show pending transactions. """
+class PendingRequestedTransactionsView(AdminLoginRequiredMixin,
+                                       TransactionFeedMixin,
+                                       KeysetPaginationMixin, ListView):
+    """ A view to show pending transactions, oldest first. """
+    query_budget = 4
     model = Transaction
     context_object_name = 'pending_transaction_list'
     template_name = 'management/transactions/pending_requested_transactions.html'
     paginate_by = 10
+    keyset_ordering = ('request_date', 'pk')
 
     def get_queryset(self):
         """ Filters the set of transactions to only pending ones. """
         queryset = super(PendingRequestedTransactionsView, self).get_queryset()
-        queryset = queryset.filter(status=1)
+        queryset = queryset.filter(status=1).for_listing()
 
         return queryset
 
 
-class OngoingTransactionsView(AdminLoginRequiredMixin, ListView):
-    """ A view to show ongoing transactions. """
+class TransactionFeedView(AdminLoginRequiredMixin, View):
+    """
+    Streams the transactions saved after a cursor as Server-Sent Events
+    (see management/feed.py).
+    """
+    query_budget = 3
+
+    def get(self, request, *args, **kwargs):
+        # a reconnecting browser sends the id of the last event it got
+        cursor = decode_cursor(request.META.get('HTTP_LAST_EVENT_ID')) or \
+            decode_cursor(request.GET.get('cursor')) or \
+            decode_cursor(get_start_cursor())
+        response = StreamingHttpResponse(stream_changes(cursor),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # or nginx holds the events back
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class OngoingTransactionsView(AdminLoginRequiredMixin, KeysetPaginationMixin,
+                              ListView):
+    """ A view to show ongoing transactions, oldest first. """
+    query_budget = 4
+    use_replica = True
     model = Transaction
     context_object_name = 'ongoing_transaction_list'
     template_name = 'management/transactions/ongoing_transactions.html'
     paginate_by = 10
+    keyset_ordering = ('request_date', 'pk')
 
     def get_context_data(self, **kwargs):
         context = super(OngoingTransactionsView,self).get_context_data(**kwargs)
         form_list = []
-        for transaction in self.object_list:
+        transaction_list = context['ongoing_transaction_list']
+        for transaction in transaction_list:
             form_list.append(forms.TransactionPriceForm(prefix=transaction.pk, data=self.request.POST or None, instance=transaction))
 
-        context['transaction_list'] = zip(self.object_list, form_list)
+        context['transaction_list'] = zip(transaction_list, form_list)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -362,71 +358,109 @@ class OngoingTransactionsView(AdminLoginRequiredMixin, ListView):
     def get_queryset(self):
         """ Filters the set of transactions to only ongoing ones. """
         queryset = super(OngoingTransactionsView, self).get_queryset()
-        queryset = queryset.filter(status=2)
+        queryset = queryset.filter(status=2).for_listing()
 
         return queryset
 
 
-class HistoryTransactionsView(AdminLoginRequiredMixin, ListView):
+class HistoryTransactionsView(AdminLoginRequiredMixin, KeysetPaginationMixin,
+                              ListView):
     """ A view to show the history of transactions (done, rejected). """
+    query_budget = 4
+    use_replica = True
     model = Transaction
     context_object_name = 'history_transaction_list'
     template_name = 'management/transactions/history_transactions.html'
     paginate_by = 10
+    keyset_ordering = ('-request_date', '-pk')
 
     def get_queryset(self):
-        """ Filter transactions to only show either done or rejected. """
+        """
+        Filter transactions to only show either done or rejected, narrowed
+        down by either client name or laundry shop name.
+        """
         queryset = super(HistoryTransactionsView, self).get_queryset()
         filters = (3,4)
-        queryset = queryset.filter(status__in=filters).order_by('request_date').reverse()
-
-        return queryset
-
-    def get_context_data(self, **kwargs):
-        """ Filter by transactions by either client name or laundry shop name. """
-        context = super(HistoryTransactionsView, self).get_context_data(**kwargs)
-        transaction = context['history_transaction_list']
+        queryset = queryset.filter(status__in=filters)
 
         name_query = self.request.GET.get('client name', False)
-        query_type = 'client name'
         if name_query:
-            transaction = self.get_transaction_by_name(name_query)
-            query_type = 'client name'
+            queryset = self.get_transaction_by_name(queryset, name_query)
 
         shop_query = self.request.GET.get('laundry shop', False)
         if shop_query:
-            transaction = self.get_transaction_by_shop(shop_query)
-            query_type = 'laundry shop'
+            queryset = self.get_transaction_by_shop(queryset, shop_query)
+
+        return queryset.for_listing()
 
-        context.update({'history_transaction_list': transaction})
+    def get_context_data(self, **kwargs):
+        context = super(HistoryTransactionsView, self).get_context_data(**kwargs)
+        query_type = 'client name'
+        if self.request.GET.get('laundry shop', False):
+            query_type = 'laundry shop'
         context['query_type'] = query_type
         return context
 
-    def get_transaction_by_name(self, name_query):
-        return Transaction.objects.filter(Q(client__client__first_name__icontains=name_query)|
-                                          Q(client__client__last_name__icontains=name_query))
+    def get_transaction_by_name(self, queryset, name_query):
+        return queryset.filter(Q(client__client__first_name__icontains=name_query)|
+                               Q(client__client__last_name__icontains=name_query))
 
-    def get_transaction_by_shop(self, shop_query):
-        return Transaction.objects.filter(order__price__laundry_shop__name__icontains=shop_query)
+    def get_transaction_by_shop(self, queryset, shop_query):
+        #A subquery instead of a join so the transactions need no DISTINCT
+        orders = Order.objects.filter(
+            price__laundry_shop__name__icontains=shop_query)
+        return queryset.filter(pk__in=orders.values('transaction'))
 
 
+class ExportTransactionsView(AdminLoginRequiredMixin, View):
+    """
+    A view that streams the transactions, filtered by date range, status
+    and shop, as a CSV or NDJSON download.
+    """
+    query_budget = 2
+    use_replica = True
+    def get(self, request, *args, **kwargs):
+        form = forms.TransactionExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponse(json.dumps(form.errors), status=400,
+                                content_type='application/json')
+        filters = form.cleaned_data
+        file_format = filters.pop('format')
+        export, content_type = EXPORT_FORMATS[file_format]
+        transactions = filter_transactions(Transaction.objects.all(),
+                                           **filters)
+        response = StreamingHttpResponse(
+            export(iter_transactions(transactions)),
+            content_type=content_type)
+        response['Content-Disposition'] = \
+            'attachment; filename="transactions.{0}"'.format(file_format)
+        return response
+
 
 class UpdateTransactionDeliveryDateView(AdminLoginRequiredMixin, UpdateView):
     """
     A view to update a transaction delivery date.
     Also handle marking a transaction as approved or declined.
     """
+    query_budget = {'get': 6, 'post': 7}
     model = Transaction
     context_object_name = 'transaction'
     template_name = 'management/transactions/update_transaction.html'
     fields = ['delivery_date']
 
+    def get_queryset(self):
+        return Transaction.objects.select_related('client__client')
+
     def get_context_data(self, *args, **kwargs):
         context = super(UpdateTransactionDeliveryDateView, self) \
             .get_context_data(*args, **kwargs)
-        # insert dynamic fees into context
-        # context['fees'] = Site.objects.get_current().fees
-        context['fees'] = Site.objects.get_or_create(domain='laundrybear.pythonanywhere.com')[0].fees
+        order_list = list(self.object.order_set
+                          .select_related('price__service'))
+        context['order_list'] = order_list
+        #The delivery date can be set from the duration of the first order
+        context['duration'] = order_list[0].price.duration if order_list \
+            else 0
+        context['fees'] = get_fees()
         return context
 
     def get_success_url(self):
@@ -446,6 +480,7 @@ class UpdateTransactionDeliveryDateView(AdminLoginRequiredMixin, UpdateView):
 
 class MarkTransactionDoneView(AdminLoginRequiredMixin, UpdateView):
     """ A view to mark a transaction done. """
+    query_budget = 5
     model = Transaction
     fields = ['status']
     template_name = ''
@@ -455,16 +490,17 @@ class MarkTransactionDoneView(AdminLoginRequiredMixin, UpdateView):
 
 class AdminSettingsView(AdminLoginRequiredMixin, TemplateView):
     """ A view to edit admin settings. (Password, service charges, delivery fees) """
+    query_budget = {'get': 5, 'post': 11}
     template_name = 'management/account/settings.html'
 
     def get_context_data(self, **kwargs):
         context = super(AdminSettingsView, self).get_context_data(**kwargs)
         context['usernameform'] = forms.ChangeUsernameForm(data=self.request.POST or None, instance=self.request.user)
         context['passwordform'] = PasswordChangeForm(data=self.request.POST or None, user=self.request.user)
-        # site = Site.objects.get_current()
-        site = Site.objects.get_or_create(domain='laundrybear.pythonanywhere.com')[0].fees
+        # edit a fresh copy, the cached fees are shared
+        fees = Fees.objects.get(pk=get_fees().pk)
         context['fees_form'] = forms.FeesForm(data=self.request.POST or None,
-                                              instance=site.fees)
+                                              instance=fees)
         return context
 
     def post(self,request,*args,**kwargs):